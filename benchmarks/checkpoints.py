@@ -0,0 +1,63 @@
+import os
+import random
+import tempfile
+import time
+
+import config
+import simulation
+from models.grid import Grid
+from models.traffic_light_models.first_come_first_serve import FirstComeFirstServe
+from models.worklist import Worklist
+from services import checkpoint_service
+
+# The benchmarked grids (width = height), with VEHICLES_PER_INTERSECTION vehicles per intersection
+GRID_SIZES = [10, 20, 40, 80]
+VEHICLES_PER_INTERSECTION = 10
+# The number of steps simulated before the checkpoint is written
+STEPS = 20
+REPEATS = 3
+
+
+def checkpoint_times(size, file_path):
+    """
+    Returns the time (in milliseconds) to write and to read a checkpoint of a size x size grid, and its size in bytes.
+    """
+    config.GRID_WIDTH = config.GRID_HEIGHT = size
+    rng = random.Random(config.RANDOM_SEED)
+    grid = Grid(size * size * VEHICLES_PER_INTERSECTION, rng)
+    model = FirstComeFirstServe()
+    model.setup(grid, rng)
+
+    # Simulate a few steps, so the vehicles are spread over the lanes and roads.
+    worklists = (Worklist(), Worklist(vehicle.lane for vehicle in grid.vehicles),
+                 Worklist(grid.all_intersections_with_traffic_lights()))
+    last_update = {}
+    vehicles_driving = len(grid.vehicles)
+    for step in range(STEPS):
+        vehicles_driving -= simulation.update(step, model, rng, worklists[2], worklists[0], worklists[1], last_update)
+
+    write_times, read_times = [], []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        checkpoint_service.write_checkpoint(file_path, grid, model, rng, STEPS, vehicles_driving, worklists, last_update)
+        write_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        checkpoint_service.read_checkpoint(file_path, grid, model, rng)
+        read_times.append(time.perf_counter() - start)
+
+    return min(write_times) * 1e3, min(read_times) * 1e3, os.path.getsize(file_path)
+
+
+def main():
+    print("{:>10} {:>10} {:>12} {:>12} {:>12}".format("grid", "vehicles", "write (ms)", "read (ms)", "size (kB)"))
+    with tempfile.TemporaryDirectory() as directory:
+        for size in GRID_SIZES:
+            write_time, read_time, file_size = checkpoint_times(size, os.path.join(directory, 'checkpoint.npz'))
+            print("{:>10} {:>10} {:>12.1f} {:>12.1f} {:>12.1f}".format(
+                "{}x{}".format(size, size), size * size * VEHICLES_PER_INTERSECTION, write_time, read_time,
+                file_size / 1e3))
+
+
+if __name__ == "__main__":
+    main()
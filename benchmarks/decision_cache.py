@@ -0,0 +1,57 @@
+import random
+import time
+
+import config
+import simulation
+from models.grid import Grid
+from models.traffic_light_models.global_optimum import GlobalOptimum
+from models.traffic_light_models.local_optimum import LocalOptimum
+
+# The benchmarked grid (width = height), the numbers of vehicles, the sizes of the decision cache and the number of
+# steps between traffic light updates
+GRID_SIZE = 20
+NUM_VEHICLES = [2000, 10000]
+CACHE_SIZES = [None, 256, 65536]
+TRAFFIC_LIGHT_LENGTHS = [1, 3]
+
+
+def simulate(grid, model):
+    """
+    Returns the time in seconds it takes to simulate the grid with the model, and the steps of the vehicles.
+    """
+    rng = random.Random(config.RANDOM_SEED)
+    model.setup(grid, rng)
+    start = time.perf_counter()
+    simulation.run(grid, model, rng)
+    elapsed = time.perf_counter() - start
+    steps = [vehicle.total_steps() for vehicle in grid.vehicles]
+    grid.reset()
+    return elapsed, steps
+
+
+def main():
+    print("{:>8} {:>10} {:>16} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10} {:>8}".format(
+        "length", "vehicles", "model", "cache", "time (s)", "skips", "hits", "misses", "hit rate", "same"))
+    config.GRID_WIDTH = config.GRID_HEIGHT = GRID_SIZE
+    for traffic_light_length in TRAFFIC_LIGHT_LENGTHS:
+        config.TRAFFIC_LIGHT_LENGTH = traffic_light_length
+        for num_vehicles in NUM_VEHICLES:
+            grid = Grid(num_vehicles, random.Random(config.RANDOM_SEED))
+            for model_class in (LocalOptimum, GlobalOptimum):
+                expected = None
+                for cache_size in CACHE_SIZES:
+                    config.DECISION_CACHE_SIZE = cache_size
+                    # A new model for every cache size, so no decisions are cached from before
+                    model = model_class()
+                    elapsed, steps = simulate(grid, model)
+                    expected = steps if expected is None else expected
+                    statistics = model.decision_cache.statistics() if model.decision_cache is not None else {}
+                    print("{:>8} {:>10} {:>16} {:>8} {:>10.3f} {:>10} {:>10} {:>10} {:>10} {:>8}".format(
+                        traffic_light_length, num_vehicles, model_class.__name__, str(cache_size), elapsed,
+                        statistics.get('skips', '-'), statistics.get('hits', '-'), statistics.get('misses', '-'),
+                        "{:.1%}".format(statistics['hit_rate']) if statistics else '-', str(steps == expected)))
+    config.DECISION_CACHE_SIZE = None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import random
+import time
+
+import config
+import setup
+from models.traffic_light_models.traffic_light_models import is_traffic_light_combination_possible
+
+# The benchmarked grids (width = height). The sequential generator, building the objects and checking the requirements
+# take too long for the largest grids, so they are limited to the grids up to SEQUENTIAL_MAX and OBJECTS_MAX.
+GRID_SIZES = [10, 30, 100, 300, 1000]
+SEQUENTIAL_MAX = 100
+OBJECTS_MAX = 300
+
+
+def check_requirements(intersections):
+    """
+    Returns the number of violations of the requirements of a network: every intersection has an incoming and an
+    outgoing road, every incoming (outgoing) road has an outgoing (incoming) road on another side, every incoming road
+    has a lane, every lane goes to the road after its turning, every outgoing road is reached by a lane from another
+    side, and exactly the lanes that conflict with another lane have a traffic light.
+    """
+    violations = 0
+    for intersection in [intersection for row in intersections for intersection in row]:
+        violations += not intersection.outgoing_roads
+        violations += not intersection.incoming_roads
+        for direction in intersection.incoming_roads:
+            violations += not set(intersection.outgoing_roads) - {direction}
+        for direction in intersection.outgoing_roads:
+            violations += not set(intersection.incoming_roads) - {direction}
+
+        for direction, road in intersection.incoming_roads.items():
+            violations += not road.lanes
+            for turning, lane in road.lanes.items():
+                violations += intersection.outgoing_roads.get(direction.turn(turning)) is not lane.goes_to_road
+        for direction, road in intersection.outgoing_roads.items():
+            violations += not any(lane.goes_to_road is road for other, incoming_road in
+                                  intersection.incoming_roads.items() if other != direction
+                                  for lane in incoming_road.lanes.values())
+
+        lanes = intersection.get_all_lanes()
+        for lane in lanes:
+            violations += lane.has_traffic_light != any(not is_traffic_light_combination_possible(lane, other_lane)
+                                                        for other_lane in lanes)
+    return violations
+
+
+def timed(function, *args):
+    """
+    Returns the result of function(*args) and the time it took in seconds.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    print("{:>12} {:>16} {:>16} {:>14} {:>12} {:>12} {:>12}".format(
+        "grid", "sequential (s)", "vectorized (s)", "objects (s)", "roads", "lanes", "violations"))
+    for size in GRID_SIZES:
+        config.GRID_WIDTH = config.GRID_HEIGHT = size
+        sequential = vectorized_objects = violations = "-"
+
+        if size <= SEQUENTIAL_MAX:
+            _, sequential = timed(setup.setup_intersections, random.Random(config.RANDOM_SEED))
+            sequential = "{:.3f}".format(sequential)
+
+        network, vectorized = timed(setup.generate_network, random.Random(config.RANDOM_SEED))
+
+        if size <= OBJECTS_MAX:
+            intersections, vectorized_objects = timed(setup.setup_network, network)
+            vectorized_objects = "{:.3f}".format(vectorized_objects)
+            if size <= SEQUENTIAL_MAX:
+                violations = check_requirements(intersections)
+
+        print("{:>12} {:>16} {:>16.3f} {:>14} {:>12} {:>12} {:>12}".format(
+            "{}x{}".format(size, size), sequential, vectorized, vectorized_objects, len(network['road_origin']),
+            len(network['lane_turning']), violations))
+
+
+if __name__ == "__main__":
+    main()
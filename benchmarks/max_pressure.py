@@ -0,0 +1,61 @@
+import random
+import time
+
+import config
+import simulation
+from engines import array_engine
+from models.grid import Grid
+from models.traffic_light_models.global_optimum import GlobalOptimum
+from models.traffic_light_models.max_pressure import MaxPressure
+
+# The benchmarked grids (width = height), and the number of vehicles per intersection
+GRID_SIZES = [10, 50, 100]
+VEHICLES_PER_INTERSECTION = 5
+
+
+def one_by_one(model_class):
+    """
+    Returns a subclass of model_class without a batch update, so the array engine updates the intersections one by one.
+    """
+    class OneByOne(model_class):
+        def update_all(self, network, intersections, skipped, due):
+            return None
+
+    return OneByOne
+
+
+def simulate(grid, model_class):
+    """
+    Returns the time in seconds it takes to simulate the grid with the model (with the array engine), the score and the
+    steps of the vehicles.
+    """
+    rng = random.Random(config.RANDOM_SEED)
+    model = model_class()
+    model.setup(grid, rng)
+    start = time.perf_counter()
+    array_engine.run(grid, model, rng)
+    elapsed = time.perf_counter() - start
+    score = simulation.simulation_score(grid.vehicles)
+    steps = [vehicle.total_steps() for vehicle in grid.vehicles]
+    grid.reset()
+    return elapsed, score, steps
+
+
+def main():
+    print("{:>10} {:>10} {:>16} {:>10} {:>16} {:>10} {:>8}".format(
+        "grid", "vehicles", "model", "score", "one by one (s)", "batch (s)", "same"))
+    config.GRID_GENERATOR = 'vectorized'
+    for size in GRID_SIZES:
+        config.GRID_WIDTH = config.GRID_HEIGHT = size
+        num_vehicles = size * size * VEHICLES_PER_INTERSECTION
+        grid = Grid(num_vehicles, random.Random(config.RANDOM_SEED))
+        for model_class in (GlobalOptimum, MaxPressure):
+            separate, _, expected = simulate(grid, one_by_one(model_class))
+            batch, score, steps = simulate(grid, model_class)
+            print("{:>10} {:>10} {:>16} {:>10.3f} {:>16.3f} {:>10.3f} {:>8}".format(
+                "{}x{}".format(size, size), num_vehicles, model_class.__name__, score, separate, batch,
+                str(steps == expected)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import random
+import time
+
+import config
+import simulation
+from models.grid import Grid
+from models.intersection import Intersection
+from models.traffic_light_models.global_optimum import GlobalOptimum
+from models.traffic_light_models.local_optimum import LocalOptimum
+from models.traffic_light_models.model_predictive import ModelPredictive
+
+# The benchmarked grid (width = height), the numbers of vehicles and the horizons of the Model Predictive model
+GRID_SIZE = 10
+NUM_VEHICLES = [500, 2000]
+HORIZONS = [1, 5, 20]
+
+
+def simulate(grid, model, skipping=True):
+    """
+    Returns the score, the mean number of steps of the vehicles, the time in seconds of simulating the grid with model
+    and the steps waiting and driving of every vehicle. Without skipping, every intersection counts as having vehicles,
+    so its traffic lights are updated at every update instead of caught up on (see TrafficLightModel.update_idle).
+    """
+    has_vehicles = Intersection.has_vehicles
+    if not skipping:
+        Intersection.has_vehicles = lambda intersection: True
+    try:
+        rng = random.Random(config.RANDOM_SEED)
+        model.setup(grid, rng)
+        start = time.perf_counter()
+        simulation.run(grid, model, rng)
+        elapsed = time.perf_counter() - start
+    finally:
+        Intersection.has_vehicles = has_vehicles
+    score = simulation.simulation_score(grid.vehicles)
+    steps = simulation.mean_number_of_steps(grid.vehicles)
+    outcome = [(vehicle.steps_waiting, vehicle.steps_driving) for vehicle in grid.vehicles]
+    grid.reset()
+    return score, steps, elapsed, outcome
+
+
+def main():
+    print("{:>10} {:>16} {:>8} {:>10} {:>8} {:>10} {:>10} {:>12} {:>12} {:>8} {:>8}".format(
+        "vehicles", "model", "horizon", "score", "steps", "run (s)", "decisions", "mean (us)", "max (us)", "over",
+        "same"))
+    config.GRID_WIDTH = config.GRID_HEIGHT = GRID_SIZE
+    for num_vehicles in NUM_VEHICLES:
+        grid = Grid(num_vehicles, random.Random(config.RANDOM_SEED))
+        for model in (LocalOptimum(), GlobalOptimum()):
+            score, steps, elapsed, _ = simulate(grid, model)
+            print("{:>10} {:>16} {:>8} {:>10.3f} {:>8.1f} {:>10.3f}".format(
+                num_vehicles, type(model).__name__, "-", score, steps, elapsed))
+
+        for horizon in HORIZONS:
+            config.PREDICTIVE_HORIZON = horizon
+            model = ModelPredictive()
+            score, steps, elapsed, outcome = simulate(grid, model)
+            latency = model.latency_statistics()
+            # The intersections without vehicles are skipped, which must not change the results
+            _, _, _, expected = simulate(grid, ModelPredictive(), skipping=False)
+            print("{:>10} {:>16} {:>8} {:>10.3f} {:>8.1f} {:>10.3f} {:>10} {:>12.1f} {:>12.1f} {:>8} {:>8}".format(
+                num_vehicles, "ModelPredictive", horizon, score, steps, elapsed, latency['decisions'],
+                latency['mean_latency'] * 1e6, latency['max_latency'] * 1e6, latency['over_budget'],
+                str(outcome == expected)))
+
+
+if __name__ == "__main__":
+    main()
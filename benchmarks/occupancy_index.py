@@ -0,0 +1,70 @@
+import random
+import time
+
+import config
+import simulation
+from models.grid import Grid
+from models.intersection import Intersection
+from models.traffic_light_models.first_come_first_serve import FirstComeFirstServe
+from models.traffic_light_models.global_optimum import GlobalOptimum
+from models.traffic_light_models.local_optimum import LocalOptimum
+
+# The benchmarked grid (width = height), the numbers of vehicles and the number of times a simulation is timed (the
+# fastest time is used)
+GRID_SIZE = 20
+NUM_VEHICLES = [2000, 10000]
+REPEATS = 3
+
+
+def scanning_has_vehicles(intersection):
+    """
+    Intersection.has_vehicles without the occupancy index: scan the lanes and the sections of the incoming roads.
+    """
+    return any(lane.has_vehicles() for lane in intersection.get_all_lanes()) or \
+        any(road.has_vehicles() for road in intersection.incoming_roads.values())
+
+
+def scanning_get_all_lanes_with_vehicles(intersection):
+    """
+    Intersection.get_all_lanes_with_vehicles without the occupancy index: scan the lanes.
+    """
+    return [lane for lane in intersection.get_all_lanes() if lane.has_vehicles()]
+
+
+def simulate(grid, model):
+    """
+    Returns the time in seconds it takes to simulate the grid with the model, and the steps of the vehicles.
+    """
+    times = []
+    for _ in range(REPEATS):
+        rng = random.Random(config.RANDOM_SEED)
+        model.setup(grid, rng)
+        start = time.perf_counter()
+        simulation.run(grid, model, rng)
+        times.append(time.perf_counter() - start)
+        steps = [vehicle.total_steps() for vehicle in grid.vehicles]
+        grid.reset()
+    return min(times), steps
+
+
+def main():
+    print("{:>10} {:>24} {:>14} {:>14} {:>8}".format("vehicles", "model", "scanning (s)", "index (s)", "same"))
+    config.GRID_WIDTH = config.GRID_HEIGHT = GRID_SIZE
+    indexed = (Intersection.has_vehicles, Intersection.get_all_lanes_with_vehicles)
+    for num_vehicles in NUM_VEHICLES:
+        grid = Grid(num_vehicles, random.Random(config.RANDOM_SEED))
+        for model_class in (FirstComeFirstServe, LocalOptimum, GlobalOptimum):
+            # The intersections scan their lanes and roads, like before the occupancy index
+            Intersection.has_vehicles = scanning_has_vehicles
+            Intersection.get_all_lanes_with_vehicles = scanning_get_all_lanes_with_vehicles
+            try:
+                scanning, expected = simulate(grid, model_class())
+            finally:
+                Intersection.has_vehicles, Intersection.get_all_lanes_with_vehicles = indexed
+            index, steps = simulate(grid, model_class())
+            print("{:>10} {:>24} {:>14.3f} {:>14.3f} {:>8}".format(
+                num_vehicles, model_class.__name__, scanning, index, str(steps == expected)))
+
+
+if __name__ == "__main__":
+    main()
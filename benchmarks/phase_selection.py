@@ -0,0 +1,111 @@
+import random
+import time
+from collections import deque
+
+import config
+from models.grid import Grid
+from models.light import Light
+from models.traffic_light_models.first_come_first_serve import FirstComeFirstServe
+from models.traffic_light_models.local_optimum import LocalOptimum
+from models.traffic_light_models.traffic_light_models import is_traffic_light_combination_possible
+
+# The benchmarked grid (width = height), the maximum number of vehicles waiting in a lane and the number of updates of
+# every intersection
+GRID_SIZE = 30
+MAX_QUEUE_LENGTH = 5
+REPEATS = 20
+
+
+def option_lists_local_optimum(intersection):
+    """
+    The Local Optimum update with option lists: the lane with the most vehicles waiting turns GREEN, the lanes that
+    conflict with it are removed from the options, and so on.
+    """
+    for lane in intersection.get_all_lanes_with_traffic_lights():
+        lane.turn_red()
+    options = list(intersection.get_all_lanes_with_traffic_lights())
+    while options:
+        lane = max(options, key=lambda option: len(option.queue))
+        lane.turn_green()
+        options.remove(lane)
+        options = [option for option in options if is_traffic_light_combination_possible(lane, option)]
+
+
+def option_lists_first_come_first_serve(intersection, queue):
+    """
+    The First Come First Serve update with option lists (without adding the lanes with vehicles to the queue).
+    """
+    for lane in intersection.get_all_lanes_with_traffic_lights():
+        lane.turn_red()
+    options = queue.copy()
+    while options:
+        lane = options.pop(0)
+        lane.turn_green()
+        options = [option for option in options if is_traffic_light_combination_possible(lane, option)]
+        queue.remove(lane)
+
+
+def lights(intersections):
+    """
+    Returns the states of the traffic lights of the intersections.
+    """
+    return [lane.traffic_light == Light.GREEN for intersection in intersections
+            for lane in intersection.get_all_lanes_with_traffic_lights()]
+
+
+def timed(function, intersections):
+    """
+    Returns the mean time in microseconds of function(intersection) per intersection.
+    """
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for intersection in intersections:
+            function(intersection)
+    return (time.perf_counter() - start) / REPEATS / len(intersections) * 1e6
+
+
+def main():
+    config.GRID_WIDTH = config.GRID_HEIGHT = GRID_SIZE
+    rng = random.Random(config.RANDOM_SEED)
+    grid = Grid(0, rng)
+    intersections = grid.all_intersections_with_traffic_lights()
+    # Fill the lanes with placeholder vehicles (counted in the occupancy indexes of the intersections), and the First
+    # Come First Serve queues with all lanes in random order
+    for lane in grid.topology.lanes:
+        lane.queue = deque([None] * rng.randint(0, MAX_QUEUE_LENGTH))
+    for intersection in grid.topology.intersections:
+        intersection.recount()
+    queues = {intersection: rng.sample(list(intersection.get_all_lanes()), len(intersection.get_all_lanes()))
+              for intersection in intersections}
+
+    print("{:>24} {:>18} {:>18} {:>8}".format("model", "option lists (us)", "phases (us)", "same"))
+
+    local_optimum = LocalOptimum()
+    option_lists = timed(option_lists_local_optimum, intersections)
+    expected = lights(intersections)
+    phases = timed(local_optimum.update, intersections)
+    print("{:>24} {:>18.2f} {:>18.2f} {:>8}".format(
+        "LocalOptimum", option_lists, phases, str(lights(intersections) == expected)))
+
+    # Every update starts from the same queue. The lanes are emptied, so the model adds no lanes to it.
+    first_come_first_serve = FirstComeFirstServe()
+    first_come_first_serve.rng = rng
+    for lane in grid.topology.lanes:
+        lane.queue = deque()
+    for intersection in grid.topology.intersections:
+        intersection.recount()
+
+    def update_first_come_first_serve(intersection):
+        first_come_first_serve.queues[intersection] = dict.fromkeys(queues[intersection])
+        first_come_first_serve.update(intersection)
+
+    option_lists = timed(lambda intersection: option_lists_first_come_first_serve(
+        intersection, queues[intersection].copy()), intersections)
+    expected = lights(intersections)
+    phases = timed(update_first_come_first_serve, intersections)
+    print("{:>24} {:>18.2f} {:>18.2f} {:>8}".format(
+        "FirstComeFirstServe", option_lists, phases, str(lights(intersections) == expected)))
+
+
+if __name__ == "__main__":
+    main()
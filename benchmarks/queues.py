@@ -0,0 +1,172 @@
+import random
+import sys
+import time
+import tracemalloc
+
+import config
+from models.direction import Direction
+from models.intersection import Intersection
+from models.lane import Lane
+from models.road import Road
+from models.turning import Turning
+
+# The number of vehicles waiting in the benchmarked (saturated) lanes
+QUEUE_LENGTHS = [500, 50000]
+# The number of sections of the benchmarked roads, and the number of vehicles entering a road at every step
+ROAD_LENGTHS = [1, 3, 1000]
+ROAD_FLOW = 8
+# The number of updates that are measured, and the number of times the updates are timed (the fastest time is used)
+STEPS = 2000
+REPEATS = 5
+
+
+class ListLane(Lane):
+    """
+    A lane backed by a list, which copies the crossing vehicles into a new list and shifts the remaining vehicles.
+    """
+    def __init__(self, direction, turning, road):
+        super().__init__(direction, turning, road)
+        self.queue = []
+
+    def update_on_green(self, step, rng):
+        flow_through = config.FLOW_THROUGH_BASE + rng.choice(config.FLOW_THROUGH_DIFF)
+        crossing = self.queue[:flow_through]
+        for vehicle in crossing:
+            vehicle.cross_intersection(step)
+        del self.queue[:flow_through]
+        self.intersection.vehicles_waiting -= len(crossing)
+        return len(crossing)
+
+
+class ListRoad(Road):
+    """
+    A road that shifts its sections by popping the first section and appending a new one.
+    """
+    def __init__(self, origin, destination, end_direction, length):
+        super().__init__(origin, destination, end_direction, length)
+        self.sections = [[] for _ in self.sections]
+
+    def enter(self, vehicle):
+        self.sections[0].append(vehicle)
+        self.destination.vehicles_approaching += 1
+
+    def last_section(self):
+        return self.sections[-1]
+
+    def update(self, step, rng, finished=None):
+        num_finished = 0
+        self.destination.vehicles_approaching -= len(self.sections[0])
+        for vehicle in self.sections.pop(0):
+            vehicle.leave_road(step)
+            vehicle.roads_to_drive -= 1
+            if not vehicle.is_finished():
+                vehicle.choose_lane(step, rng)
+            else:
+                num_finished += 1
+        self.sections.append([])
+        return num_finished
+
+
+class Vehicle(object):
+    """
+    A vehicle that drives in circles: it enters its lane again after crossing, so the lane stays saturated.
+    """
+    def __init__(self, lane):
+        self.lane = lane
+        self.roads_to_drive = sys.maxsize
+        lane.enter(self)
+
+    def cross_intersection(self, step):
+        self.lane.enter(self)
+
+    def leave_road(self, step):
+        pass
+
+    def is_finished(self):
+        return False
+
+    def choose_lane(self, step, rng):
+        pass
+
+
+def measure(update):
+    """
+    Returns the mean number of bytes allocated during an update (the peak memory above the memory before the update)
+    and the mean time of an update in microseconds.
+    """
+    tracemalloc.start()
+    allocated = 0
+    for step in range(STEPS):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        update(step)
+        allocated += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for step in range(STEPS):
+            update(step)
+        times.append(time.perf_counter() - start)
+    return allocated / STEPS, min(times) / STEPS * 1e6
+
+
+def flow_through_draw(rng):
+    """
+    Returns the random draw of the flow through, which every lane update makes (and which allocates as well).
+    """
+    def update(step):
+        rng.choice(config.FLOW_THROUGH_DIFF)
+    return update
+
+
+def lane_update(lane_class, length, rng):
+    """
+    Returns an update of a lane with length vehicles waiting.
+    """
+    lane = lane_class(Direction.NORTH, Turning.STRAIGHT, None)
+    # The lane counts its vehicles in the occupancy index of its intersection
+    lane.intersection = Intersection(0, 0)
+    lane.bit = 1
+    for _ in range(length):
+        Vehicle(lane)
+
+    def update(step):
+        lane.update_on_green(step, rng)
+    return update
+
+
+def road_update(road_class, length, rng):
+    """
+    Returns an update of a road of length sections that ROAD_FLOW vehicles enter at every step.
+    """
+    road = road_class(None, Intersection(0, 0), Direction.NORTH, length)
+    lane = Lane(Direction.NORTH, Turning.STRAIGHT, None)
+    lane.intersection = road.destination
+    lane.bit = 1
+    vehicles = [Vehicle(lane) for _ in range(ROAD_FLOW)]
+
+    def update(step):
+        for vehicle in vehicles:
+            road.enter(vehicle)
+        road.update(step, rng)
+    return update
+
+
+def main():
+    rng = random.Random(0)
+    print("{:<28} {:>14} {:>14}".format("", "bytes/step", "us/step"))
+    rows = [("flow through draw", flow_through_draw(rng))]
+    for length in QUEUE_LENGTHS:
+        rows.append(("lane {} (list)".format(length), lane_update(ListLane, length, rng)))
+        rows.append(("lane {} (deque)".format(length), lane_update(Lane, length, rng)))
+    for length in ROAD_LENGTHS:
+        rows.append(("road {} (pop/append)".format(length), road_update(ListRoad, length, rng)))
+        rows.append(("road {} (ring buffer)".format(length), road_update(Road, length, rng)))
+    for name, update in rows:
+        print("{:<28} {:>14.1f} {:>14.2f}".format(name, *measure(update)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import random
+import time
+
+import config
+import simulation
+from engines import array_engine
+from engines.block_random import BlockRandom
+from models.grid import Grid
+from models.traffic_light_models.global_optimum import GlobalOptimum
+
+# The benchmarked grid (width = height) and the numbers of vehicles
+GRID_SIZE = 20
+NUM_VEHICLES = [2000, 10000]
+
+
+def recording(rng_class):
+    """
+    Returns a subclass of rng_class that records the sequence of every choice.
+    """
+    class Recording(rng_class):
+        def __init__(self, *args):
+            super().__init__(*args)
+            self.sequences = []
+
+        def choice(self, seq):
+            self.sequences.append(seq)
+            return super().choice(seq)
+
+    return Recording
+
+
+def simulate(grid, run, rng):
+    """
+    Returns the time in seconds it takes to simulate the grid with run and rng (with the Global Optimum model).
+    """
+    model = GlobalOptimum()
+    model.setup(grid, rng)
+    start = time.perf_counter()
+    run(grid, model, rng)
+    elapsed = time.perf_counter() - start
+    grid.reset()
+    return elapsed
+
+
+def main():
+    print("{:>10} {:>10} {:>10} {:>12} {:>12} {:>12} {:>10}".format(
+        "vehicles", "engine", "numbers", "run (s)", "choices", "choice (s)", "share"))
+    config.GRID_WIDTH = config.GRID_HEIGHT = GRID_SIZE
+    for num_vehicles in NUM_VEHICLES:
+        grid = Grid(num_vehicles, random.Random(config.RANDOM_SEED))
+        for rng_class in (random.Random, BlockRandom):
+            name = 'python' if rng_class is random.Random else 'blocks'
+
+            # The choices of the step loop, which are timed on their own (with the same sequences, in the same order)
+            recorder = recording(rng_class)(config.RANDOM_SEED)
+            simulate(grid, simulation.run, recorder)
+            rng = rng_class(config.RANDOM_SEED)
+            choice = rng.choice
+            start = time.perf_counter()
+            for seq in recorder.sequences:
+                choice(seq)
+            choices = time.perf_counter() - start
+
+            run = simulate(grid, simulation.run, rng_class(config.RANDOM_SEED))
+            print("{:>10} {:>10} {:>10} {:>12.3f} {:>12} {:>12.3f} {:>9.1f}%".format(
+                num_vehicles, "object", name, run, len(recorder.sequences), choices, 100 * choices / run))
+
+            run = simulate(grid, array_engine.run, rng_class(config.RANDOM_SEED))
+            print("{:>10} {:>10} {:>10} {:>12.3f}".format(num_vehicles, "array", name, run))
+
+
+if __name__ == "__main__":
+    main()
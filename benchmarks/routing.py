@@ -0,0 +1,67 @@
+import random
+import time
+
+import config
+import setup
+from models.grid import Grid
+from models.route_table import RouteTable
+
+# The grids (width = height) whose route tables are built, and the larger grids of which only the memory of the table is
+# reported (one byte per road and intersection, from the network of the vectorized generator)
+GRID_SIZES = [10, 30, 50]
+MEMORY_GRID_SIZES = [100, 300, 1000]
+# The number of vehicles (per intersection) and lane choices that are timed
+VEHICLES_PER_INTERSECTION = 10
+CHOICES = 100000
+
+
+def time_choices(grid, rng):
+    """
+    Returns the mean time in nanoseconds of Vehicle.choose_lane, for vehicles at the end of their first road.
+    """
+    vehicles = [vehicle for vehicle in grid.vehicles if vehicle.roads_to_drive > 1]
+    for vehicle in vehicles:
+        vehicle.road = vehicle.lane.goes_to_road
+    vehicles = (vehicles * (CHOICES // len(vehicles) + 1))[:CHOICES]
+
+    start = time.perf_counter()
+    for vehicle in vehicles:
+        vehicle.choose_lane(0, rng)
+    elapsed = time.perf_counter() - start
+    grid.reset()
+    return elapsed / len(vehicles) * 1e9
+
+
+def main():
+    print("{:>10} {:>10} {:>10} {:>12} {:>12} {:>14} {:>14}".format(
+        "grid", "roads", "routing", "table (s)", "table (MB)", "roads/vehicle", "choice (ns)"))
+    for size in GRID_SIZES:
+        config.GRID_WIDTH = config.GRID_HEIGHT = size
+        num_vehicles = size * size * VEHICLES_PER_INTERSECTION
+        for routing in ('random', 'shortest'):
+            config.ROUTING = routing
+            rng = random.Random(config.RANDOM_SEED)
+            grid = Grid(num_vehicles, rng)
+            table = memory = "-"
+            if grid.routes is not None:
+                # The table is built again to time it without the rest of the grid
+                start = time.perf_counter()
+                RouteTable(grid.topology)
+                table = "{:.3f}".format(time.perf_counter() - start)
+                memory = "{:.2f}".format(grid.routes.nbytes() / 1e6)
+            roads = sum(vehicle.roads_to_drive for vehicle in grid.vehicles) / num_vehicles
+            print("{:>10} {:>10} {:>10} {:>12} {:>12} {:>14.1f} {:>14.0f}".format(
+                "{}x{}".format(size, size), len(grid.topology.roads), routing, table, memory, roads,
+                time_choices(grid, rng)))
+
+    config.ROUTING = 'random'
+    for size in MEMORY_GRID_SIZES:
+        config.GRID_WIDTH = config.GRID_HEIGHT = size
+        network = setup.generate_network(random.Random(config.RANDOM_SEED))
+        memory = size * size * len(network['road_origin']) / 1e6
+        print("{:>10} {:>10} {:>10} {:>12} {:>12.2f}".format(
+            "{}x{}".format(size, size), len(network['road_origin']), "shortest", "-", memory))
+
+
+if __name__ == "__main__":
+    main()
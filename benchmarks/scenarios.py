@@ -0,0 +1,76 @@
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import config
+import simulation
+from benchmarks.shared_network import RECURSION_LIMIT, deep
+from models.grid import Grid
+from models.traffic_light_models.clock import Clock
+from services import scenario_service
+
+# The benchmarked grids (width = height), with VEHICLES_PER_INTERSECTION vehicles per intersection
+GRID_SIZES = [10, 30, 100]
+VEHICLES_PER_INTERSECTION = 10
+# Simulating the loaded grid (to check that it is the same scenario) takes too long for the largest grids
+SIMULATION_MAX = 30
+
+
+def timed(function, *args):
+    """
+    Returns the result of function(*args) and the time it took in seconds.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def simulated(grid):
+    """
+    Returns the results of every vehicle after simulating the grid with the Clock model.
+    """
+    rng = random.Random(config.RANDOM_SEED)
+    model = Clock()
+    model.setup(grid, rng)
+    simulation.run(grid, model, rng)
+    results = [(vehicle.steps_driving, vehicle.steps_waiting) for vehicle in grid.vehicles]
+    grid.reset()
+    return results
+
+
+def main():
+    sys.setrecursionlimit(RECURSION_LIMIT)
+    print("{:>10} {:>10} {:>14} {:>12} {:>12} {:>12} {:>12} {:>12} {:>10}".format(
+        "grid", "vehicles", "generate (s)", "write (s)", "file (kB)", "npz (kB)", "pickle (kB)", "load (s)", "same"))
+    with tempfile.TemporaryDirectory() as folder:
+        for size in GRID_SIZES:
+            config.GRID_WIDTH = config.GRID_HEIGHT = size
+            num_vehicles = size * size * VEHICLES_PER_INTERSECTION
+            file_path = os.path.join(folder, '{}.scenario'.format(size))
+
+            grid, generate = timed(Grid, num_vehicles, random.Random(config.RANDOM_SEED))
+            _, write = timed(scenario_service.write_scenario, file_path, grid)
+            loaded, load = timed(scenario_service.read_scenario, file_path)
+
+            # The same arrays as a (compressed) npz file, and the grid as a pickle
+            npz_path = os.path.join(folder, '{}.npz'.format(size))
+            np.savez_compressed(npz_path, **grid.export_scenario())
+            pickled = deep(pickle.dumps, grid, pickle.HIGHEST_PROTOCOL)
+
+            exported, loaded_exported = grid.export_scenario(), loaded.export_scenario()
+            same = all(np.array_equal(exported[name], loaded_exported[name]) for name in exported)
+            if size <= SIMULATION_MAX:
+                same = same and simulated(grid) == simulated(loaded)
+
+            print("{:>10} {:>10} {:>14.3f} {:>12.3f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.3f} {:>10}".format(
+                "{}x{}".format(size, size), num_vehicles, generate, write, os.path.getsize(file_path) / 1e3,
+                os.path.getsize(npz_path) / 1e3, len(pickled) / 1e3, load, str(same)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import multiprocessing
+import pickle
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+import config
+from models.grid import Grid
+from services import shared_memory_service
+
+# The benchmarked grids (width = height), and the number of worker processes that receive them
+GRID_SIZES = [10, 40, 100]
+WORKERS = 4
+# The Grid is a deeply nested object graph, which pickle walks recursively (in a thread with a large stack)
+RECURSION_LIMIT = 1000000
+STACK_SIZE = 1024 * 1024 * 1024
+
+
+def private_memory():
+    """
+    Returns the memory of this process that is not shared with other processes in bytes (Linux only).
+    """
+    private = 0
+    with open('/proc/self/smaps_rollup') as file:
+        for line in file:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                private += int(line.split()[1]) * 1024
+    return private
+
+
+def deep(function, *args):
+    """
+    Returns function(*args), called in a thread with a stack of STACK_SIZE bytes.
+    """
+    result = []
+    threading.stack_size(STACK_SIZE)
+    thread = threading.Thread(target=lambda: result.append(function(*args)))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def pickled_worker(connection):
+    """
+    Receive the network as a pickled Grid (without vehicles), and send back the time it took and the private memory it
+    added.
+    """
+    before = private_memory()
+    connection.send('ready')
+    start = time.perf_counter()
+    grid = deep(pickle.loads, connection.recv_bytes())
+    connection.send((time.perf_counter() - start, private_memory() - before))
+    # Keep the grid until the parent is done measuring.
+    connection.recv()
+    del grid
+
+
+def shared_worker(connection):
+    """
+    Attach to the network arrays in shared memory and build a Grid (without vehicles) from them, and send back the time
+    it took and the private memory it added.
+    """
+    before = private_memory()
+    connection.send('ready')
+    start = time.perf_counter()
+    memory, network = shared_memory_service.attach_arrays(connection.recv())
+    grid = Grid(0, random.Random(), network)
+    connection.send((time.perf_counter() - start, private_memory() - before))
+    connection.recv()
+    del grid, network
+    memory.close()
+
+
+def measure(worker, payload, send):
+    """
+    Start WORKERS processes running worker, send them the payload once they are ready (with send) and returns the mean
+    time (in milliseconds) and private memory (in MB) it took them to get the network.
+    """
+    connections, processes = [], []
+    for _ in range(WORKERS):
+        parent_connection, child_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=worker, args=(child_connection,))
+        process.start()
+        connections.append(parent_connection)
+        processes.append(process)
+
+    results = []
+    for connection in connections:
+        connection.recv()
+        send(connection, payload)
+        results.append(connection.recv())
+    for connection, process in zip(connections, processes):
+        connection.send('done')
+        process.join()
+
+    times, memory = zip(*results)
+    return np.mean(times) * 1e3, np.mean(memory) / 1e6
+
+
+def main():
+    sys.setrecursionlimit(RECURSION_LIMIT)
+    print("{:>10} {:>16} {:>14} {:>14} {:>16}".format("grid", "", "payload (kB)", "startup (ms)", "private (MB)"))
+    for size in GRID_SIZES:
+        config.GRID_WIDTH = config.GRID_HEIGHT = size
+        grid = Grid(0, random.Random(config.RANDOM_SEED))
+
+        payload = deep(pickle.dumps, grid, pickle.HIGHEST_PROTOCOL)
+        startup, memory = measure(pickled_worker, payload, lambda connection, data: connection.send_bytes(data))
+        print("{:>10} {:>16} {:>14.1f} {:>14.2f} {:>16.2f}".format(
+            "{}x{}".format(size, size), "pickled grid", len(payload) / 1e3, startup, memory))
+
+        block, spec = shared_memory_service.publish_arrays(grid.topology.network_arrays())
+        try:
+            startup, memory = measure(shared_worker, spec, lambda connection, data: connection.send(data))
+        finally:
+            block.close()
+            block.unlink()
+        print("{:>10} {:>16} {:>14.1f} {:>14.2f} {:>16.2f}".format(
+            "", "shared arrays", block.size / 1e3, startup, memory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import config
+import main
+
+# The (small) sweep that is timed
+TRAFFIC_LOAD_NUM = 4
+TRAFFIC_LOAD_END = 1000
+SIMULATIONS_PER_MODEL = 8
+
+
+def new_data(models):
+    """
+    Returns the empty data of the models, like main.main.
+    """
+    return {model: {name: np.zeros(config.TRAFFIC_LOAD_NUM) for name in ('score', 'waiting_steps', 'traffic_lights',
+                                                                        'steps')} for model in models}
+
+
+def time_sweep(traffic_loads, workers, results_path):
+    """
+    Returns the wall-clock time of the sweep in seconds and its data, serial (workers is None) or with a pool of
+    workers processes.
+    """
+    models = [model_class() for model_class in main.MODELS]
+    data = new_data(models)
+    config.PARALLEL_WORKERS = workers
+
+    start = time.perf_counter()
+    if workers is None:
+        main.simulate_sweep(traffic_loads, models, data, results_path, main.ENGINES.get(config.SIMULATION_ENGINE))
+    else:
+        main.simulate_parallel(traffic_loads, models, data, results_path)
+    return time.perf_counter() - start, [values['score'] for values in data.values()]
+
+
+def run_benchmark(workers):
+    config.TRAFFIC_LOAD_NUM = TRAFFIC_LOAD_NUM
+    config.TRAFFIC_LOAD_END = TRAFFIC_LOAD_END
+    config.SIMULATIONS_PER_MODEL = SIMULATIONS_PER_MODEL
+    # Every sweep simulates all grids, instead of reading the results of the previous one from the cache.
+    config.RESULT_CACHE_PATH = None
+    traffic_loads = np.linspace(config.TRAFFIC_LOAD_START, config.TRAFFIC_LOAD_END, config.TRAFFIC_LOAD_NUM, dtype=int)
+
+    with tempfile.TemporaryDirectory() as results_path:
+        serial_time, serial_scores = time_sweep(traffic_loads, None, results_path)
+        one_time, one_scores = time_sweep(traffic_loads, 1, results_path)
+        pool_time, pool_scores = time_sweep(traffic_loads, workers, results_path)
+
+    print("{:<24} {:8.2f} s".format("serial", serial_time))
+    print("{:<24} {:8.2f} s ({:.2f}x)".format("pool of 1 worker", one_time, serial_time / one_time))
+    print("{:<24} {:8.2f} s ({:.2f}x)".format("pool of {} workers".format(workers), pool_time, serial_time / pool_time))
+    print("same results serial, with 1 and with {} workers: {}".format(
+        workers, all(np.array_equal(a, b) and np.array_equal(a, c)
+                     for a, b, c in zip(serial_scores, one_scores, pool_scores))))
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count())
@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import config
+import main
+import worker
+from benchmarks.sweep import new_data
+
+# The (small) sweep that is timed
+TRAFFIC_LOAD_NUM = 4
+TRAFFIC_LOAD_END = 1000
+SIMULATIONS_PER_MODEL = 8
+
+
+def time_sweep(traffic_loads, workers, directory):
+    """
+    Returns the wall-clock time of the sweep in seconds and its data, with the cells published to a work queue in
+    directory and simulated by workers worker processes (on this machine).
+    """
+    models = [model_class() for model_class in main.MODELS]
+    data = new_data(models)
+    # Every sweep gets its own queue, so the workers do not see that the previous sweep stopped.
+    config.QUEUE_PATH = os.path.join(directory, 'queue-{}'.format(workers))
+
+    start = time.perf_counter()
+    processes = [multiprocessing.Process(target=worker.work, args=(config.QUEUE_PATH,)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    main.simulate_distributed(traffic_loads, models, data, directory)
+    for process in processes:
+        process.join()
+    return time.perf_counter() - start, [values['score'] for values in data.values()]
+
+
+def run_benchmark(max_workers):
+    config.TRAFFIC_LOAD_NUM = TRAFFIC_LOAD_NUM
+    config.TRAFFIC_LOAD_END = TRAFFIC_LOAD_END
+    config.SIMULATIONS_PER_MODEL = SIMULATIONS_PER_MODEL
+    # Every sweep simulates all grids, instead of reading the results of the previous one from the cache.
+    config.RESULT_CACHE_PATH = None
+    config.POLL_INTERVAL = .05
+    traffic_loads = np.linspace(config.TRAFFIC_LOAD_START, config.TRAFFIC_LOAD_END, config.TRAFFIC_LOAD_NUM, dtype=int)
+    num_cells = TRAFFIC_LOAD_NUM * SIMULATIONS_PER_MODEL
+
+    print("{:<12} {:>10} {:>12} {:>10}".format("workers", "time (s)", "cells/s", "speedup"))
+    scores = []
+    with tempfile.TemporaryDirectory() as directory:
+        workers = 1
+        while workers <= max_workers:
+            sweep_time, sweep_scores = time_sweep(traffic_loads, workers, directory)
+            if not scores:
+                one_time = sweep_time
+            scores.append(sweep_scores)
+            print("{:<12} {:>10.2f} {:>12.2f} {:>10.2f}".format(workers, sweep_time, num_cells / sweep_time,
+                                                                one_time / sweep_time))
+            workers *= 2
+
+    print("same results with every number of workers: {}".format(
+        all(np.array_equal(a, b) for other in scores[1:] for a, b in zip(scores[0], other))))
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count())
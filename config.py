@@ -1,13 +1,40 @@
 # Simulation
-RANDOM_SEED = 42
+RANDOM_SEED = 42  # Every grid and every (grid, model) simulation draws from its own stream seeded with this
 TRAFFIC_LOAD_NUM = 20
 TRAFFIC_LOAD_START = 10
 TRAFFIC_LOAD_END = 3000
-SIMULATIONS_PER_MODEL = 100
+SIMULATIONS_PER_MODEL = 100  # The number of grids per traffic load (the maximum with adaptive replicas)
+ADAPTIVE_REPLICAS = False  # Stop adding grids once the confidence intervals of the scores are narrow enough
+MIN_SIMULATIONS_PER_MODEL = 10  # The number of grids before the confidence intervals are checked
+SIMULATIONS_PER_ROUND = 5  # The number of grids added at a time, until the confidence intervals are narrow enough
+CONFIDENCE_LEVEL = .95
+CONFIDENCE_INTERVAL_WIDTH = .1  # The width of the confidence intervals of the mean scores and their differences
+RANDOM_NUMBERS = 'python'  # 'python' (random.Random, one call per number) or 'blocks' (BlockRandom, drawn in blocks)
+RANDOM_BLOCK_SIZE = 4096  # The number of random choices BlockRandom draws at once (for every length of sequence)
+SIMULATION_ENGINE = 'object'  # 'object' (simulation.run), 'array', 'event' or 'batched' (all replicas at once, array engine)
+PARALLEL_WORKERS = None  # Simulate the grids in a pool of PARALLEL_WORKERS processes (not with adaptive replicas)
+SHARED_NETWORK = False  # Simulate all grids on one network (with their own vehicles), shared with the pool workers
+CHECKPOINT_INTERVAL = None  # Write a checkpoint every CHECKPOINT_INTERVAL steps (only the 'object' engine)
+CHECKPOINT_PATH = './results/checkpoint.npz'  # The checkpoint, which a simulation of the same grid resumes from
+RESULT_CACHE_PATH = None  # Cache the results of every (grid, model) simulation here, e.g. './results/cache/' (opt-in)
+SCENARIO_PATH = None  # Grids are loaded from the scenario files in this folder, or generated and saved to it
+QUEUE_PATH = None  # Publish the (traffic load, replica) cells to a work queue in this folder, for worker.py processes
+LEASE_TIME = 60  # The seconds after which a cell of a worker that stopped renewing its lease (died) is leased again
+POLL_INTERVAL = .5  # The seconds between looking for cells (workers) or results (main.py) in the work queue
+
+# Open system: vehicles keep arriving at the intersections and leave once finished (instead of a fixed number of
+# vehicles), and the results are reported over sliding windows
+OPEN_SYSTEM = False
+OPEN_SYSTEM_STEPS = 10000  # The number of steps to simulate (for every model)
+ARRIVAL_RATE = 10  # The mean number of vehicles arriving per step (Poisson)
+ARRIVAL_TRACE = None  # A csv file (columns step, x, y, roads_to_drive) with the arrivals, used instead of ARRIVAL_RATE
+WINDOW_LENGTH = 1000  # The number of steps in a window
+WINDOW_STRIDE = 100  # The number of steps between windows
 
 # Grid
 GRID_WIDTH = 10
 GRID_HEIGHT = 10
+GRID_GENERATOR = 'sequential'  # 'sequential' (setup_intersections) or 'vectorized' (generate_network, for large grids)
 
 # Road
 ROAD_PROBABILITY = .9  # The probability of an intersection being connected to a neighbouring one (one-directional)
@@ -17,12 +44,19 @@ ROAD_LENGTH_DIFF = 85*[0] + 10*[+1] + 5*[+2]
 # Lane
 LANE_PROBABILITY = .9  # The probability of a lane at the end of a road
 TRAFFIC_LIGHT_LENGTH = 1  # How many steps a traffic light will be GREEN
+DECISION_CACHE_SIZE = None  # The decisions the Local and Global Optimum models keep in an LRU cache (None: no cache)
+PREDICTIVE_HORIZON = 5  # The number of steps the Model Predictive model simulates every phase ahead
+PREDICTIVE_SAMPLES = 8  # The number of samples of the random choices the phases of the Model Predictive model share
+PREDICTIVE_LATENCY_BUDGET = .001  # The seconds a Model Predictive decision may take (longer decisions are counted)
 FLOW_THROUGH_BASE = 8  # The number of vehicles that can drive in one step when a light turns GREEN
 FLOW_THROUGH_DIFF = 5*[+1] + 80*[0] + 10*[-1] + 5*[-2]
 
 # Vehicle
 VEHICLE_MIN_ROADS = (GRID_WIDTH+GRID_HEIGHT) // 2
 VEHICLE_MAX_ROADS = (GRID_WIDTH+GRID_HEIGHT) * 2
+# 'random' (a random lane at the end of every road) or 'shortest' (to a random destination along the shortest path, so
+# the number of roads to drive is the length of that path)
+ROUTING = 'random'
 
 # Results
 RESULTS_FOLDER_PATH = './results/'
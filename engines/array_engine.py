@@ -0,0 +1,448 @@
+import numpy as np
+
+import config
+from engines.block_random import BlockRandom
+from models.light import Light
+from models.traffic_light_models.traffic_light_models import NetworkArrays
+
+# The location of a vehicle
+IN_LANE = 0
+ON_ROAD = 1
+FINISHED = 2
+
+# The initial capacity of the lane queue ring buffers (doubled whenever a queue does not fit)
+INITIAL_QUEUE_CAPACITY = 16
+
+
+class _CountView(object):
+    """
+    Stands in for Lane.queue and the sections of a Road while the array engine runs. The traffic light models only look at
+    the number of vehicles, so the view exposes the length of an entry in one of the engine's count arrays.
+    """
+    __slots__ = ('counts', 'index')
+
+    def __init__(self, counts, index):
+        self.counts = counts
+        self.index = index
+
+    def __len__(self):
+        return int(self.counts[self.index])
+
+
+def concatenate(arrays, offsets=None):
+    """
+    Concatenate the arrays of the replicas, adding offsets[replica] to the values (if given).
+    """
+    if offsets is not None:
+        arrays = [array + offset for array, offset in zip(arrays, offsets)]
+    return np.concatenate(arrays)
+
+
+class ArrayGrid(object):
+    """
+    One or more Grids (replicas) compiled into flat arrays (structure of arrays). The replicas are stacked: the roads,
+    lanes and vehicles of replica k follow those of replica k - 1. Within a replica, roads and lanes are ordered by their
+    id in the Topology, which is the order in which simulation.run visits them, and vehicles by their index in
+    Grid.vehicles. Every replica draws from its own random number generator, in exactly the same order as
+    simulation.run.
+    """
+    def __init__(self, grids, traffic_light_models, rngs):
+        self.grids = grids
+        self.traffic_light_models = traffic_light_models
+        self.num_replicas = len(grids)
+        topologies = [grid.topology for grid in grids]
+
+        # The random number generator of every replica (which its traffic light model was set up with as well). Block
+        # random number generators draw the choices of all lanes or vehicles of a replica at once.
+        self.rngs = rngs
+        self.block_random = all(isinstance(rng, BlockRandom) for rng in rngs)
+        self.flow_through_diff = np.array(config.FLOW_THROUGH_DIFF, dtype=np.int64)
+
+        # The first intersection, road and lane of every replica
+        intersection_offsets = np.cumsum([0] + [len(topology.intersections) for topology in topologies])
+        road_offsets = np.cumsum([0] + [len(topology.roads) for topology in topologies])
+        lane_offsets = np.cumsum([0] + [len(topology.lanes) for topology in topologies])
+
+        self.num_intersections = int(intersection_offsets[-1])
+        self.roads = [road for topology in topologies for road in topology.roads]
+        self.lanes = [lane for topology in topologies for lane in topology.lanes]
+
+        # The road a lane goes to, and the lanes at the end of each road (to choose from)
+        self.lane_goes_to_road = concatenate([t.lane_goes_to_road for t in topologies], road_offsets)
+        self.lane_has_traffic_light = concatenate([t.lane_has_traffic_light for t in topologies])
+        self.lane_road = concatenate([t.lane_road for t in topologies], road_offsets)
+        self.road_lanes = [tuple(int(lane_id) + lane_offset for lane_id in topology.road_lanes[start:end])
+                           for topology, lane_offset in zip(topologies, lane_offsets)
+                           for start, end in zip(topology.road_lane_offsets[:-1], topology.road_lane_offsets[1:])]
+        self.road_length = concatenate([t.road_length for t in topologies])
+        # The first lane and the number of lanes of every road (the lanes of a road have consecutive ids)
+        self.road_first_lane = np.array([lanes[0] if lanes else -1 for lanes in self.road_lanes], dtype=np.int64)
+        self.road_num_lanes = np.array([len(lanes) for lanes in self.road_lanes], dtype=np.int64)
+
+        # The intersection a lane is at (and its bit in the lane masks of the intersection), and the intersection a
+        # road goes to
+        self.lane_intersection = concatenate([t.lane_intersection for t in topologies], intersection_offsets)
+        self.lane_bit = np.array([lane.bit for lane in self.lanes], dtype=np.int64)
+        self.road_destination = concatenate([t.road_destination for t in topologies], intersection_offsets)
+
+        # The replica of every lane
+        self.lane_replica = np.repeat(np.arange(self.num_replicas), np.diff(lane_offsets))
+
+        # The light state of every lane (bitmask: True is GREEN). Lanes without a traffic light are always GREEN.
+        self.green = np.array([lane.is_green() for lane in self.lanes], dtype=bool) | ~self.lane_has_traffic_light
+
+        # The intersections with traffic lights, with their replica and their lanes (with their index), which are used
+        # to read back the light states. The intersections that were never updated are updated even without vehicles.
+        self.intersections = [intersection for topology in topologies for intersection in topology.intersections]
+        self.intersection_replica = np.repeat(np.arange(self.num_replicas), np.diff(intersection_offsets))
+        self.intersection_has_traffic_lights = np.array(
+            [intersection.has_traffic_lights for intersection in self.intersections], dtype=bool)
+        self.lanes_with_traffic_lights = [
+            [(lane.id + lane_offset, lane) for lane in intersection.get_all_lanes_with_traffic_lights()]
+            for topology, lane_offset in zip(topologies, lane_offsets) for intersection in topology.intersections
+        ]
+        self.never_updated = self.intersection_has_traffic_lights.copy()
+        # The step at which the traffic lights of an intersection were updated last (-1 if never), and the number of
+        # steps between updates
+        self.last_update = np.full(self.num_intersections, -1, dtype=np.int64)
+        self.traffic_light_length = np.array(
+            [intersection.traffic_light_length or 0 for intersection in self.intersections], dtype=np.int64)
+
+        # Vehicle state vectors
+        self.vehicles = [vehicle for grid in grids for vehicle in grid.vehicles]
+        vehicles = self.vehicles
+        vehicle_ids = {vehicle: vehicle_id for vehicle_id, vehicle in enumerate(vehicles)}
+        self.vehicle_replica = np.repeat(np.arange(self.num_replicas), [len(grid.vehicles) for grid in grids])
+        self.roads_to_drive = np.array([v.roads_to_drive for v in vehicles], dtype=np.int64)
+        self.steps_waiting = np.array([v.steps_waiting for v in vehicles], dtype=np.int64)
+        self.steps_driving = np.array([v.steps_driving for v in vehicles], dtype=np.int64)
+        self.number_of_encountered_traffic_lights = np.array(
+            [v.number_of_encountered_traffic_lights for v in vehicles], dtype=np.int64)
+        self.step_entered = np.array([v.step_entered for v in vehicles], dtype=np.int64)
+        # With shortest path routing, the next lane tables of the replicas are concatenated, and the lane a vehicle at
+        # the end of a road takes is next_lane[vehicle_route[vehicle] + road] lanes after the first lane of the road.
+        self.routing = grids[0].routes is not None
+        if self.routing:
+            tables = [grid.routes.next_lane for grid in grids]
+            table_offsets = np.cumsum([0] + [table.size for table in tables])
+            self.next_lane = np.concatenate([table.ravel() for table in tables]).astype(np.int64)
+            self.vehicle_route = np.array([table_offsets[replica] + vehicle.destination * len(topology.roads) -
+                                           road_offsets[replica] for replica, (grid, topology) in
+                                           enumerate(zip(grids, topologies)) for vehicle in grid.vehicles],
+                                          dtype=np.int64)
+        self.location = np.full(len(vehicles), IN_LANE, dtype=np.int8)
+        self.road = np.full(len(vehicles), -1, dtype=np.int64)
+
+        # Lane queues are ring buffers: queue[lane, (head + i) % capacity] is the i-th vehicle in the queue
+        capacity = INITIAL_QUEUE_CAPACITY
+        while capacity < max([len(lane.queue) for lane in self.lanes] + [0]):
+            capacity *= 2
+        self.queue = np.zeros((len(self.lanes), capacity), dtype=np.int32)
+        self.queue_head = np.zeros(len(self.lanes), dtype=np.int64)
+        self.queue_size = np.zeros(len(self.lanes), dtype=np.int64)
+        for lane_id, lane in enumerate(self.lanes):
+            self.queue[lane_id, :len(lane.queue)] = [vehicle_ids[vehicle] for vehicle in lane.queue]
+            self.queue_size[lane_id] = len(lane.queue)
+
+        # Road occupancy. Road.enter puts a vehicle in the first section, which is also the section the next
+        # Road.update empties, so every vehicle leaves a road one step after entering it (whatever the length of the
+        # road). The vehicles on the roads are therefore exactly those that crossed an intersection at the previous
+        # step, kept in the order in which they entered.
+        self.on_road = np.zeros(0, dtype=np.int64)
+        self.road_occupancy = np.zeros(len(self.roads), dtype=np.int64)
+        # The number of vehicles in Road.last_section(), which is only the entry section for roads of length one
+        self.approaching = np.zeros(len(self.roads), dtype=np.int64)
+
+        # The number of vehicles that are driving, per replica. Replicas without vehicles are finished and skipped.
+        self.vehicles_driving = np.bincount(self.vehicle_replica, minlength=self.num_replicas)
+
+        # The arrays the batch updates of the traffic light models read (see TrafficLightModel.update_all)
+        self.network = NetworkArrays(self.intersections, [[lane_id for lane_id, _ in lanes]
+                                                          for lanes in self.lanes_with_traffic_lights],
+                                     self.lane_bit, self.lane_road, self.lane_goes_to_road, self.road_first_lane,
+                                     self.road_num_lanes, self.queue_size, self.approaching, self.road_occupancy)
+
+    def is_finished(self):
+        """
+        True if the vehicles of all replicas are finished, False otherwise.
+        """
+        return not self.vehicles_driving.any()
+
+    def bind_views(self):
+        """
+        Replace the queues and sections of the Grids by count views, so that the traffic light models see the state of
+        the arrays. The occupancy indexes of the intersections are set from the arrays as well (see
+        update_traffic_lights). Returns the replaced objects, which are put back by unbind_views.
+        """
+        replaced = ([lane.queue for lane in self.lanes], [road.sections for road in self.roads])
+        for lane_id, lane in enumerate(self.lanes):
+            lane.queue = _CountView(self.queue_size, lane_id)
+        for road_id, road in enumerate(self.roads):
+            # The vehicles on the road are in the first section, sections[head], and Road.last_section() reads
+            # sections[head - 1] (the same section for roads of length one). The other sections are empty.
+            sections = [()] * len(road.sections)
+            sections[road.head] = _CountView(self.road_occupancy, road_id)
+            sections[road.head - 1] = _CountView(self.approaching, road_id)
+            road.sections = sections
+        return replaced
+
+    def unbind_views(self, replaced):
+        """
+        Put back the queues and sections replaced by bind_views, and count their vehicles in the occupancy indexes.
+        """
+        queues, sections = replaced
+        for lane, queue in zip(self.lanes, queues):
+            lane.queue = queue
+        for road, road_sections in zip(self.roads, sections):
+            road.sections = road_sections
+        for intersection in self.intersections:
+            intersection.recount()
+
+    def choice_indices(self, replicas, lengths):
+        """
+        Returns a random index into a sequence of lengths[i] for every draw i, drawn from the block random number
+        generator of replicas[i]. The draws are ordered by replica.
+        """
+        indices = np.zeros(len(lengths), dtype=np.int64)
+        bounds = np.searchsorted(replicas, np.arange(self.num_replicas + 1))
+        for replica, start, end in zip(range(self.num_replicas), bounds[:-1], bounds[1:]):
+            if start < end:
+                indices[start:end] = self.rngs[replica].choice_indices(lengths[start:end])
+        return indices
+
+    def update_traffic_lights(self, step):
+        """
+        Update the traffic lights using the traffic light models and read back the new light states. Intersections
+        without vehicles waiting or driving towards them are skipped (after their first update), like in
+        simulation.run.
+        """
+        vehicles_waiting = np.bincount(self.lane_intersection, weights=self.queue_size,
+                                       minlength=self.num_intersections).astype(np.int64)
+        vehicles_approaching = np.bincount(self.road_destination, weights=self.road_occupancy,
+                                           minlength=self.num_intersections).astype(np.int64)
+        intersections = np.flatnonzero(self.intersection_has_traffic_lights &
+                                       ((vehicles_waiting + vehicles_approaching > 0) | self.never_updated))
+        self.never_updated[intersections] = False
+
+        # Catch up on the updates that were skipped since the previous update, and update the intersections whose
+        # traffic lights change at this step (see update_traffic_lights)
+        last_update = self.last_update[intersections]
+        length = self.traffic_light_length[intersections]
+        skipped = np.where(last_update >= 0, np.maximum((step - 1 - last_update) // length, 0), 0)
+        due = step % length == 0
+        self.last_update[intersections] = np.where(due, step, last_update + skipped * length)
+        updated = (skipped > 0) | due
+        intersections, skipped, due = intersections[updated], skipped[updated], due[updated]
+
+        # The intersections are ordered by replica. The traffic light model of a replica updates its intersections at
+        # once, or one by one if it has no batch update.
+        bounds = np.searchsorted(self.intersection_replica[intersections], np.arange(self.num_replicas + 1))
+        for replica, start, end in zip(range(self.num_replicas), bounds[:-1], bounds[1:]):
+            if start == end:
+                continue
+            traffic_light_model = self.traffic_light_models[replica]
+            green = traffic_light_model.update_all(self.network, intersections[start:end], skipped[start:end],
+                                                   due[start:end])
+            if green is None:
+                self.update_one_by_one(traffic_light_model, intersections[start:end], skipped[start:end],
+                                       due[start:end], vehicles_waiting, vehicles_approaching)
+            else:
+                lanes = self.network.lanes[intersections[start:end]]
+                is_green = (self.network.lane_bits[intersections[start:end]] & green[:, None]) != 0
+                self.green[lanes[lanes >= 0]] = is_green[lanes >= 0]
+
+    def update_one_by_one(self, traffic_light_model, intersections, skipped, due, vehicles_waiting,
+                          vehicles_approaching):
+        """
+        Update the intersections one by one with a traffic light model without a batch update (see
+        update_traffic_lights), and read back the new light states. The models draw from the random number generator of
+        their replica, and read the occupancy index of the intersection, which is set from the arrays first.
+        """
+        # The bits of the lanes of an intersection differ, so their sum is their mask
+        lanes_occupied = np.bincount(self.lane_intersection, weights=self.lane_bit * (self.queue_size > 0),
+                                     minlength=self.num_intersections).astype(np.int64)
+        for index, ticks, is_due in zip(intersections.tolist(), skipped.tolist(), due.tolist()):
+            intersection = self.intersections[index]
+            intersection.vehicles_waiting = int(vehicles_waiting[index])
+            intersection.vehicles_approaching = int(vehicles_approaching[index])
+            intersection.lanes_occupied = int(lanes_occupied[index])
+            intersection.changes += 1
+            if ticks > 0:
+                traffic_light_model.update_idle(intersection, ticks)
+            if is_due:
+                traffic_light_model.update(intersection)
+            for lane_id, lane in self.lanes_with_traffic_lights[index]:
+                self.green[lane_id] = lane.traffic_light == Light.GREEN
+
+    def update_roads(self, step):
+        """
+        All vehicles on the roads reach the end of the road. Vehicles that are not finished choose a lane and get in
+        its queue.
+        """
+        # Vehicles leave the roads in road order, and in the order they entered within a road.
+        vehicles = self.on_road[np.argsort(self.road[self.on_road], kind='stable')]
+        self.on_road = np.zeros(0, dtype=np.int64)
+        self.road_occupancy[:] = 0
+        self.approaching[:] = 0
+
+        self.steps_driving[vehicles] += step - self.step_entered[vehicles] - 1
+        self.roads_to_drive[vehicles] -= 1
+        finished = self.roads_to_drive[vehicles] == 0
+        self.location[vehicles[finished]] = FINISHED
+        self.vehicles_driving -= np.bincount(self.vehicle_replica[vehicles[finished]], minlength=self.num_replicas)
+
+        # Choose the lanes (one random number per vehicle, in order), or look them up in the routes
+        vehicles = vehicles[~finished]
+        if self.routing:
+            roads = self.road[vehicles]
+            lanes = self.road_first_lane[roads] + self.next_lane[self.vehicle_route[vehicles] + roads]
+        elif self.block_random:
+            roads = self.road[vehicles]
+            lanes = self.road_first_lane[roads] + self.choice_indices(self.vehicle_replica[vehicles],
+                                                                      self.road_num_lanes[roads])
+        else:
+            choices = [rng.choice for rng in self.rngs]
+            lanes = np.array([choices[replica](self.road_lanes[road])
+                              for road, replica in zip(self.road[vehicles], self.vehicle_replica[vehicles])],
+                             dtype=np.int64)
+        self.number_of_encountered_traffic_lights[vehicles] += self.lane_has_traffic_light[lanes]
+        self.location[vehicles] = IN_LANE
+        self.step_entered[vehicles] = step
+        self.enqueue(lanes, vehicles)
+
+    def update_lanes(self, step):
+        """
+        Update the vehicles in the lanes: on GREEN the first flow_through vehicles cross the intersection, the others
+        wait. Only the crossing vehicles are touched, their steps waiting are added when they leave the lane.
+        """
+        # Draw the flow through of every GREEN lane with vehicles (one random number per lane, in order)
+        green_lanes = np.flatnonzero(self.green & (self.queue_size > 0))
+        if self.block_random:
+            replicas = self.lane_replica[green_lanes]
+            flow_through = config.FLOW_THROUGH_BASE + self.flow_through_diff[
+                self.choice_indices(replicas, np.full(len(replicas), len(self.flow_through_diff)))]
+        else:
+            choices = [rng.choice for rng in self.rngs]
+            flow_through = np.array([config.FLOW_THROUGH_BASE + choices[replica](config.FLOW_THROUGH_DIFF)
+                                     for replica in self.lane_replica[green_lanes]], dtype=np.int64)
+        # Same as the length of queue[:flow_through]
+        queue_size = self.queue_size[green_lanes]
+        num_crossing = np.where(flow_through >= 0, np.minimum(flow_through, queue_size),
+                                np.maximum(queue_size + flow_through, 0))
+
+        # The vehicles at the front of the queues cross the intersection and enter the road
+        crossing = self.dequeue(green_lanes, num_crossing)
+        crossing_lanes = np.repeat(green_lanes, num_crossing)
+        self.steps_waiting[crossing] += step - self.step_entered[crossing]
+        self.steps_driving[crossing] += 1
+        self.step_entered[crossing] = step
+        self.location[crossing] = ON_ROAD
+        self.road[crossing] = self.lane_goes_to_road[crossing_lanes]
+        self.on_road = crossing
+        np.add.at(self.road_occupancy, self.road[crossing], 1)
+        self.approaching[:] = np.where(self.road_length == 1, self.road_occupancy, 0)
+
+    def enqueue(self, lanes, vehicles):
+        """
+        Append the vehicles to the queues of the lanes (in the given order).
+        """
+        if len(vehicles) == 0:
+            return
+
+        order = np.argsort(lanes, kind='stable')
+        lanes, vehicles = lanes[order], vehicles[order]
+        starts = np.flatnonzero(np.r_[True, lanes[1:] != lanes[:-1]])
+        counts = np.diff(np.r_[starts, len(lanes)])
+        rank = np.arange(len(lanes)) - np.repeat(starts, counts)
+
+        self.ensure_capacity(int((self.queue_size[lanes[starts]] + counts).max()))
+        capacity = self.queue.shape[1]
+        self.queue[lanes, (self.queue_head[lanes] + self.queue_size[lanes] + rank) % capacity] = vehicles
+        self.queue_size[lanes[starts]] += counts
+
+    def dequeue(self, lanes, counts):
+        """
+        Remove counts[i] vehicles from the front of the queue of lanes[i]. Returns the vehicles in lane order.
+        """
+        rows = np.repeat(lanes, counts)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        capacity = self.queue.shape[1]
+        vehicles = self.queue[rows, (self.queue_head[rows] + offsets) % capacity].astype(np.int64)
+
+        self.queue_head[lanes] = (self.queue_head[lanes] + counts) % capacity
+        self.queue_size[lanes] -= counts
+        return vehicles
+
+    def ensure_capacity(self, size):
+        """
+        Grow the ring buffers (doubling the capacity) until a queue of size fits.
+        """
+        capacity = self.queue.shape[1]
+        if size <= capacity:
+            return
+
+        new_capacity = capacity
+        while new_capacity < size:
+            new_capacity *= 2
+
+        # Unroll every ring buffer so that it starts at index 0
+        queue = np.zeros((len(self.lanes), new_capacity), dtype=self.queue.dtype)
+        positions = (self.queue_head[:, None] + np.arange(capacity)) % capacity
+        queue[:, :capacity] = np.take_along_axis(self.queue, positions, axis=1)
+        self.queue = queue
+        self.queue_head[:] = 0
+
+    def write_back(self):
+        """
+        Write the vehicle statistics back to the Vehicle objects of the grids, and the light states to the Lanes (which
+        the batch updates do not set).
+        """
+        for lanes in self.lanes_with_traffic_lights:
+            for lane_id, lane in lanes:
+                lane.traffic_light = Light.GREEN if self.green[lane_id] else Light.RED
+        for vehicle_id, vehicle in enumerate(self.vehicles):
+            vehicle.roads_to_drive = int(self.roads_to_drive[vehicle_id])
+            vehicle.steps_waiting = int(self.steps_waiting[vehicle_id])
+            vehicle.steps_driving = int(self.steps_driving[vehicle_id])
+            vehicle.number_of_encountered_traffic_lights = int(self.number_of_encountered_traffic_lights[vehicle_id])
+            vehicle.step_entered = int(self.step_entered[vehicle_id])
+
+    def run(self):
+        """
+        Step all replicas in lock-step until all their vehicles are finished.
+        """
+        # The traffic light models work on the Grid objects, which mirror the arrays while running.
+        replaced = self.bind_views()
+        try:
+            # The current step in the simulation
+            step = 0
+
+            # Loop until all vehicles are finished.
+            while not self.is_finished():
+                self.update_traffic_lights(step)
+                self.update_roads(step)
+                self.update_lanes(step)
+
+                # Increment the step
+                step += 1
+        finally:
+            self.unbind_views(replaced)
+
+        self.write_back()
+
+
+def run(grid, traffic_light_model, rng):
+    """
+    Run the simulation on the grid with traffic_light_model and the random number generator rng, using the array
+    engine. Gives the same vehicle statistics as simulation.run, and leaves rng in the same state.
+    """
+    ArrayGrid([grid], [traffic_light_model], [rng]).run()
+
+
+def run_batch(grids, traffic_light_models, rngs):
+    """
+    Run the simulations of several grids (replicas) in lock-step, each with its own traffic light model (set up with
+    the random number generator rngs[k]). Replica k gives the same vehicle statistics as simulation.run on grids[k]
+    with rngs[k].
+    """
+    ArrayGrid(grids, traffic_light_models, rngs).run()
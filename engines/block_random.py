@@ -0,0 +1,90 @@
+import hashlib
+import itertools
+import json
+import random
+
+import numpy as np
+
+import config
+
+
+class BlockRandom(random.Random):
+    """
+    A random number generator that draws the random choices (flow through, lane choices, road lengths) in blocks from
+    NumPy generators, instead of one Python call per choice. Every length of sequence has its own generator and block
+    of indices, so the choices only depend on the order of the choices from sequences of the same length: drawing n of
+    them at once (see choice_indices) gives the same indices as n calls of choice. The other methods (shuffle, randint,
+    ...) are those of random.Random, seeded with the same seed.
+    """
+    def __init__(self, seed, block_size=None):
+        super().__init__(seed)
+        # The number of indices drawn at once
+        self.block_size = block_size or config.RANDOM_BLOCK_SIZE
+        self.entropy = int.from_bytes(hashlib.sha512(str(seed).encode()).digest(), 'big')
+        # The generator and the remaining indices of the block of every length of sequence (dictionary{int, iterator})
+        self.generators = {}
+        self.blocks = {}
+
+    def next_block(self, length):
+        """
+        Draw the next block of indices into sequences of length. Returns its iterator.
+        """
+        if length not in self.generators:
+            self.generators[length] = np.random.default_rng([self.entropy, length])
+        self.blocks[length] = iter(self.generators[length].integers(length, size=self.block_size).tolist())
+        return self.blocks[length]
+
+    def choice(self, seq):
+        """
+        Returns a random element of the non-empty sequence seq.
+        """
+        try:
+            return seq[next(self.blocks[len(seq)])]
+        except (KeyError, StopIteration):
+            if not seq:
+                raise IndexError('Cannot choose from an empty sequence')
+            return seq[next(self.next_block(len(seq)))]
+
+    def choice_indices(self, lengths):
+        """
+        Returns the array of random indices into sequences of the lengths (an array), the same indices as choice would
+        pick for them one by one.
+        """
+        indices = np.zeros(len(lengths), dtype=np.int64)
+        for length in np.unique(lengths).tolist():
+            mask = lengths == length
+            count = int(np.count_nonzero(mask))
+            drawn = list(itertools.islice(self.blocks.get(length, ()), count))
+            while len(drawn) < count:
+                drawn.extend(itertools.islice(self.next_block(length), count - len(drawn)))
+            indices[mask] = drawn
+        return indices
+
+    def get_block_state(self):
+        """
+        Returns the state of the NumPy generators and of the blocks as a dictionary{str, numpy array} (used for
+        checkpoints, next to getstate).
+        """
+        lengths = sorted(self.blocks)
+        remaining = [list(self.blocks[length]) for length in lengths]
+        for length, indices in zip(lengths, remaining):
+            self.blocks[length] = iter(indices)
+        return {
+            'generators': np.array(json.dumps({length: generator.bit_generator.state
+                                               for length, generator in self.generators.items()})),
+            'lengths': np.array(lengths, dtype=np.int64),
+            'sizes': np.array([len(indices) for indices in remaining], dtype=np.int64),
+            'indices': np.array([index for indices in remaining for index in indices], dtype=np.int64)
+        }
+
+    def set_block_state(self, state):
+        """
+        Restore the state returned by get_block_state.
+        """
+        self.generators = {}
+        for length, generator_state in json.loads(str(state['generators'])).items():
+            self.generators[int(length)] = np.random.default_rng()
+            self.generators[int(length)].bit_generator.state = generator_state
+        offsets = np.cumsum(np.concatenate(([0], state['sizes'])))
+        self.blocks = {length: iter(state['indices'][start:end].tolist()) for length, start, end in
+                       zip(state['lengths'].tolist(), offsets[:-1], offsets[1:])}
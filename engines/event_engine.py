@@ -0,0 +1,115 @@
+import heapq
+
+from models.traffic_light_models.traffic_light_models import update_traffic_lights
+
+# The kinds of events. Events at the same step are handled in this order, and in the order of the id of the
+# intersection, road or lane within a kind, which is the order in which simulation.run updates them.
+TRAFFIC_LIGHTS = 0
+ROAD_EXIT = 1
+LANE_DISCHARGE = 2
+
+
+class EventQueue(object):
+    """
+    A priority queue of (step, kind, id) events, which ignores events that are already scheduled.
+    """
+    def __init__(self):
+        self.heap = []
+        self.scheduled = set()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, step, kind, item_id):
+        """
+        Schedule an event (if it is not scheduled yet).
+        """
+        if (event := (step, kind, item_id)) not in self.scheduled:
+            self.scheduled.add(event)
+            heapq.heappush(self.heap, event)
+
+    def pop(self):
+        """
+        Remove and return the next event.
+        """
+        event = heapq.heappop(self.heap)
+        self.scheduled.remove(event)
+        return event
+
+
+def run(grid, traffic_light_model, rng):
+    """
+    Run the simulation on the grid with traffic_light_model and the random number generator rng, driven by events
+    instead of steps. Events are traffic light updates (once every traffic_light_length steps while an intersection has
+    vehicles), vehicles reaching the end of a road (Road.travel_time after entering it) and lanes letting vehicles cross
+    (while GREEN and not empty). The clock jumps from event to event. Gives the same vehicle statistics as
+    simulation.run.
+    """
+    topology = grid.topology
+
+    # Keep track of the number of vehicles that are driving.
+    vehicles_driving = len(grid.vehicles)
+
+    # The step at which the traffic lights of an intersection were updated last.
+    last_update = {}
+    # The intersections whose traffic lights are updated (with the step of the next update). Intersections without
+    # vehicles are left out until vehicles drive towards them.
+    awake = {}
+
+    events = EventQueue()
+
+    # All traffic lights are updated at the first step, and the lanes with vehicles let vehicles cross.
+    for intersection in topology.intersections_with_traffic_lights:
+        events.schedule(0, TRAFFIC_LIGHTS, intersection.id)
+        awake[intersection] = 0
+    for vehicle in grid.vehicles:
+        events.schedule(0, LANE_DISCHARGE, vehicle.lane.id)
+
+    while vehicles_driving and len(events):
+        step, kind, item_id = events.pop()
+
+        if kind == TRAFFIC_LIGHTS:
+            intersection = topology.intersections[item_id]
+            # Intersections without vehicles fall asleep, the updates they skip are caught up on when they wake up.
+            if not intersection.has_vehicles() and intersection in last_update:
+                del awake[intersection]
+                continue
+
+            update_traffic_lights(traffic_light_model, intersection, step, last_update)
+            next_update = step - step % intersection.traffic_light_length + intersection.traffic_light_length
+            events.schedule(next_update, TRAFFIC_LIGHTS, item_id)
+            awake[intersection] = next_update
+
+            # The lanes that are GREEN let vehicles cross.
+            for lane in intersection.get_all_lanes_with_traffic_lights():
+                if lane.is_green() and lane.has_vehicles():
+                    events.schedule(step, LANE_DISCHARGE, lane.id)
+
+        elif kind == ROAD_EXIT:
+            road = topology.roads[item_id]
+            vehicles_driving -= road.update(step, rng)
+            if road.has_vehicles():
+                events.schedule(step + 1, ROAD_EXIT, item_id)
+
+            # The vehicles that did not finish entered the lanes of the road.
+            for lane in road.get_all_lanes():
+                if lane.has_vehicles():
+                    events.schedule(step, LANE_DISCHARGE, lane.id)
+
+        elif kind == LANE_DISCHARGE:
+            lane = topology.lanes[item_id]
+            if not lane.has_vehicles() or (lane.has_traffic_light and not lane.is_green()):
+                continue
+
+            if lane.update_on_green(step, rng):
+                road = lane.goes_to_road
+                events.schedule(step + road.travel_time(), ROAD_EXIT, road.id)
+
+                # The intersection at the end of the road wakes up at the next step.
+                if (destination := road.destination).has_traffic_lights and destination not in awake:
+                    events.schedule(step + 1, TRAFFIC_LIGHTS, destination.id)
+                    awake[destination] = step + 1
+
+            # The remaining vehicles cross at the next step, if the light is still GREEN by then.
+            if lane.has_vehicles():
+                events.schedule(step + 1, LANE_DISCHARGE, item_id)
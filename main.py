@@ -1,9 +1,18 @@
+import functools
+import multiprocessing
+import os
 import random
+import time
+from statistics import NormalDist
+
 import numpy as np
 
 import config
+import open_system
 import simulation
-from services import file_service
+from services import cache_service, file_service, queue_service, scenario_service, shared_memory_service
+from engines import array_engine, event_engine
+from engines.block_random import BlockRandom
 from models.grid import Grid
 from models.traffic_light_models.clock import Clock
 from models.traffic_light_models.local_optimum import LocalOptimum
@@ -11,19 +20,394 @@ from models.traffic_light_models.first_come_first_serve import FirstComeFirstSer
 from models.traffic_light_models.global_optimum import GlobalOptimum
 from visualizations import plot
 
+# The simulation engines that can be selected with config.SIMULATION_ENGINE
+ENGINES = {
+    'object': simulation.run,
+    'array': array_engine.run,
+    'event': event_engine.run,
+}
+
+# The traffic light models that are compared
+MODELS = [Clock, FirstComeFirstServe, LocalOptimum, GlobalOptimum]
+
+# The network arrays that all grids are built from with config.SHARED_NETWORK (see get_network), and the block of shared
+# memory they are in (in pool workers)
+network = None
+network_memory = None
+
+
+def add_results(model_data, idx, results):
+    """
+    Add the results of a simulation to the data of the model at traffic load idx.
+    """
+    model_data['score'][idx] += results['simulation_score']
+    model_data['waiting_steps'][idx] += results['mean_number_of_waiting_steps']
+    model_data['traffic_lights'][idx] += results['mean_number_of_traffic_lights']
+    model_data['steps'][idx] += results['mean_number_of_steps']
+
+
+def task_seed(*key):
+    """
+    Returns the seed of a task, made of config.RANDOM_SEED and key, e.g. (num_vehicles, replica) for a grid.
+    """
+    return '-'.join(str(part) for part in (config.RANDOM_SEED,) + key)
+
+
+def task_random(*key):
+    """
+    Returns a random number generator seeded with the seed of the task with key. Every task draws from its own stream,
+    so the results do not depend on the order in which the tasks are run or on the process that runs them.
+    """
+    if config.RANDOM_NUMBERS == 'blocks':
+        return BlockRandom(task_seed(*key))
+    return random.Random(task_seed(*key))
+
+
+def get_network():
+    """
+    Returns the network arrays (see Topology.network_arrays) that all grids are built from with config.SHARED_NETWORK,
+    or None without it. The network is generated with its own random number generator, unless a pool worker attached
+    to it (see attach_network).
+    """
+    global network
+    if not config.SHARED_NETWORK:
+        return None
+    if network is None:
+        network = Grid(0, task_random('network')).topology.network_arrays()
+    return network
+
+
+def attach_network(spec):
+    """
+    Attach a pool worker to the network arrays that simulate_parallel published to shared memory, without copying them.
+    """
+    global network, network_memory
+    network_memory, network = shared_memory_service.attach_arrays(spec)
+
+
+def get_grid(num_vehicles, replica):
+    """
+    Returns the grid with num_vehicles of replica. With config.SCENARIO_PATH, the grid is loaded from its scenario file
+    (named after the hash of the config and the seed of the grid), or generated and saved to it if there is none yet.
+    """
+    if config.SCENARIO_PATH is None:
+        return Grid(num_vehicles, task_random(num_vehicles, replica), get_network())
+
+    file_path = os.path.join(config.SCENARIO_PATH, '{}-{}.scenario'.format(
+        cache_service.config_hash(), task_seed(num_vehicles, replica)))
+    if os.path.isfile(file_path):
+        return scenario_service.read_scenario(file_path)
+
+    grid = Grid(num_vehicles, task_random(num_vehicles, replica), get_network())
+    os.makedirs(config.SCENARIO_PATH, exist_ok=True)
+    scenario_service.write_scenario(file_path, grid)
+    return grid
+
+
+def read_cached_results(model, num_vehicles, replica):
+    """
+    Returns the cached results of model on the grid with num_vehicles of replica, or None if they are not cached (or
+    there is no cache).
+    """
+    if config.RESULT_CACHE_PATH is None:
+        return None
+    key = cache_service.cell_key(model, num_vehicles, task_seed(num_vehicles, replica))
+    return cache_service.read_results(config.RESULT_CACHE_PATH, key)
+
+
+def write_cached_results(model, num_vehicles, replica, results):
+    """
+    Write the results of model on the grid with num_vehicles of replica to the cache (if there is one).
+    """
+    if config.RESULT_CACHE_PATH is not None:
+        key = cache_service.cell_key(model, num_vehicles, task_seed(num_vehicles, replica))
+        cache_service.write_results(config.RESULT_CACHE_PATH, key, results)
+
+
+def simulate(num_vehicles, models, replicas, run):
+    """
+    Simulate the grids with num_vehicles of the replicas (their numbers) for every model, one at a time with run. The
+    simulations that are in the cache are skipped, and a grid is only generated if one of its simulations is not.
+    Returns the results of every grid (a list with the results of every model).
+    """
+    results = []
+    for replica in replicas:
+        grid_results = [read_cached_results(model, num_vehicles, replica) for model in models]
+        if None in grid_results:
+            # Generate the grid.
+            grid = get_grid(num_vehicles, replica)
+
+            # Try all models that are not cached.
+            for model_idx, model in enumerate(models):
+                if grid_results[model_idx] is not None:
+                    continue
+
+                rng = task_random(num_vehicles, replica, model.__class__.__name__)
+                # Setup the model
+                model.setup(grid, rng)
+                # Run the simulation.
+                run(grid, model, rng)
+
+                # Compute data and add it
+                grid_results[model_idx] = simulation.get_results(grid.vehicles, model.__class__.__name__)
+                write_cached_results(model, num_vehicles, replica, grid_results[model_idx])
+
+                # Reset the grid for the next simulation
+                grid.reset()
+        results.append(grid_results)
+
+    return results
+
+
+def simulate_batched(num_vehicles, models, replicas):
+    """
+    Simulate the grids with num_vehicles of the replicas (their numbers) for every model, running all grids of a model
+    at once with the batched array engine. The random number generators are those of simulate, so the results are the
+    same, and the simulations that are in the cache are skipped as well. Returns the results of every grid (a list with
+    the results of every model).
+    """
+    results = [[read_cached_results(model, num_vehicles, replica) for model in models] for replica in replicas]
+
+    # Generate the grids of which a simulation is not cached.
+    grids = {replica: get_grid(num_vehicles, replica)
+             for replica, grid_results in zip(replicas, results) if None in grid_results}
+
+    for model_idx, model in enumerate(models):
+        # The replicas of which the simulation of the model is not cached
+        missing = [replica_idx for replica_idx, grid_results in enumerate(results) if grid_results[model_idx] is None]
+        if not missing:
+            continue
+        model_grids = [grids[replicas[replica_idx]] for replica_idx in missing]
+
+        # Every grid gets its own instance of the model.
+        replica_models = [model.__class__() for _ in model_grids]
+        rngs = [task_random(num_vehicles, replicas[replica_idx], model.__class__.__name__) for replica_idx in missing]
+        for grid, replica_model, rng in zip(model_grids, replica_models, rngs):
+            replica_model.setup(grid, rng)
+
+        # Run the simulations.
+        array_engine.run_batch(model_grids, replica_models, rngs)
+
+        for replica_idx, grid in zip(missing, model_grids):
+            results[replica_idx][model_idx] = simulation.get_results(grid.vehicles, model.__class__.__name__)
+            write_cached_results(model, num_vehicles, replicas[replica_idx], results[replica_idx][model_idx])
+            # Reset the grid for the next simulation
+            grid.reset()
+
+    return results
+
+
+def simulate_cell(cell):
+    """
+    Simulate one grid with num_vehicles for every model, in a worker process. The grid and the models draw from the
+    random number generators of the cell (traffic load, replica), like in simulate, so the results are the same as
+    those of the serial sweep (the 'batched' engine runs the grid on its own, see simulate_batched). Returns the results
+    of every model as tuples (see simulation.RESULTS).
+    """
+    _, num_vehicles, replica = cell
+
+    models = [model_class() for model_class in MODELS]
+    if config.SIMULATION_ENGINE == 'batched':
+        grid_results = simulate_batched(num_vehicles, models, [replica])[0]
+    else:
+        grid_results = simulate(num_vehicles, models, [replica], ENGINES[config.SIMULATION_ENGINE])[0]
+    return [tuple(results.values()) for results in grid_results]
+
+
+def get_cells(traffic_loads):
+    """
+    Returns the (traffic load, replica) cells of the sweep, as (idx, num_vehicles, replica).
+    """
+    return [(idx, int(num_vehicles), replica) for idx, num_vehicles in enumerate(traffic_loads)
+            for replica in range(config.SIMULATIONS_PER_MODEL)]
+
+
+def add_cell_results(cell, grid_results, traffic_loads, models, data, results_path):
+    """
+    Add the results of a cell, as returned by simulate_cell, to data and write them to file.
+    """
+    idx, _, replica = cell
+    if replica == 0:
+        print("Traffic load: {} ({}/{} traffic_loads_num)".format(traffic_loads[idx], idx + 1, config.TRAFFIC_LOAD_NUM))
+    for model, values in zip(models, grid_results):
+        results = dict(zip(simulation.RESULTS, values))
+        add_results(data[model], idx, results)
+        # Save the results to file
+        simulation.write_results(results, results_path)
+
+
+def simulate_parallel(traffic_loads, models, data, results_path):
+    """
+    Simulate config.SIMULATIONS_PER_MODEL grids at every traffic load for every model, farming the (traffic load,
+    replica) cells out to a pool of config.PARALLEL_WORKERS processes. With config.SHARED_NETWORK, the network is
+    published to shared memory once, and the workers attach to it instead of receiving a pickled copy. The results are
+    added to data and written to file in the order of the cells.
+    """
+    cells = get_cells(traffic_loads)
+
+    memory, initializer, initargs = None, None, ()
+    if config.SHARED_NETWORK:
+        memory, spec = shared_memory_service.publish_arrays(get_network())
+        initializer, initargs = attach_network, (spec,)
+
+    try:
+        with multiprocessing.Pool(config.PARALLEL_WORKERS, initializer, initargs) as pool:
+            for cell, grid_results in zip(cells, pool.imap(simulate_cell, cells)):
+                add_cell_results(cell, grid_results, traffic_loads, models, data, results_path)
+    finally:
+        if memory is not None:
+            memory.close()
+            memory.unlink()
+
+
+def simulate_distributed(traffic_loads, models, data, results_path):
+    """
+    Simulate config.SIMULATIONS_PER_MODEL grids at every traffic load for every model, publishing the (traffic load,
+    replica) cells to the work queue in config.QUEUE_PATH. The cells are simulated by worker.py processes (on this or
+    other machines that share the folder), and the cells of workers that died are leased again. The results are added
+    to data and written to file in the order of the cells.
+    """
+    cells = get_cells(traffic_loads)
+    task_ids = ["{:06d}-{:06d}".format(idx, replica) for idx, _, replica in cells]
+
+    queue_service.create_queue(config.QUEUE_PATH)
+    for task_id, cell in zip(task_ids, cells):
+        # The workers check that they simulate with the same config.
+        queue_service.publish(config.QUEUE_PATH, task_id, {'config': cache_service.config_hash(), 'cell': cell})
+
+    # The results of the cells that are done, which are added in the order of the cells
+    done = {}
+    next_cell = 0
+    while next_cell < len(cells):
+        queue_service.expire_leases(config.QUEUE_PATH, config.LEASE_TIME)
+        done.update(queue_service.collect(config.QUEUE_PATH, [task_id for task_id in task_ids[next_cell:]
+                                                               if task_id not in done]))
+        if task_ids[next_cell] not in done:
+            time.sleep(config.POLL_INTERVAL)
+        while next_cell < len(cells) and task_ids[next_cell] in done:
+            add_cell_results(cells[next_cell], done.pop(task_ids[next_cell]), traffic_loads, models, data, results_path)
+            next_cell += 1
+
+    # The queue is empty, so the workers can stop.
+    queue_service.stop(config.QUEUE_PATH)
+
+
+def confidence_interval_width(values):
+    """
+    Returns the width of the confidence interval (at config.CONFIDENCE_LEVEL) of the mean of values. The quantile of
+    the t-distribution is approximated by that of the normal distribution plus its first correction term.
+    """
+    n = len(values)
+    z = NormalDist().inv_cdf((1 + config.CONFIDENCE_LEVEL) / 2)
+    t = z + (z ** 3 + z) / (4 * (n - 1))
+    return 2 * t * np.std(values, ddof=1) / np.sqrt(n)
+
+
+def is_converged(scores):
+    """
+    True if the confidence intervals of the mean score of every model, and of the mean difference in score of every
+    pair of models (on the same grids), are narrower than config.CONFIDENCE_INTERVAL_WIDTH, False otherwise.
+    """
+    scores = np.array(scores)
+    columns = [scores[:, i] for i in range(scores.shape[1])]
+    columns += [scores[:, i] - scores[:, j] for i in range(scores.shape[1]) for j in range(i + 1, scores.shape[1])]
+    return all(confidence_interval_width(column) < config.CONFIDENCE_INTERVAL_WIDTH for column in columns)
+
+
+def simulate_sweep(traffic_loads, models, data, results_path, run):
+    """
+    Simulate the grids at every traffic load for every model with run (or the batched engine), adding the results to
+    data and writing them to file. Returns the number of grids simulated at every traffic load.
+    """
+    # The number of grids simulated at every traffic load.
+    num_replicas = np.zeros(config.TRAFFIC_LOAD_NUM, dtype=int)
+
+    # Loop over all num_vehicles
+    for idx, num_vehicles in enumerate(traffic_loads):
+        print("Traffic load: {} ({}/{} traffic_loads_num)".format(num_vehicles, idx + 1, config.TRAFFIC_LOAD_NUM))
+
+        # The scores of every grid (a list with the score of every model).
+        scores = []
+        while num_replicas[idx] < config.SIMULATIONS_PER_MODEL:
+            # With adaptive replicas, the grids are simulated in rounds until the scores converged.
+            num_grids = config.SIMULATIONS_PER_MODEL - num_replicas[idx]
+            if config.ADAPTIVE_REPLICAS:
+                num_grids = min(num_grids, config.SIMULATIONS_PER_ROUND if scores else config.MIN_SIMULATIONS_PER_MODEL)
+
+            # The numbers of the replicas of this round
+            replicas = range(num_replicas[idx], num_replicas[idx] + num_grids)
+            if config.SIMULATION_ENGINE == 'batched':
+                # Run all replicas of a model at once.
+                replica_results = simulate_batched(num_vehicles, models, replicas)
+            else:
+                replica_results = simulate(num_vehicles, models, replicas, run)
+
+            for grid_results in replica_results:
+                for model, results in zip(models, grid_results):
+                    add_results(data[model], idx, results)
+                    # Save the results to file
+                    simulation.write_results(results, results_path)
+                scores.append([model_results['simulation_score'] for model_results in grid_results])
+            num_replicas[idx] += num_grids
+
+            if config.ADAPTIVE_REPLICAS and is_converged(scores):
+                break
+
+        if config.ADAPTIVE_REPLICAS:
+            print("Replicas: {}".format(num_replicas[idx]))
+
+    return num_replicas
+
+
+def simulate_open_system(models, results_path):
+    """
+    Simulate the open system for config.OPEN_SYSTEM_STEPS steps with every model, on the same grid and with the same
+    arriving vehicles, and write the results of every window to windows.csv.
+    """
+    # Generate the grid (without vehicles) and the seed of the arrivals.
+    grid = Grid(0, task_random('open system'))
+    seed = task_random('arrivals').getrandbits(64)
+
+    for model in models:
+        print("Open system: {}".format(model.__class__.__name__))
+        if config.ARRIVAL_TRACE is not None:
+            arrivals = open_system.trace_arrivals(config.ARRIVAL_TRACE)
+        else:
+            arrivals = open_system.poisson_arrivals(config.ARRIVAL_RATE, seed)
+
+        rng = task_random('open system', model.__class__.__name__)
+        model.setup(grid, rng)
+        for step, vehicles_driving, statistics in open_system.run(grid, model, rng, arrivals, config.OPEN_SYSTEM_STEPS):
+            results = statistics.get_results(model.__class__.__name__)
+            results.update(step=step, vehicles_driving=vehicles_driving, vehicles_finished=statistics.num_vehicles)
+            file_service.write_results_to_file(results_path + '/windows.csv', results)
+
+        # Reset the grid for the next simulation
+        grid.reset()
+
 
 def main():
-    results_file_name = file_service.get_results_path(config.RESULTS_FOLDER_PATH)
+    # The work queue and the process pool simulate config.SIMULATIONS_PER_MODEL grids at every traffic load.
+    if config.ADAPTIVE_REPLICAS and (config.QUEUE_PATH is not None or config.PARALLEL_WORKERS is not None):
+        raise ValueError("ADAPTIVE_REPLICAS cannot be combined with QUEUE_PATH or PARALLEL_WORKERS")
 
-    # Multiple grids are generated at random with a random seed set.
-    # This makes sure every run the same grids are generated.
-    random.seed(config.RANDOM_SEED)
+    results_file_name = file_service.get_results_path(config.RESULTS_FOLDER_PATH)
 
     # A list of different traffic loads (low to high)
     traffic_loads = np.linspace(config.TRAFFIC_LOAD_START, config.TRAFFIC_LOAD_END, config.TRAFFIC_LOAD_NUM, dtype=int)
 
+    # The engine that runs the simulations (one at a time)
+    run = ENGINES.get(config.SIMULATION_ENGINE)
+    if config.SIMULATION_ENGINE == 'object' and config.CHECKPOINT_INTERVAL is not None:
+        run = functools.partial(simulation.run, checkpoint_path=config.CHECKPOINT_PATH,
+                                checkpoint_interval=config.CHECKPOINT_INTERVAL)
+
     # Initialize the models
-    models = [Clock(), FirstComeFirstServe(), LocalOptimum(), GlobalOptimum()]
+    models = [model_class() for model_class in MODELS]
+
+    if config.OPEN_SYSTEM:
+        simulate_open_system(models, results_file_name)
+        return
 
     # Record some data for each model.
     data = {}
@@ -35,38 +419,27 @@ def main():
             'steps': np.zeros(config.TRAFFIC_LOAD_NUM)
         }
 
-    # Loop over all num_vehicles
-    for idx, num_vehicles in enumerate(traffic_loads):
-        print("Traffic load: {} ({}/{} traffic_loads_num)".format(num_vehicles, idx + 1, config.TRAFFIC_LOAD_NUM))
-
-        for _ in range(config.SIMULATIONS_PER_MODEL):
-            # Generate the grid.
-            grid = Grid(num_vehicles)
-
-            # Try all models.
-            for model in models:
-                # Setup the model
-                model.setup(grid)
-                # Run the simulation.
-                simulation.run(grid, model)
-
-                # Compute data and add it
-                data[model]['score'][idx] += simulation.simulation_score(grid.vehicles)
-                data[model]['waiting_steps'][idx] += simulation.mean_number_of_waiting_steps(grid.vehicles)
-                data[model]['traffic_lights'][idx] += simulation.mean_number_of_traffic_lights_encountered(grid.vehicles)
-                data[model]['steps'][idx] += simulation.mean_number_of_steps(grid.vehicles)
-                # Save the results to file
-                simulation.save_results(grid.vehicles, results_file_name, model.__class__.__name__)
-
-                # Reset the grid for the next simulation
-                grid.reset()
+    if config.QUEUE_PATH is not None:
+        # Publish the (traffic load, replica) cells to the work queue.
+        simulate_distributed(traffic_loads, models, data, results_file_name)
+        num_replicas = np.full(config.TRAFFIC_LOAD_NUM, config.SIMULATIONS_PER_MODEL)
+    elif config.PARALLEL_WORKERS is not None:
+        # Farm the (traffic load, replica) cells out to a process pool.
+        simulate_parallel(traffic_loads, models, data, results_file_name)
+        num_replicas = np.full(config.TRAFFIC_LOAD_NUM, config.SIMULATIONS_PER_MODEL)
+    else:
+        num_replicas = simulate_sweep(traffic_loads, models, data, results_file_name, run)
 
-        # Compute the average simulation score
+    # Compute the average simulation score
+    for idx in range(config.TRAFFIC_LOAD_NUM):
         for model in models:
-            data[model]['score'][idx] /= config.SIMULATIONS_PER_MODEL
-            data[model]['waiting_steps'][idx] /= config.SIMULATIONS_PER_MODEL
-            data[model]['traffic_lights'][idx] /= config.SIMULATIONS_PER_MODEL
-            data[model]['steps'][idx] /= config.SIMULATIONS_PER_MODEL
+            data[model]['score'][idx] /= num_replicas[idx]
+            data[model]['waiting_steps'][idx] /= num_replicas[idx]
+            data[model]['traffic_lights'][idx] /= num_replicas[idx]
+            data[model]['steps'][idx] /= num_replicas[idx]
+
+    if config.ADAPTIVE_REPLICAS:
+        file_service.write_replicas_to_file(results_file_name + '/replicas.csv', traffic_loads, num_replicas)
 
     # Plot the results
     plot.plot_performance_vs_vehicles(data, traffic_loads, config)
@@ -1,35 +1,61 @@
+import numpy as np
+
 import config
 import setup
+from models.route_table import RouteTable
 
 
 class Grid(object):
     """
     The Grid contains all the (width * height) intersections and all vehicles
     """
-    def __init__(self, num_vehicles):
-        self.intersections = setup.setup_intersections()
-        self.vehicles = setup.setup_vehicles(self, num_vehicles)
+    def __init__(self, num_vehicles, rng, network=None, vehicles=None):
+        # The grid is generated with the random number generator rng, or built from the network (see
+        # Topology.network_arrays) if it is given. The vehicles are drawn from rng, or placed as given by vehicles (the
+        # arrays of their starting lanes, numbers of roads to drive and destinations, see export_scenario).
+        if network is None and config.GRID_GENERATOR == 'vectorized':
+            network = setup.generate_network(rng)
+        if network is None:
+            self.intersections = setup.setup_intersections(rng)
+        else:
+            self.intersections = setup.setup_network(network)
+        self.topology = setup.setup_topology(self.intersections)
+        # The shortest paths the vehicles follow with shortest path routing, None if they choose random lanes
+        self.routes = RouteTable(self.topology) if config.ROUTING == 'shortest' else None
+        if vehicles is None:
+            self.vehicles = setup.setup_vehicles(self, num_vehicles, rng)
+        else:
+            self.vehicles = setup.place_vehicles(self, *vehicles)
         self.traffic_light_length = config.TRAFFIC_LIGHT_LENGTH
 
+    def export_scenario(self):
+        """
+        Returns the scenario of the grid as a dictionary{str, numpy array}: the network (see Topology.network_arrays)
+        and the starting lane, number of roads to drive and destination (-1 without routing) of every vehicle, from
+        which Grid builds the same grid.
+        """
+        scenario = self.topology.network_arrays()
+        scenario['vehicle_lane'] = np.array([vehicle.start_lane.id for vehicle in self.vehicles], dtype=np.int64)
+        scenario['vehicle_roads_to_drive'] = np.array([vehicle.start_roads_to_drive for vehicle in self.vehicles],
+                                                      dtype=np.int64)
+        scenario['vehicle_destination'] = np.array([-1 if vehicle.destination is None else vehicle.destination
+                                                    for vehicle in self.vehicles], dtype=np.int64)
+        return scenario
+
     def all_intersections_with_traffic_lights(self):
         """
-        Returns a list with all intersections that have traffic lights.
+        Returns a tuple with all intersections that have traffic lights.
         """
-        intersections_with_traffic_lights = []
-        for intersection in [intersection for row in self.intersections for intersection in row]:
-            if intersection.has_traffic_lights:
-                intersections_with_traffic_lights.append(intersection)
-        return intersections_with_traffic_lights
+        return self.topology.intersections_with_traffic_lights
 
     def reset(self):
         """
         Reset the grid (by resetting all the roads, lanes and vehicles)
         """
-        for intersection in [intersection for row in self.intersections for intersection in row]:
-            for road in intersection.outgoing_roads.values():
-                for lane in road.lanes.values():
-                    lane.reset()
-                road.reset()
+        for lane in self.topology.lanes:
+            lane.reset()
+        for road in self.topology.roads:
+            road.reset()
 
         for vehicle in self.vehicles:
             vehicle.reset()
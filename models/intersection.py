@@ -1,5 +1,4 @@
-import random
-
+import config
 from models.direction import Direction
 from models.road import Road
 
@@ -18,12 +17,33 @@ class Intersection(object):
         self.x = x
         self.y = y
 
+        # The number of the intersection, in the order the simulation visits them (set by the Topology)
+        self.id = None
+
+        # The tuples of lanes, stored once the network is set up (see freeze)
+        self.all_lanes = None
+        self.all_lanes_with_traffic_lights = None
+        # The phases: the masks of the maximal sets of lanes with traffic lights that can be GREEN together (see
+        # phase_table, set by the Topology)
+        self.phases = None
+        # The id of the layout of the lanes with traffic lights (see layout_id, set by the Topology)
+        self.layout = None
+
         # True if this intersection has traffic lights, False otherwise
         self.has_traffic_lights = False
 
         # The traffic light length of the traffic lights at this intersection (if they exist)
         self.traffic_light_length = None
 
+        # The occupancy index, which the lanes and incoming roads update as vehicles enter and leave them (so reading it
+        # does not scan them): the number of vehicles waiting in the lanes, the number of vehicles driving on the
+        # incoming roads, the mask of the lanes with vehicles waiting (see Lane.bit), and the number of changes to the
+        # lanes and roads (which tells whether they changed since a decision, see DecisionCache)
+        self.vehicles_waiting = 0
+        self.vehicles_approaching = 0
+        self.lanes_occupied = 0
+        self.changes = 0
+
     def __repr__(self):
         return "Intersection[{},{}]".format(self.x, self.y)
 
@@ -37,20 +57,48 @@ class Intersection(object):
         """
         Returns the number of vehicles that are currently waiting at this intersection
         """
-        return sum([len(lane.queue) for lane in self.get_all_lanes()])
+        return self.vehicles_waiting
+
+    def has_vehicles(self):
+        """
+        True if there are vehicles waiting at this intersection or driving towards it, False otherwise.
+        """
+        return self.vehicles_waiting > 0 or self.vehicles_approaching > 0
+
+    def recount(self):
+        """
+        Count the vehicles in the lanes and on the incoming roads again, for when their queues and sections were filled
+        without Lane.enter and Road.enter (see the occupancy index).
+        """
+        self.vehicles_waiting = sum(len(lane.queue) for lane in self.get_all_lanes())
+        self.vehicles_approaching = sum(len(section) for road in self.incoming_roads.values()
+                                        for section in road.sections)
+        self.lanes_occupied = sum(lane.bit for lane in self.get_all_lanes() if lane.queue)
+        self.changes += 1
 
-    def add_road(self, goal_intersection, direction: Direction):
+    def add_road(self, goal_intersection, direction: Direction, rng):
         """
-        Add an outgoing lane to goal_intersection, which is at direction
+        Add an outgoing lane to goal_intersection, which is at direction (its length is drawn from rng)
         """
-        road = Road(self, goal_intersection, direction.opposite())
+        length = config.ROAD_LENGTH_BASE + rng.choice(config.ROAD_LENGTH_DIFF)
+        road = Road(self, goal_intersection, direction.opposite(), length)
         self.outgoing_roads[direction] = road
         goal_intersection.incoming_roads[direction.opposite()] = road
 
+    def freeze(self):
+        """
+        Store the tuples of lanes, which do not change once the network is set up.
+        """
+        self.all_lanes = tuple(self.get_all_lanes())
+        self.all_lanes_with_traffic_lights = tuple(self.get_all_lanes_with_traffic_lights())
+
     def get_all_lanes(self):
         """
         Get all the lanes at this intersection (by getting the lanes of the incoming roads).
         """
+        if self.all_lanes is not None:
+            return self.all_lanes
+
         lanes = []
         for inc_road in self.incoming_roads.values():
             for lane in inc_road.lanes.values():
@@ -61,6 +109,9 @@ class Intersection(object):
         """
         Get all lanes at this intersection that have a traffic light.
         """
+        if self.all_lanes_with_traffic_lights is not None:
+            return self.all_lanes_with_traffic_lights
+
         lanes_with_traffic_lights = []
         for lane in self.get_all_lanes():
             if lane.has_traffic_light:
@@ -69,16 +120,15 @@ class Intersection(object):
 
     def get_all_lanes_with_vehicles(self):
         """
-        Get all lanes that have at least one vehicle.
+        Get all lanes that have at least one vehicle (from the mask of the occupancy index).
         """
-        lanes_with_vehicles = []
-        for lane in self.get_all_lanes():
-            if lane.has_vehicles():
-                lanes_with_vehicles.append(lane)
-        return lanes_with_vehicles
+        lanes_occupied = self.lanes_occupied
+        if not lanes_occupied:
+            return []
+        return [lane for lane in self.get_all_lanes() if lane.bit & lanes_occupied]
 
-    def get_random_lane(self):
+    def get_random_lane(self, rng):
         """
-        Return a random waiting queue
+        Return a random waiting queue (drawn from rng)
         """
-        return random.choice(self.get_all_lanes())
+        return rng.choice(self.get_all_lanes())
@@ -1,4 +1,4 @@
-import random
+from collections import deque
 
 import config
 from models.light import Light
@@ -9,8 +9,8 @@ class Lane(object):
     Lane at the end of a road where vehicles wait for traffic lights (if any)
     """
     def __init__(self, direction, turning, road):
-        # Vehicles wait in a queue
-        self.queue = []
+        # Vehicles wait in a queue (first in, first out)
+        self.queue = deque()
 
         # True if this lane has a traffic light
         self.has_traffic_light = False
@@ -23,6 +23,13 @@ class Lane(object):
         self.turning = turning
         # The road we go to (after turning at direction)
         self.goes_to_road = road
+        # The intersection at the end of the road of the lane, whose occupancy index the lane updates (set by the Road)
+        self.intersection = None
+
+        # The number of the lane, in the order the simulation visits them (set by the Topology)
+        self.id = None
+        # The bit of the lane in the 12-bit lane masks of its intersection (see lane_bit, set by the Topology)
+        self.bit = None
 
     def __repr__(self):
         return "Lane[{},{}]".format(self.direction, self.turning)
@@ -32,6 +39,10 @@ class Lane(object):
         The vehicle enters the lane (and gets in the queue)
         """
         self.queue.append(vehicle)
+        intersection = self.intersection
+        intersection.vehicles_waiting += 1
+        intersection.lanes_occupied |= self.bit
+        intersection.changes += 1
 
     def set_traffic_light_state(self, state: Light):
         """
@@ -64,33 +75,34 @@ class Lane(object):
         """
         return len(self.queue) > 0
 
-    def update_on_green(self):
+    def update_on_green(self, step, rng):
         """
-        Update vehicles in this lane given that the light is green.
+        Update vehicles in this lane given that the light is green. Vehicles that stay in the queue are not touched:
+        their steps waiting are added when they cross the intersection. Returns the number of vehicles that crossed.
         """
-        # The flow through can differ slightly
-        flow_through = config.FLOW_THROUGH_BASE + random.choice(config.FLOW_THROUGH_DIFF)
-        # Only the first flow_through vehicles can drive at this step
-        for vehicle in self.queue[:flow_through]:
-            vehicle.cross_intersection()
-            vehicle.steps_driving += 1
-        del self.queue[:flow_through]
-
-        # The remaining vehicles have to wait
-        for vehicle in self.queue:
-            vehicle.steps_waiting += 1
+        # The flow through can differ slightly (drawn from rng)
+        flow_through = config.FLOW_THROUGH_BASE + rng.choice(config.FLOW_THROUGH_DIFF)
+        # Only the first flow_through vehicles can drive at this step. They are taken from the front of the queue one
+        # by one, so the other vehicles are not copied or moved.
+        crossing = 0
+        while crossing < flow_through and self.queue:
+            self.queue.popleft().cross_intersection(step)
+            crossing += 1
 
-    def update_on_red(self):
-        """
-        Update vehicles in this lane given that the light is red
-        """
-        # The vehicles have to wait
-        for vehicle in self.queue:
-            vehicle.steps_waiting += 1
+        if crossing:
+            self.intersection.vehicles_waiting -= crossing
+            self.intersection.changes += 1
+            if not self.queue:
+                self.intersection.lanes_occupied &= ~self.bit
+        return crossing
 
     def reset(self):
         """
         Reset the lane by removing the vehicles from the queue and turning the light to RED
         """
-        del self.queue[:]
+        if self.queue:
+            self.intersection.vehicles_waiting -= len(self.queue)
+            self.intersection.lanes_occupied &= ~self.bit
+            self.intersection.changes += 1
+        self.queue.clear()
         self.traffic_light = Light.RED
@@ -1,6 +1,5 @@
-import random
+from collections import deque
 
-import config
 from models.lane import Lane
 from models.turning import Turning
 
@@ -9,20 +8,28 @@ class Road(object):
     """
     Road that connects two intersections and has lanes at the end.
     """
-    def __init__(self, origin, destination, end_direction):
+    def __init__(self, origin, destination, end_direction, length):
         # The intersection at the start of the road
         self.origin = origin
         # The intersection that is at the end of the road
         self.destination = destination
 
+        # The number of the road, in the order the simulation visits them (set by the Topology)
+        self.id = None
+
         # The lanes at the end of the road
         self.lanes = {}
+        # The tuples of lanes, stored once the network is set up (see freeze)
+        self.all_lanes = None
+        self.all_lanes_with_traffic_lights = None
 
         # The direction at which we enter the destination
         self.end_direction = end_direction
 
-        # The road is divided into length sections
-        self.sections = [[] for _ in range(config.ROAD_LENGTH_BASE + random.choice(config.ROAD_LENGTH_DIFF))]
+        # The road is divided into length sections, which form a ring buffer: the first section is sections[head] and
+        # the last section is sections[head - 1]. The sections are deques, which keep their memory when emptied.
+        self.sections = [deque() for _ in range(length)]
+        self.head = 0
 
     def __repr__(self):
         return "Road[{} -> {}; lanes: {}]".format(self.origin, self.destination, self.lanes)
@@ -31,26 +38,67 @@ class Road(object):
         """
         Add an incoming lane at incoming[direction,turning]
         """
-        self.lanes[turning] = Lane(self.end_direction, turning, road)
+        self.lanes[turning] = lane = Lane(self.end_direction, turning, road)
+        lane.intersection = self.destination
 
     def enter(self, vehicle):
         """
         Enter (at the start of) the road.
         """
-        self.sections[0].append(vehicle)
+        self.sections[self.head].append(vehicle)
+        self.destination.vehicles_approaching += 1
+        self.destination.changes += 1
+
+    def travel_time(self):
+        """
+        Returns the number of steps after which a vehicle that enters the road now reaches the end of it. Vehicles enter
+        the first section, which is the section the next update empties, so this is one step whatever the number of
+        sections.
+        """
+        return 1
 
     def last_section(self):
         """
         Return the last section
         """
-        return self.sections[-1]
+        return self.sections[self.head - 1]
+
+    def has_vehicles(self):
+        """
+        True if there is at least one vehicle on the road, False otherwise.
+        """
+        return any(self.sections)
+
+    def num_vehicles(self):
+        """
+        Returns the number of vehicles on the road.
+        """
+        return sum([len(section) for section in self.sections])
+
+    def freeze(self):
+        """
+        Store the tuples of lanes, which do not change once the network is set up.
+        """
+        self.all_lanes = tuple(self.lanes.values())
+        self.all_lanes_with_traffic_lights = tuple(self.get_lanes_with_traffic_lights())
+
+    def get_all_lanes(self):
+        """
+        Returns the lanes at the end of the road.
+        """
+        if self.all_lanes is not None:
+            return self.all_lanes
+        return tuple(self.lanes.values())
 
     def get_lanes_with_traffic_lights(self):
         """
-        Returns a list of lanes that have a traffic light.
+        Returns the lanes that have a traffic light.
         """
+        if self.all_lanes_with_traffic_lights is not None:
+            return self.all_lanes_with_traffic_lights
+
         lanes = []
-        for lane in self.lanes:
+        for lane in self.lanes.values():
             if lane.has_traffic_light:
                 lanes.append(lane)
         return lanes
@@ -62,34 +110,39 @@ class Road(object):
         """
         return len(self.get_lanes_with_traffic_lights()) > 0
 
-    def update(self):
+    def update(self, step, rng, finished=None):
         """
-        Update the vehicles that are driving on this road. All vehicles move one section further, which can be
-        implemented by popping the last section and append a new section. This way the sections shift to the right
-        and the order of the vehicles is preserved (no overtaking can happen). Vehicles that are on the final section
-        are at the and of the road and get of the road to enter a lane.
+        Update the vehicles that are driving on this road. All vehicles move one section further, which is implemented by
+        emptying the first section and moving the head of the ring buffer, so the emptied section becomes the last one.
+        This way the sections shift without copying and the order of the vehicles is preserved (no overtaking can
+        happen). Vehicles that are on the final section are at the and of the road and get of the road to enter a lane.
+        The steps driving of a vehicle are added when it leaves the road, so the other vehicles are not touched. The
+        lanes are drawn from rng. Returns the number of vehicles that finished, which are added to finished (if given).
         """
         # Keep track of how many vehicles finished
         num_finished = 0
 
         # The vehicles on the final section have reached the end of the road
-        for vehicle in self.sections.pop(0):
+        section = self.sections[self.head]
+        self.destination.vehicles_approaching -= len(section)
+        # The sections shift, so the last section changes even if the first one is empty
+        self.destination.changes += 1
+        while section:
+            vehicle = section.popleft()
+            vehicle.leave_road(step)
             vehicle.roads_to_drive -= 1
             # If it is not finished yet, it chooses a lane to enter
             if not vehicle.is_finished():
-                vehicle.choose_lane()
+                vehicle.choose_lane(step, rng)
                 if vehicle.lane.has_traffic_light:
                     vehicle.number_of_encountered_traffic_lights += 1
             else:
                 num_finished += 1
+                if finished is not None:
+                    finished.append(vehicle)
 
-        # All other vehicles move one section further
-        for section in self.sections:
-            for vehicle in section:
-                vehicle.steps_driving += 1
-
-        # Add an empty first section
-        self.sections.append([])
+        # The emptied section becomes the last section
+        self.head = (self.head + 1) % len(self.sections)
 
         return num_finished
 
@@ -98,4 +151,7 @@ class Road(object):
         Reset the road by removing all vehicles from the sections
         """
         for section in self.sections:
-            del section[:]
+            self.destination.vehicles_approaching -= len(section)
+            section.clear()
+        self.destination.changes += 1
+        self.head = 0
@@ -0,0 +1,110 @@
+import numpy as np
+
+from models.turning import Turning
+
+# The entry of the next lane table of a road from which the destination cannot be reached (or at which it is reached)
+UNREACHABLE = 255
+# The number of destinations whose shortest paths are computed at once (bounds the memory of the computation)
+DESTINATIONS_PER_CHUNK = 64
+
+
+class RouteTable(object):
+    """
+    The shortest paths (in steps, then in roads) from every road to every intersection of a Grid, as a next lane table:
+    next_lane[destination, road] is the index (in road.get_all_lanes()) of the lane a vehicle at the end of the road
+    takes to drive to the destination. The table is computed once per grid and shared by all its vehicles.
+    """
+    def __init__(self, topology):
+        self.topology = topology
+        num_roads = len(topology.roads)
+
+        # The roads the lanes of every road go to (-1 where a road has less lanes)
+        lane_offsets = topology.road_lane_offsets
+        self.lane_targets = np.full((num_roads, len(Turning)), -1, dtype=np.int64)
+        for road_id, (start, end) in enumerate(zip(lane_offsets[:-1], lane_offsets[1:])):
+            self.lane_targets[road_id, :end - start] = topology.lane_goes_to_road[topology.road_lanes[start:end]]
+
+        # The roads with a lane to every road (compressed sparse row format, see compressed_rows)
+        order = np.argsort(topology.lane_goes_to_road, kind='stable')
+        self.predecessors = topology.lane_road[order]
+        self.predecessor_offsets = np.zeros(num_roads + 1, dtype=np.int64)
+        self.predecessor_offsets[1:] = np.cumsum(np.bincount(topology.lane_goes_to_road, minlength=num_roads))
+
+        # The cost of driving a road: its length, and one road (which breaks ties between paths of the same length)
+        self.cost_factor = num_roads + 1
+        self.road_cost = topology.road_length * self.cost_factor + 1
+
+        self.next_lane = np.full((len(topology.intersections), num_roads), UNREACHABLE, dtype=np.uint8)
+        for start in range(0, len(topology.intersections), DESTINATIONS_PER_CHUNK):
+            destinations = np.arange(start, min(start + DESTINATIONS_PER_CHUNK, len(topology.intersections)))
+            self.next_lane[destinations] = self.shortest_paths(destinations).T
+        self.next_lane.flags.writeable = False
+
+    def shortest_paths(self, destinations):
+        """
+        Returns the next lane table (roads x destinations) of the destinations. The costs from the end of every road to
+        every destination are relaxed from the destinations backwards, for all destinations at once: the roads whose
+        cost dropped are the frontier, and only the roads with a lane to the frontier are relaxed next (Bellman-Ford
+        with a queue). The lane of a road is then the lane with the lowest cost, the first lane wins a tie.
+        """
+        topology = self.topology
+        num_destinations = len(destinations)
+        infinity = np.iinfo(np.int64).max // 2
+
+        # The cost from the end of every road to every destination (flat, road-major), which is 0 for the roads that
+        # end at the destination
+        at_destination = topology.road_destination[:, None] == destinations[None, :]
+        cost = np.where(at_destination, 0, infinity).ravel()
+
+        frontier = np.flatnonzero(at_destination)
+        while frontier.size:
+            roads, columns = np.divmod(frontier, num_destinations)
+            # Every road with a lane to a road in the frontier (one item per lane)
+            counts = self.predecessor_offsets[roads + 1] - self.predecessor_offsets[roads]
+            items = np.repeat(np.arange(len(frontier)), counts)
+            starts = np.repeat(self.predecessor_offsets[roads] - np.cumsum(counts) + counts, counts)
+            predecessors = self.predecessors[starts + np.arange(len(items))]
+
+            candidates = predecessors * num_destinations + columns[items]
+            candidate_cost = cost[frontier[items]] + self.road_cost[roads[items]]
+            improved = candidate_cost < cost[candidates]
+            candidates, candidate_cost = candidates[improved], candidate_cost[improved]
+            np.minimum.at(cost, candidates, candidate_cost)
+            # The roads that improved (once each)
+            candidates.sort()
+            frontier = candidates[np.concatenate(([True], candidates[1:] != candidates[:-1]))] if candidates.size \
+                else candidates
+
+        cost = cost.reshape(-1, num_destinations)
+        valid = (self.lane_targets >= 0)[:, :, None]
+        targets = np.maximum(self.lane_targets, 0)
+        lane_cost = np.where(valid, self.road_cost[targets][:, :, None] + cost[targets], infinity)
+        unreachable = at_destination | (cost >= infinity)
+        return np.where(unreachable, UNREACHABLE, lane_cost.argmin(axis=1)).astype(np.uint8)
+
+    def route(self, destination):
+        """
+        Returns the next lane table of the destination (an intersection id), indexed by road id. It is a view of the
+        table whose items are ints, so looking up a lane is one index.
+        """
+        return memoryview(self.next_lane[destination])
+
+    def roads_to_drive(self, road, destination):
+        """
+        Returns the number of roads on the shortest path from the start of road to the destination (including road), or
+        0 if the destination cannot be reached.
+        """
+        route = self.route(destination)
+        roads_to_drive = 1
+        while road.destination.id != destination:
+            if route[road.id] == UNREACHABLE:
+                return 0
+            road = road.get_all_lanes()[route[road.id]].goes_to_road
+            roads_to_drive += 1
+        return roads_to_drive
+
+    def nbytes(self):
+        """
+        Returns the memory of the table in bytes.
+        """
+        return self.next_lane.nbytes
@@ -0,0 +1,110 @@
+import numpy as np
+
+from models.traffic_light_models.traffic_light_models import lane_bit, layout_id, phase_table
+
+
+def compressed_rows(rows):
+    """
+    Returns the (offsets, values) arrays of a list of rows (compressed sparse row format): the values of row i are
+    values[offsets[i]:offsets[i + 1]].
+    """
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(row) for row in rows])
+    values = np.array([value for row in rows for value in row], dtype=np.int64)
+    return offsets, values
+
+
+class Topology(object):
+    """
+    The immutable index of the street network of a Grid, built once the intersections are set up. Intersections, roads
+    and lanes are numbered in the order in which the simulation visits them, and their id is their index in the tuples
+    and arrays below.
+    """
+    def __init__(self, intersections):
+        # All intersections, roads and lanes
+        self.intersections = tuple(intersection for row in intersections for intersection in row)
+        self.roads = tuple(road for intersection in self.intersections for road in intersection.outgoing_roads.values())
+        self.lanes = tuple(lane for intersection in self.intersections
+                           for road in intersection.incoming_roads.values() for lane in road.lanes.values())
+
+        for intersection_id, intersection in enumerate(self.intersections):
+            intersection.id = intersection_id
+        for road_id, road in enumerate(self.roads):
+            road.id = road_id
+        for lane_id, lane in enumerate(self.lanes):
+            lane.id = lane_id
+            lane.bit = 1 << lane_bit(lane.direction, lane.turning)
+
+        # Store the lane tuples on the intersections and roads
+        for road in self.roads:
+            road.freeze()
+        for intersection in self.intersections:
+            intersection.freeze()
+            lane_mask = sum(lane.bit for lane in intersection.get_all_lanes_with_traffic_lights())
+            intersection.phases = phase_table(lane_mask)
+            intersection.layout = layout_id(intersection)
+
+        self.intersections_with_traffic_lights = tuple(
+            intersection for intersection in self.intersections if intersection.has_traffic_lights)
+
+        # The roads leaving and entering every intersection (adjacency in compressed sparse row format)
+        self.outgoing_offsets, self.outgoing_roads = compressed_rows(
+            [[road.id for road in intersection.outgoing_roads.values()] for intersection in self.intersections])
+        self.incoming_offsets, self.incoming_roads = compressed_rows(
+            [[road.id for road in intersection.incoming_roads.values()] for intersection in self.intersections])
+        # The lanes at every intersection, and at the end of every road
+        self.lane_offsets, self.intersection_lanes = compressed_rows(
+            [[lane.id for lane in intersection.get_all_lanes()] for intersection in self.intersections])
+        self.road_lane_offsets, self.road_lanes = compressed_rows(
+            [[lane.id for lane in road.get_all_lanes()] for road in self.roads])
+
+        # Roads
+        self.road_origin = np.array([road.origin.id for road in self.roads], dtype=np.int64)
+        self.road_destination = np.array([road.destination.id for road in self.roads], dtype=np.int64)
+        self.road_length = np.array([len(road.sections) for road in self.roads], dtype=np.int64)
+
+        # Lanes
+        self.lane_road = np.zeros(len(self.lanes), dtype=np.int64)
+        self.lane_road[self.road_lanes] = np.repeat(np.arange(len(self.roads)), np.diff(self.road_lane_offsets))
+        self.lane_goes_to_road = np.array([lane.goes_to_road.id for lane in self.lanes], dtype=np.int64)
+        self.lane_intersection = self.road_destination[self.lane_road]
+        self.lane_direction = np.array([lane.direction for lane in self.lanes], dtype=np.int64)
+        self.lane_turning = np.array([lane.turning for lane in self.lanes], dtype=np.int64)
+        self.lane_has_traffic_light = np.array([lane.has_traffic_light for lane in self.lanes], dtype=bool)
+
+        for array in self.arrays():
+            array.flags.writeable = False
+
+    def arrays(self):
+        """
+        Returns the index arrays.
+        """
+        return [value for value in vars(self).values() if isinstance(value, np.ndarray)]
+
+    def network_arrays(self):
+        """
+        Returns the network as a dictionary{str, numpy array} of flat arrays, from which setup.setup_network builds the
+        same intersections, roads and lanes (with the same ids). The arrays do not refer to any object, so they can be
+        shared between processes instead of pickling the network.
+        """
+        return {
+            'grid_size': np.array([max(intersection.x for intersection in self.intersections) + 1,
+                                   max(intersection.y for intersection in self.intersections) + 1], dtype=np.int64),
+            'intersection_has_traffic_lights': np.array(
+                [intersection.has_traffic_lights for intersection in self.intersections], dtype=bool),
+            'intersection_traffic_light_length': np.array(
+                [intersection.traffic_light_length or 0 for intersection in self.intersections], dtype=np.int64),
+            # The order of the incoming roads of every intersection (which is the order of its lanes)
+            'incoming_offsets': self.incoming_offsets,
+            'incoming_roads': self.incoming_roads,
+            'road_origin': self.road_origin,
+            'road_destination': self.road_destination,
+            'road_length': self.road_length,
+            # The direction at which a road leaves its origin
+            'road_direction': np.array([road.end_direction.opposite() for road in self.roads], dtype=np.int64),
+            'road_lane_offsets': self.road_lane_offsets,
+            'road_lanes': self.road_lanes,
+            'lane_turning': self.lane_turning,
+            'lane_goes_to_road': self.lane_goes_to_road,
+            'lane_has_traffic_light': self.lane_has_traffic_light,
+        }
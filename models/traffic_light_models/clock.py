@@ -1,6 +1,6 @@
-from collections import deque
-import random
+import numpy as np
 
+from models.direction import Direction
 from models.traffic_light_models.traffic_light_models import *
 from models.turning import Turning
 
@@ -10,45 +10,64 @@ class Clock(TrafficLightModel):
     The Clock model cycles through traffic light configurations.
     """
     def __init__(self):
-        # For every intersection (with a traffic light) store a deque of List[Lane], which are the lanes_to_change
+        # For every intersection (with a traffic light) store a list of List[Lane], which are the lanes_to_change
         # for a direction
         self.lanes_per_direction = {}
+        # For every intersection (by id) the index of the current direction in its list, the number of directions and
+        # the masks of the lanes of the directions (see Lane.bit), which the batch update reads
+        self.position = None
+        self.num_directions = None
+        self.direction_masks = None
 
         # Used to check if the Update method is called for the first time or not
         self.is_first_time_calling = True
 
-    def setup(self, grid):
+        # The random number generator
+        self.rng = None
+
+    def setup(self, grid, rng):
         """
         Setup the Clock traffic light model.
         """
         self.lanes_per_direction = {}
+        self.rng = rng
+        num_intersections = len(grid.topology.intersections)
+        self.position = np.zeros(num_intersections, dtype=np.int64)
+        self.num_directions = np.zeros(num_intersections, dtype=np.int64)
+        self.direction_masks = np.zeros((num_intersections, len(Direction)), dtype=np.int64)
 
         # Choose random direction to start with (from the possible incoming roads with traffic lights)
         for intersection in grid.all_intersections_with_traffic_lights():
-            # Initialize the empty deque
-            self.lanes_per_direction[intersection] = deque()
+            # Initialize the empty list
+            self.lanes_per_direction[intersection] = []
             # Check all incoming roads
             for inc_D, inc_road in intersection.incoming_roads.items():
                 # Only keep the roads that have traffic lights
                 if inc_road.has_traffic_lights:
                     self.lanes_per_direction[intersection].append(self.lanes_to_change(intersection, inc_D))
+            self.store_directions(intersection)
 
         # Keep track if this is the first time calling the update method.
         self.is_first_time_calling = True
 
+    def store_directions(self, intersection):
+        """
+        Store the number of directions of the intersection and the masks of their lanes, for the batch update.
+        """
+        directions = self.lanes_per_direction[intersection]
+        self.num_directions[intersection.id] = len(directions)
+        self.direction_masks[intersection.id] = 0
+        self.direction_masks[intersection.id, :len(directions)] = [sum(lane.bit for lane in lanes)
+                                                                   for lanes in directions]
+
     @staticmethod
     def lanes_to_change(intersection, direction):
         """
         Get the lanes that need to be changed, which are the lanes at direction, and the right lane at the next
         direction. Can be calculated once on initialization.
         """
-        # List of lanes to change
-        lanes = []
-
         # Get the lanes at this direction
-        for lane_change in intersection.incoming_roads[direction].lanes.values():
-            if lane_change.has_traffic_light:
-                lanes.append(lane_change)
+        lanes = list(intersection.incoming_roads[direction].get_lanes_with_traffic_lights())
 
         # Go to the next direction
         next_direction = direction.next()
@@ -66,23 +85,91 @@ class Clock(TrafficLightModel):
         Update the intersection with the Clock model.
         """
         lanes = self.lanes_per_direction[intersection]
+        position = int(self.position[intersection.id])
         # If this method is called for the first time, turn all lights GREEN at a random direction.
         if self.is_first_time_calling:
-            # Shuffle the deque, which determines the order in which they will turn GREEN.
-            random.shuffle(lanes)
+            # Shuffle the list, which determines the order in which they will turn GREEN.
+            self.rng.shuffle(lanes)
+            self.store_directions(intersection)
             # Set all traffic lights at the current direction to GREEN.
-            for lane in lanes[0]:
+            for lane in lanes[position]:
                 lane.turn_green()
             self.is_first_time_calling = False
             return
 
         # Set all traffic lights at the current direction to RED.
-        for lane in lanes[0]:
+        for lane in lanes[position]:
             lane.turn_red()
 
-        # Go to the next direction
-        lanes.rotate(1)
+        # Go to the next direction, which is the previous one in the list (the directions are visited backwards)
+        self.position[intersection.id] = position = (position - 1) % len(lanes)
 
         # Set all traffic lights at the new direction to GREEN.
-        for lane in lanes[0]:
+        for lane in lanes[position]:
+            lane.turn_green()
+
+    def update_all(self, network, intersections, skipped, due):
+        """
+        Every update (skipped or due) goes to the next direction, so the directions of all intersections are advanced
+        at once. The first update of the model shuffles the directions of its intersection, which is done by update.
+        """
+        ids = network.intersection_id[intersections]
+        updates = skipped + due
+        if self.is_first_time_calling:
+            for index in np.flatnonzero(updates > 0)[:1]:
+                self.update(network.intersections[intersections[index]])
+                updates[index] -= 1
+
+        self.position[ids] = positions = (self.position[ids] - updates) % np.maximum(self.num_directions[ids], 1)
+        return self.direction_masks[ids, positions]
+
+    def get_state(self, topology):
+        """
+        The order of the directions at every intersection (starting at the current direction), and whether the model
+        was updated before.
+        """
+        intersections = topology.intersections_with_traffic_lights
+        # The lanes of every direction, and the directions of every intersection
+        directions = [lanes for intersection in intersections for lanes in self.current_order(intersection)]
+        lane_offsets, lanes = lists_to_arrays(directions)
+        direction_offsets = np.zeros(len(intersections) + 1, dtype=np.int64)
+        direction_offsets[1:] = np.cumsum([len(self.lanes_per_direction[intersection]) for intersection in intersections])
+        return {
+            'direction_offsets': direction_offsets,
+            'lane_offsets': lane_offsets,
+            'lanes': lanes,
+            'is_first_time_calling': np.array(self.is_first_time_calling)
+        }
+
+    def set_state(self, topology, state):
+        directions = arrays_to_lists(topology, state['lane_offsets'], state['lanes'])
+        offsets = state['direction_offsets']
+        for intersection, start, end in zip(topology.intersections_with_traffic_lights, offsets[:-1], offsets[1:]):
+            self.lanes_per_direction[intersection] = directions[start:end]
+            self.position[intersection.id] = 0
+            self.store_directions(intersection)
+        self.is_first_time_calling = bool(state['is_first_time_calling'])
+
+    def current_order(self, intersection):
+        """
+        Returns the directions of the intersection, starting at the current direction.
+        """
+        lanes = self.lanes_per_direction[intersection]
+        position = int(self.position[intersection.id])
+        return lanes[position:] + lanes[:position]
+
+    def update_idle(self, intersection: Intersection, ticks):
+        """
+        Skip ticks directions at once: the lanes of the directions in between turn GREEN and RED again.
+        """
+        if self.is_first_time_calling:
+            super().update_idle(intersection, ticks)
+            return
+
+        lanes = self.lanes_per_direction[intersection]
+        position = int(self.position[intersection.id])
+        for lane in lanes[position]:
+            lane.turn_red()
+        self.position[intersection.id] = position = (position - ticks) % len(lanes)
+        for lane in lanes[position]:
             lane.turn_green()
@@ -1,5 +1,3 @@
-import random
-
 from models.traffic_light_models.traffic_light_models import *
 
 
@@ -9,17 +7,21 @@ class FirstComeFirstServe(TrafficLightModel):
     """
     def __init__(self):
         self.queues = {}
+        # The random number generator
+        self.rng = None
 
-    def setup(self, grid):
+    def setup(self, grid, rng):
         """
         Setup the First Come First Serve traffic light model.
         """
-        # For every intersection store a list (queue) of lanes
+        # For every intersection store a queue of lanes, as the keys of a dictionary (which keeps the order in which
+        # they were added, and finds and removes lanes without scanning the queue)
         self.queues = {}
+        self.rng = rng
 
-        # Initialize the lists
+        # Initialize the queues
         for intersection in grid.all_intersections_with_traffic_lights():
-            self.queues[intersection] = []
+            self.queues[intersection] = {}
 
     def update(self, intersection: Intersection):
         """
@@ -30,24 +32,37 @@ class FirstComeFirstServe(TrafficLightModel):
 
         # The order in which vehicles arrive at the intersection is determined by the order which we call the
         # Lane.update. This would give an unfair advantage to those called first. Hence, given a list of lanes where
-        # vehicles arrive, shuffle it so that the order is random. Only add lanes that are not already in the queue.
-        random.shuffle(random_lane_order := intersection.get_all_lanes_with_vehicles())
+        # vehicles arrive (from the occupancy index of the intersection), shuffle it so that the order is random. Only
+        # add lanes that are not already in the queue.
+        self.rng.shuffle(random_lane_order := intersection.get_all_lanes_with_vehicles())
         for lane in random_lane_order:
-            if lane not in queue:
-                queue.append(lane)
-
-        # All traffic lights are set to RED.
-        all_traffic_lights_red(intersection)
-
-        # Make a copy of the queue.
-        options = queue.copy()
-        # Loop while there are still options.
-        while len(options) > 0:
-            # Get and remove the lane that entered first in the current options queue.
-            lane = options.pop(0)
-            # Set it to GREEN.
-            lane.turn_green()
-            # Remove the lanes from the options that are conflicting.
-            options = find_non_conflicting(lane, options)
-            # Remove the lane from the queue.
-            queue.remove(lane)
+            queue.setdefault(lane)
+
+        # The lanes turn GREEN in the order of the queue, as long as they fit in a phase with the lanes before them.
+        green = select_phase(intersection, queue)
+        set_phase(intersection, green)
+
+        # Remove the lanes that were served from the queue (lanes without a traffic light are always served).
+        self.queues[intersection] = dict.fromkeys(lane for lane in queue
+                                                  if lane.has_traffic_light and not lane.bit & green)
+
+    def update_idle(self, intersection: Intersection, ticks):
+        """
+        Without vehicles no lanes join the queue and every update removes at least one lane from it. Once the queue is
+        empty, all traffic lights stay RED.
+        """
+        for _ in range(min(ticks, len(self.queues[intersection]) + 1)):
+            self.update(intersection)
+
+    def get_state(self, topology):
+        """
+        The queue of lanes of every intersection.
+        """
+        offsets, lanes = lists_to_arrays([self.queues[intersection]
+                                          for intersection in topology.intersections_with_traffic_lights])
+        return {'offsets': offsets, 'lanes': lanes}
+
+    def set_state(self, topology, state):
+        queues = arrays_to_lists(topology, state['offsets'], state['lanes'])
+        self.queues = {intersection: dict.fromkeys(queue)
+                       for intersection, queue in zip(topology.intersections_with_traffic_lights, queues)}
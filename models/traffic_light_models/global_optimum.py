@@ -1,3 +1,5 @@
+import numpy as np
+
 from models.traffic_light_models.traffic_light_models import *
 
 
@@ -6,13 +8,112 @@ class GlobalOptimum(TrafficLightModel):
     The global optimum model with priority and distributed incoming vehicles.
     """
 
-    def setup(self, grid):
-        pass
+    def setup(self, grid, rng):
+        self.setup_decision_cache()
 
     def update(self, intersection: Intersection):
         """
         Update the intersection with the Global Optimum model.
         """
+        set_phase(intersection, self.decide(intersection, self.signature, self.get_decision))
+
+    @staticmethod
+    def signature(intersection: Intersection):
+        """
+        The state the decision depends on: the queue lengths of the lanes with traffic lights, and the number of
+        vehicles in the last sections of the incoming roads (None without vehicles driving towards the intersection).
+        """
+        return (tuple([len(lane.queue) for lane in intersection.get_all_lanes_with_traffic_lights()]),
+                tuple([len(road.last_section()) for road in intersection.incoming_roads.values()])
+                if intersection.vehicles_approaching else None)
+
+    def get_decision(self, intersection: Intersection):
+        """
+        Returns the mask of the lanes that turn GREEN.
+        """
+        # Without vehicles driving towards the intersection (see its occupancy index) no lane gets an extra weight
+        lanes_extra = self.distribute(intersection) if intersection.vehicles_approaching else None
+        return self.get_green_lanes(intersection, lanes_extra)
+
+    def update_idle(self, intersection: Intersection, ticks):
+        """
+        The lanes that turn GREEN only depend on the queue lengths and incoming vehicles. The skipped updates saw none,
+        so one update without extra weights is enough (vehicles might already be driving towards the intersection).
+        """
+        if ticks > 0:
+            self.set_traffic_lights(intersection, None)
+
+    def update_all(self, network, intersections, skipped, due):
+        """
+        Only the last update decides, which has the extra weights if it is due (and none if it catches up). The lane
+        with the highest priority is chosen for all intersections at once, like get_highest_priority_lane: a lane wins
+        if its queue length plus its extra weight exceeds the queue length of the lane that won before it.
+        """
+        rows = np.arange(len(intersections))
+        lanes = network.lanes[intersections]
+        bits = network.lane_bits[intersections]
+        queue_lengths = network.queue_lengths(intersections)
+        priorities = queue_lengths + np.where(due[:, None], self.distribute_all(network, lanes), 0)
+
+        # The phases that contain the lanes that are GREEN (the others are set to 0), and the lanes that can still turn
+        # GREEN
+        phases = network.phases[intersections]
+        green = np.zeros(len(intersections), dtype=np.int64)
+        options = lanes >= 0
+
+        while options.any():
+            # Find the lane with the highest priority (-1 at the intersections without options) and set it to GREEN
+            highest_priority_lane = np.full(len(intersections), -1, dtype=np.int64)
+            max_queue_length = np.full(len(intersections), -1, dtype=np.int64)
+            for column in range(lanes.shape[1]):
+                wins = options[:, column] & (priorities[:, column] > max_queue_length)
+                highest_priority_lane[wins] = column
+                max_queue_length[wins] = queue_lengths[wins, column]
+            bit = np.where(highest_priority_lane >= 0, bits[rows, highest_priority_lane], 0)
+            green |= bit
+            # Keep the phases with the lane, and the options that are in one of them (and not GREEN yet)
+            phases = np.where((bit[:, None] == 0) | ((phases & bit[:, None]) != 0), phases, 0)
+            allowed = np.bitwise_or.reduce(phases, axis=1) & ~green
+            options &= (bits & allowed[:, None]) != 0
+
+        return green
+
+    @staticmethod
+    def distribute_all(network, lanes):
+        """
+        distribute for the rows of lanes (padded with -1): the extra weight of every lane, which is the number of
+        vehicles in the last section of its road divided by the number of lanes of the road.
+        """
+        roads = network.lane_road[lanes]
+        return np.where(lanes >= 0, network.approaching[roads] / network.road_num_lanes[roads], 0)
+
+    @staticmethod
+    def distribute(intersection: Intersection):
+        """
+        For each incoming road, equally distribute the incoming vehicles over the lanes.
+        """
+        # A dictionary{Lane, float} to store the extra weight for that lane.
+        lanes_extra = {}
+        for road in intersection.incoming_roads.values():
+            num_lanes = len(road.lanes)
+            add_per_lane = len(road.last_section()) / num_lanes
+            for lane in road.get_all_lanes():
+                lanes_extra[lane] = add_per_lane
+        return lanes_extra
+
+    @classmethod
+    def set_traffic_lights(cls, intersection: Intersection, lanes_extra):
+        """
+        Turn the lanes GREEN in order of priority, given the extra weights of the lanes (None if they are all 0).
+        """
+        set_phase(intersection, cls.get_green_lanes(intersection, lanes_extra))
+
+    @staticmethod
+    def get_green_lanes(intersection: Intersection, lanes_extra):
+        """
+        Returns the mask of the lanes that turn GREEN in order of priority, given the extra weights of the lanes (None
+        if they are all 0).
+        """
         def get_highest_priority_lane(lanes: [Lane]):
             """
             Return the lane with the highest priority, which is the one with the most vehicles waiting
@@ -20,43 +121,32 @@ class GlobalOptimum(TrafficLightModel):
             max_lane = None
             max_queue_length = -1
 
-            # Get the extra weights for the lanes
-            lanes_extra = distribute()
-
             # Determine the lane with the highest priority
             for lane in lanes:
-                if len(lane.queue) + lanes_extra[lane] > max_queue_length:
+                queue_length = len(lane.queue)
+                if queue_length + (lanes_extra[lane] if lanes_extra is not None else 0) > max_queue_length:
                     max_lane = lane
-                    max_queue_length = len(lane.queue)
+                    max_queue_length = queue_length
 
             return max_lane
 
-        def distribute():
-            """
-            For each incoming road, equally distribute the incoming vehicles over the lanes.
-            """
-            # A dictionary{Lane, float} to store the extra weight for that lane.
-            lanes_extra = {}
-            for road in intersection.incoming_roads.values():
-                num_lanes = len(road.lanes)
-                add_per_lane = len(road.last_section()) / num_lanes
-                for lane in road.lanes.values():
-                    lanes_extra[lane] = add_per_lane
-            return lanes_extra
-
-        # All traffic lights are set to RED.
-        all_traffic_lights_red(intersection)
-        # Initialize the options list, which contains the lanes whose traffic lights can be set the GREEN
-        options = intersection.get_all_lanes_with_traffic_lights()
+        # The phases that contain the lanes that are GREEN (as a mask), and the lanes that can still turn GREEN
+        phases = intersection.phases
+        green = 0
+        options = list(intersection.get_all_lanes_with_traffic_lights())
 
         # Loop while there are still options. Note that the options list will contain at most 4 lanes because for each
         # direction there is only one outgoing lane
         while len(options) > 0:
-            # Find the lane with the highest priority
+            # Find the lane with the highest priority and set it to GREEN
             highest_priority_lane = get_highest_priority_lane(options)
-            # Set the highest priority lane to GREEN
-            highest_priority_lane.turn_green()
-            # Remove it from the options list, since it will be set to GREEN and is no longer an option
-            options.remove(highest_priority_lane)
-            # Remove all the conflicting lanes
-            options = find_non_conflicting(highest_priority_lane, options)
+            green |= highest_priority_lane.bit
+            # Keep the phases with the lane, and the options that are in one of them (and not GREEN yet)
+            phases = [phase for phase in phases if phase & highest_priority_lane.bit]
+            allowed = 0
+            for phase in phases:
+                allowed |= phase
+            allowed &= ~green
+            options = [lane for lane in options if lane.bit & allowed]
+
+        return green
@@ -1,3 +1,5 @@
+import numpy as np
+
 from models.traffic_light_models.traffic_light_models import *
 
 
@@ -6,41 +8,48 @@ class LocalOptimum(TrafficLightModel):
     Local optimum model with priority.
     """
 
-    def setup(self, grid):
-        pass
+    def setup(self, grid, rng):
+        self.setup_decision_cache()
 
     def update(self, intersection: Intersection):
         """
         Update the intersection with the Local Optimum model.
         """
-        def get_highest_priority_lane(lanes: [Lane]):
-            """
-            Return the lane with the highest priority, which is the one with the most vehicles waiting
-            """
-            max_lane = None
-            max_queue_length = -1
-
-            # Determine the lane with the highest priority
-            for lane in lanes:
-                if len(lane.queue) > max_queue_length:
-                    max_lane = lane
-                    max_queue_length = len(lane.queue)
-
-            return max_lane
-
-        # All traffic lights are set to RED.
-        all_traffic_lights_red(intersection)
-        # Initialize the options list, which contains the lanes whose traffic lights can be set the GREEN
-        options = intersection.get_all_lanes_with_traffic_lights()
-
-        # Loop while there are still options. Note that the options list will contain at most 4 lanes because for each
-        # direction there is only one outgoing lane
-        while len(options) > 0:
-            # Find the lane with the highest priority
-            highest_priority_lane = get_highest_priority_lane(options)
-            # Set the highest priority lane to GREEN
-            highest_priority_lane.turn_green()
-            # Remove it from the options list, since it will be set to GREEN and is no longer an option
-            options.remove(highest_priority_lane)
-            # Remove all the conflicting lanes
-            options = find_non_conflicting(highest_priority_lane, options)
+        set_phase(intersection, self.decide(intersection, self.signature, self.get_decision))
+
+    @staticmethod
+    def signature(intersection: Intersection):
+        """
+        The state the decision depends on: the queue lengths of the lanes with traffic lights.
+        """
+        return tuple([len(lane.queue) for lane in intersection.get_all_lanes_with_traffic_lights()])
+
+    @staticmethod
+    def get_decision(intersection: Intersection):
+        """
+        Returns the mask of the lanes that turn GREEN.
+        """
+        # The lanes in order of priority, which is the number of vehicles waiting (the first lane wins a tie). The lane
+        # with the highest priority turns GREEN, then the next one that fits in a phase with it, and so on. Without
+        # vehicles waiting (see the occupancy index of the intersection) all lanes tie, so they keep their order.
+        lanes = intersection.get_all_lanes_with_traffic_lights()
+        if intersection.lanes_occupied:
+            lanes = sorted(lanes, key=lambda lane: len(lane.queue), reverse=True)
+        return select_phase(intersection, lanes)
+
+    def update_idle(self, intersection: Intersection, ticks):
+        """
+        The lanes that turn GREEN only depend on the queue lengths, which stay zero while idle, so one update is enough.
+        """
+        if ticks > 0:
+            self.update(intersection)
+
+    def update_all(self, network, intersections, skipped, due):
+        """
+        The lanes that turn GREEN only depend on the current queue lengths, so the last update decides: the lanes of
+        every intersection are sorted by priority (a stable sort, so the first lane wins a tie) and the phases are
+        selected for all intersections at once.
+        """
+        order = np.argsort(-network.queue_lengths(intersections), axis=1, kind='stable')
+        lanes = np.take_along_axis(network.lane_bits[intersections], order, axis=1)
+        return select_phases(network.phases[intersections], lanes)
@@ -0,0 +1,105 @@
+import math
+
+import numpy as np
+
+from models.traffic_light_models.traffic_light_models import *
+
+# The pressures are counted in 1 / UNITS of a vehicle, so the vehicles shared by the lanes of a road (which has 1 to
+# len(Turning) lanes) are whole units and the pressures are exact integers
+UNITS = math.lcm(*range(1, len(Turning) + 1))
+
+
+class MaxPressure(TrafficLightModel):
+    """
+    Max pressure model: the phase with the highest pressure turns GREEN. The demand of a lane is the number of vehicles
+    waiting in it plus its share of the vehicles in the last section of its road (see GlobalOptimum.distribute). Its
+    pressure is its demand minus its share of the occupancy of the road it goes to (the vehicles on that road and in the
+    queues of its lanes, divided by its number of lanes), or 0 if that share is larger. The pressure of a phase is the
+    sum of the pressures of its lanes, the phase with the highest demand wins a tie, and then the first phase. Unlike
+    the Global Optimum model, the decision of an intersection depends on the state of its neighbours.
+    """
+
+    def setup(self, grid, rng):
+        return
+
+    def update(self, intersection: Intersection):
+        """
+        Update the intersection with the Max Pressure model.
+        """
+        set_phase(intersection, self.get_decision(intersection))
+
+    def update_idle(self, intersection: Intersection, ticks):
+        """
+        The lanes that turn GREEN only depend on the current state. The skipped updates saw no vehicles driving towards
+        the intersection, so one update without them is enough (vehicles might already be driving towards it).
+        """
+        if ticks > 0:
+            set_phase(intersection, self.get_decision(intersection, approaching=False))
+
+    @staticmethod
+    def downstream_occupancy(road):
+        """
+        Returns the number of vehicles on the road and in the queues of its lanes.
+        """
+        return road.num_vehicles() + sum([len(lane.queue) for lane in road.get_all_lanes()])
+
+    @classmethod
+    def get_decision(cls, intersection: Intersection, approaching=True):
+        """
+        Returns the phase (the mask of the lanes that turn GREEN) with the highest pressure, counting the vehicles
+        driving towards the intersection if approaching.
+        """
+        phases = intersection.phases
+        if not phases:
+            return 0
+        # Without vehicles waiting or driving towards the intersection (see its occupancy index) all phases tie
+        if not intersection.lanes_occupied and not (approaching and intersection.vehicles_approaching):
+            return phases[0]
+
+        # The demand and pressure of the lanes with demand (by their bit), in units
+        demands = {}
+        pressures = {}
+        for road in intersection.incoming_roads.values():
+            arriving = UNITS * len(road.last_section()) // len(road.lanes) if approaching else 0
+            for lane in road.get_lanes_with_traffic_lights():
+                demand = UNITS * len(lane.queue) + arriving
+                if demand:
+                    downstream = lane.goes_to_road
+                    demands[lane.bit] = demand
+                    pressures[lane.bit] = max(
+                        demand - UNITS * cls.downstream_occupancy(downstream) // len(downstream.lanes), 0)
+
+        max_phase = None
+        max_priority = None
+        for phase in phases:
+            priority = (sum([pressure for bit, pressure in pressures.items() if phase & bit]),
+                        sum([demand for bit, demand in demands.items() if phase & bit]))
+            if max_priority is None or priority > max_priority:
+                max_phase = phase
+                max_priority = priority
+        return max_phase
+
+    def update_all(self, network, intersections, skipped, due):
+        """
+        Only the last update decides, which counts the vehicles driving towards the intersection if it is due (and not
+        if it catches up). The pressures of the lanes and phases of all intersections are computed at once from the
+        network arrays (the padding phases get -1, so they are never chosen).
+        """
+        lanes = network.lanes[intersections]
+        roads = network.lane_road[lanes]
+        arriving = np.where(due[:, None] & (lanes >= 0),
+                            UNITS * network.approaching[roads] // network.road_num_lanes[roads], 0)
+        demands = UNITS * network.queue_lengths(intersections) + arriving
+        downstream = network.lane_goes_to_road[lanes]
+        pressures = np.maximum(
+            demands - UNITS * network.downstream_occupancy(lanes) // network.road_num_lanes[downstream], 0)
+
+        # The pressure and demand of every phase, and the phase with the highest demand among those with the highest
+        # pressure (the first one wins a tie)
+        phases = network.phases[intersections]
+        in_phase = (phases[:, :, None] & network.lane_bits[intersections][:, None, :]) != 0
+        phase_pressures = np.where(phases != 0, (in_phase * pressures[:, None, :]).sum(axis=2), -1)
+        phase_demands = np.where(phases != 0, (in_phase * demands[:, None, :]).sum(axis=2), -1)
+        highest = phase_pressures == phase_pressures.max(axis=1)[:, None]
+        choice = np.argmax(np.where(highest, phase_demands, -1), axis=1)
+        return phases[np.arange(len(intersections)), choice]
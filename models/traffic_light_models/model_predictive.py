@@ -0,0 +1,128 @@
+import json
+import time
+
+import numpy as np
+
+import config
+from models.traffic_light_models.traffic_light_models import *
+
+
+class ModelPredictive(TrafficLightModel):
+    """
+    Model predictive model: every phase of the intersection is simulated config.PREDICTIVE_HORIZON steps ahead, and the
+    phase with the fewest steps waiting turns GREEN.
+    """
+    def __init__(self):
+        # The random number generator of the lookahead (seeded from the random number generator of the simulation)
+        self.generator = None
+
+        # The number of decisions, their total and maximum time in seconds and the number of decisions that took longer
+        # than config.PREDICTIVE_LATENCY_BUDGET (of the run)
+        self.decisions = 0
+        self.total_latency = 0.
+        self.max_latency = 0.
+        self.over_budget = 0
+
+    def setup(self, grid, rng):
+        """
+        Setup the Model Predictive traffic light model.
+        """
+        self.generator = np.random.default_rng(rng.getrandbits(64))
+        self.decisions = 0
+        self.total_latency = 0.
+        self.max_latency = 0.
+        self.over_budget = 0
+
+    def update(self, intersection: Intersection):
+        """
+        Update the intersection with the Model Predictive model.
+        """
+        start = time.perf_counter()
+        set_phase(intersection, self.get_decision(intersection))
+
+        latency = time.perf_counter() - start
+        self.decisions += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if config.PREDICTIVE_LATENCY_BUDGET is not None and latency > config.PREDICTIVE_LATENCY_BUDGET:
+            self.over_budget += 1
+
+    def update_idle(self, intersection: Intersection, ticks):
+        """
+        The skipped updates saw no vehicles waiting or driving towards the intersection, so they all set the first phase
+        without drawing from the generator (see get_decision). Vehicles might already be driving towards it now, so the
+        first phase is set without looking at them.
+        """
+        if ticks > 0:
+            set_phase(intersection, intersection.phases[0] if intersection.phases else 0)
+
+    def get_decision(self, intersection: Intersection):
+        """
+        Returns the phase (the mask of the lanes that turn GREEN) with the fewest steps waiting over the horizon.
+
+        The lookahead forks the state of the intersection: the queue lengths of the lanes with traffic lights, and the
+        vehicles in the last sections of the incoming roads (which enter a random lane of their road at the next step).
+        It draws config.PREDICTIVE_SAMPLES samples of the lanes they enter and of the flow through of every lane at
+        every step, which all phases share (so they are compared on the same samples). A phase stays GREEN over the
+        whole horizon and no other vehicles arrive, so a lane that is GREEN lets the cumulative flow through leave its
+        queue and a lane that is RED keeps its queue: the steps waiting of every lane follow from the cumulative sums,
+        for all samples and steps at once.
+        """
+        lanes = intersection.get_all_lanes_with_traffic_lights()
+        phases = intersection.phases
+        if len(phases) < 2:
+            return phases[0] if phases else 0
+        # Without vehicles in the queues or the last sections all phases tie, and nothing is drawn from the generator
+        # (so the updates skipped while the intersection had no vehicles do not change the results, see update_idle)
+        queue_lengths = [len(lane.queue) for lane in lanes]
+        arrivals = [(road, len(road.last_section())) for road in intersection.incoming_roads.values()]
+        if not any(queue_lengths) and not any(arriving for _, arriving in arrivals):
+            return phases[0]
+        samples, horizon = config.PREDICTIVE_SAMPLES, config.PREDICTIVE_HORIZON
+
+        # The fork of the queues (one row per sample), with the vehicles that arrive at the next step
+        queues = np.tile(np.array(queue_lengths, dtype=np.int64), (samples, 1))
+        positions = {lane: position for position, lane in enumerate(lanes)}
+        for road, arriving in arrivals:
+            if arriving:
+                road_lanes = road.get_all_lanes()
+                entered = self.generator.multinomial(arriving, [1 / len(road_lanes)] * len(road_lanes), size=samples)
+                for column, lane in enumerate(road_lanes):
+                    if lane in positions:
+                        queues[:, positions[lane]] += entered[:, column]
+
+        # The vehicles that can leave every lane up to every step, and the steps waiting of every lane when GREEN (the
+        # vehicles left in the queue after every step) and when RED
+        flow_through = config.FLOW_THROUGH_BASE + np.asarray(config.FLOW_THROUGH_DIFF)[
+            self.generator.integers(len(config.FLOW_THROUGH_DIFF), size=(samples, horizon, len(lanes)))]
+        left = np.maximum(queues[:, None, :] - np.cumsum(flow_through, axis=1), 0)
+        waiting_green = left.sum(axis=1).mean(axis=0)
+        waiting_red = horizon * queues.mean(axis=0)
+
+        # The steps waiting of every phase (the first phase wins a tie)
+        bits = np.array([lane.bit for lane in lanes], dtype=np.int64)
+        green = (np.array(phases, dtype=np.int64)[:, None] & bits[None, :]) != 0
+        waiting = np.where(green, waiting_green, waiting_red).sum(axis=1)
+        return phases[int(np.argmin(waiting))]
+
+    def latency_statistics(self):
+        """
+        Returns the latency of the decisions of the run as a dictionary: the number of decisions, their mean and maximum
+        time in seconds, and the number of decisions that took longer than config.PREDICTIVE_LATENCY_BUDGET.
+        """
+        return {
+            'decisions': self.decisions,
+            'mean_latency': self.total_latency / self.decisions if self.decisions else 0.,
+            'max_latency': self.max_latency,
+            'over_budget': self.over_budget
+        }
+
+    def get_state(self, topology):
+        """
+        The state of the random number generator of the lookahead.
+        """
+        return {'generator': np.array(json.dumps(self.generator.bit_generator.state))}
+
+    def set_state(self, topology, state):
+        self.generator = np.random.default_rng()
+        self.generator.bit_generator.state = json.loads(str(state['generator']))
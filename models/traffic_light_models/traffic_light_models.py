@@ -1,7 +1,14 @@
+import functools
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 
+import numpy as np
+
+import config
+from models.direction import Direction
 from models.intersection import Intersection
 from models.lane import Lane
+from models.turning import Turning
 
 # The traffic light combinations a.k.a. TLComb
 TRAFFIC_LIGHT_COMBINATIONS = [
@@ -17,10 +24,16 @@ class TrafficLightModel(ABC):
     """
     The base class of traffic light models
     """
+    # The version of the model, which is part of the key of its cached results. Increase it when a change to the model
+    # changes its results, so the results are simulated again.
+    VERSION = 1
+    # The cache of the decisions of the model (see DecisionCache), or None if it decides at every update
+    decision_cache = None
+
     @abstractmethod
-    def setup(self, grid):
+    def setup(self, grid, rng):
         """
-        Setup the traffic light model.
+        Setup the traffic light model, which draws from the random number generator rng (if it draws at all).
         """
         return
 
@@ -31,14 +44,258 @@ class TrafficLightModel(ABC):
         """
         return
 
+    def update_idle(self, intersection: Intersection, ticks):
+        """
+        Catch up on ticks updates that were skipped because the intersection had no vehicles waiting or driving towards
+        it. Must leave the traffic lights (and the model) in the same state as those updates did, models can override it
+        to do so faster. Called when vehicles arrive, so the lanes are still empty but vehicles might be driving towards
+        the intersection.
+        """
+        for _ in range(ticks):
+            self.update(intersection)
+
+    def setup_decision_cache(self):
+        """
+        Setup the decision cache for a run (with config.DECISION_CACHE_SIZE decisions, or none if it is None). The
+        cached decisions of earlier runs are kept, they hold for every intersection with the same layout.
+        """
+        if config.DECISION_CACHE_SIZE is None:
+            self.decision_cache = None
+        elif self.decision_cache is None or self.decision_cache.size != config.DECISION_CACHE_SIZE:
+            self.decision_cache = DecisionCache(config.DECISION_CACHE_SIZE)
+        else:
+            self.decision_cache.start_run()
+
+    def decide(self, intersection: Intersection, signature, decide):
+        """
+        Returns the mask of the lanes that turn GREEN at the intersection, which is decide(intersection), or the cached
+        decision of the same signature(intersection) (see DecisionCache).
+        """
+        if self.decision_cache is None:
+            return decide(intersection)
+        return self.decision_cache.decide(intersection, signature, decide)
+
+    def update_all(self, network, intersections, skipped, due):
+        """
+        The batch interface, which updates many intersections in one call. For every intersection (an array of their
+        index in the NetworkArrays network), first catch up on skipped[i] updates (see update_idle), then update it if
+        due[i] (see update). Returns the array of the masks of the lanes that are GREEN afterwards (see Lane.bit),
+        without setting the traffic lights of the Lanes. Models without a batch implementation return None, and the
+        intersections are updated one by one instead.
+        """
+        return None
+
+    def get_state(self, topology):
+        """
+        Returns the internal state of the model as a dictionary{str, numpy array}, in which intersections and lanes are
+        given by their id in the topology (used for checkpoints). Models without state return an empty dictionary.
+        """
+        return {}
+
+    def set_state(self, topology, state):
+        """
+        Restore the internal state returned by get_state.
+        """
+        return
+
+
+class DecisionCache(object):
+    """
+    A bounded cache of the decisions (the masks of the lanes that turn GREEN) of a traffic light model whose decisions
+    only depend on the layout of an intersection and a signature of its state (such as its queue lengths). The least
+    recently used decision is dropped once the cache is full. An intersection whose lanes and roads did not change since
+    its last decision (see Intersection.changes) gets that decision again without computing its signature.
+    """
+    def __init__(self, size):
+        # The maximum number of decisions
+        self.size = size
+        # The decision of every (layout, signature), from least to most recently used
+        self.decisions = OrderedDict()
+        # The last decision of every intersection, with the number of changes of the intersection at the time
+        self.last_decisions = {}
+
+        # The number of decisions of the run that were skipped (unchanged intersections), found in the cache (hits) or
+        # computed (misses)
+        self.skips = 0
+        self.hits = 0
+        self.misses = 0
+
+    def start_run(self):
+        """
+        Start a new run: forget the last decisions of the intersections and the statistics, but keep the cache.
+        """
+        self.last_decisions = {}
+        self.skips = self.hits = self.misses = 0
+
+    def decide(self, intersection: Intersection, signature, decide):
+        """
+        Returns the decision of the intersection: its last decision if it did not change since, the cached decision of
+        its layout and signature(intersection), or decide(intersection) (which is cached).
+        """
+        last_decision = self.last_decisions.get(intersection)
+        if last_decision is not None and last_decision[0] == intersection.changes:
+            self.skips += 1
+            return last_decision[1]
+
+        key = (intersection.layout, signature(intersection))
+        decision = self.decisions.get(key)
+        if decision is None:
+            self.misses += 1
+            decision = self.decisions[key] = decide(intersection)
+            if len(self.decisions) > self.size:
+                self.decisions.popitem(last=False)
+        else:
+            self.hits += 1
+            self.decisions.move_to_end(key)
+
+        self.last_decisions[intersection] = (intersection.changes, decision)
+        return decision
+
+    def statistics(self):
+        """
+        Returns the statistics of the run as a dictionary: the number of decisions, skips, hits and misses, and the
+        hit rate (the share of the decisions that were not computed).
+        """
+        decisions = self.skips + self.hits + self.misses
+        return {
+            'decisions': decisions,
+            'skips': self.skips,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.skips + self.hits) / decisions if decisions else 0.
+        }
+
+
+def update_traffic_lights(traffic_light_model, intersection, step, last_update):
+    """
+    Update the traffic lights of an intersection with vehicles at step, which happens once every traffic_light_length
+    steps. The updates skipped while the intersection had no vehicles, since last_update[intersection] (the step of the
+    previous update), are caught up on first. Stores the step of the latest update in last_update.
+    """
+    catch_up_traffic_lights(traffic_light_model, intersection, step, last_update)
+
+    if step % intersection.traffic_light_length == 0:
+        traffic_light_model.update(intersection)
+        last_update[intersection] = step
+
+
+def catch_up_traffic_lights(traffic_light_model, intersection, step, last_update):
+    """
+    Catch up on the updates of the traffic lights of an intersection that were skipped before step, since
+    last_update[intersection] (if the intersection was updated before).
+    """
+    if intersection in last_update:
+        length = intersection.traffic_light_length
+        # The number of updates between the previous update and step
+        skipped = (step - 1 - last_update[intersection]) // length
+        if skipped > 0:
+            traffic_light_model.update_idle(intersection, skipped)
+            last_update[intersection] += skipped * length
+
+
+class NetworkArrays(object):
+    """
+    The state of the intersections, lanes and roads of one or more grids as flat arrays, which the batch interface of
+    the traffic light models reads (see TrafficLightModel.update_all). The count arrays are those of the engine, so
+    they always hold the current state. Every intersection has a row with its lanes with traffic lights, in the order of
+    Intersection.get_all_lanes_with_traffic_lights (padded with -1), and a row with its phases (padded with 0).
+    """
+    def __init__(self, intersections, lanes_with_traffic_lights, lane_bit, lane_road, lane_goes_to_road,
+                 road_first_lane, road_num_lanes, queue_size, approaching, road_occupancy):
+        # The Intersection objects, and their id in their own topology
+        self.intersections = intersections
+        self.intersection_id = np.array([intersection.id for intersection in intersections], dtype=np.int64)
+
+        # The lanes with traffic lights of every intersection (their index in the lane arrays), and their bits
+        width = max([len(lanes) for lanes in lanes_with_traffic_lights] + [1])
+        self.lanes = np.full((len(intersections), width), -1, dtype=np.int64)
+        for index, lanes in enumerate(lanes_with_traffic_lights):
+            self.lanes[index, :len(lanes)] = lanes
+        self.lane_bits = np.where(self.lanes >= 0, lane_bit[self.lanes], 0)
+
+        # The phases of every intersection (see phase_table)
+        phases = [intersection.phases or () for intersection in intersections]
+        self.phases = np.zeros((len(intersections), max([len(row) for row in phases] + [1])), dtype=np.int64)
+        for index, row in enumerate(phases):
+            self.phases[index, :len(row)] = row
+
+        # The road of every lane and the road it goes to, and the first lane and the number of lanes of every road (the
+        # lanes of a road have consecutive indexes)
+        self.lane_road = lane_road
+        self.lane_goes_to_road = lane_goes_to_road
+        self.road_first_lane = road_first_lane
+        self.road_num_lanes = road_num_lanes
+        # The number of vehicles in the queue of every lane, in Road.last_section() of every road and on every road
+        self.queue_size = queue_size
+        self.approaching = approaching
+        self.road_occupancy = road_occupancy
+
+    def queue_lengths(self, intersections):
+        """
+        Returns the queue lengths of the lanes with traffic lights of the intersections (0 for the padding).
+        """
+        lanes = self.lanes[intersections]
+        return np.where(lanes >= 0, self.queue_size[lanes], 0)
+
+    def downstream_occupancy(self, lanes):
+        """
+        Returns the number of vehicles on the road every lane goes to and in the queues of its lanes, for the rows of
+        lanes (padded with -1, which get 0).
+        """
+        roads = self.lane_goes_to_road[lanes]
+        occupancy = self.road_occupancy[roads].copy()
+        first_lane, num_lanes = self.road_first_lane[roads], self.road_num_lanes[roads]
+        for column in range(len(Turning)):
+            has_lane = column < num_lanes
+            occupancy += np.where(has_lane, self.queue_size[np.where(has_lane, first_lane + column, 0)], 0)
+        return np.where(lanes >= 0, occupancy, 0)
+
+
+def select_phases(phases, lanes):
+    """
+    select_phase for many intersections at once: returns the mask of the lanes that turn GREEN at every intersection
+    when the lanes are considered in order. phases holds the phases of every intersection (a row padded with 0), and
+    lanes the bits of the lanes in order (a row padded with 0).
+    """
+    green = np.zeros(len(phases), dtype=np.int64)
+    for bits in lanes.T:
+        containing = (phases & bits[:, None]) != 0
+        found = containing.any(axis=1)
+        # Drop the phases without the lane (at the intersections where a phase contains it)
+        phases = np.where(found[:, None] & ~containing, 0, phases)
+        green |= np.where(found, bits, 0)
+    return green
+
+
+def lanes_to_array(lanes):
+    """
+    Returns the array of the ids of the lanes.
+    """
+    return np.array([lane.id for lane in lanes], dtype=np.int64)
+
+
+def lists_to_arrays(lists):
+    """
+    Returns the (offsets, ids) arrays of a list of lists of lanes: the ids of list i are ids[offsets[i]:offsets[i + 1]].
+    """
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(lanes) for lanes in lists])
+    return offsets, lanes_to_array([lane for lanes in lists for lane in lanes])
+
+
+def arrays_to_lists(topology, offsets, ids):
+    """
+    Returns the list of lists of lanes of the (offsets, ids) arrays returned by lists_to_arrays.
+    """
+    return [[topology.lanes[lane_id] for lane_id in ids[start:end]] for start, end in zip(offsets[:-1], offsets[1:])]
+
 
 def all_traffic_lights_red(intersection):
     """
     Set all traffic lights to RED.
     """
-    for road in intersection.incoming_roads.values():
-        for lane in road.lanes.values():
-            lane.turn_red()
+    for lane in intersection.get_all_lanes_with_traffic_lights():
+        lane.turn_red()
 
 
 def is_traffic_light_combination_possible(reference_lane, other_lane):
@@ -56,13 +313,89 @@ def is_traffic_light_combination_possible(reference_lane, other_lane):
     return TRAFFIC_LIGHT_COMBINATIONS[ref_T][oth_D][oth_T]
 
 
-def find_non_conflicting(reference_lane, lanes: [Lane]):
+def lane_bit(direction, turning):
     """
-    Find the lanes the would cause a conflict if they were GREEN simultaneously with reference_lane
+    Returns the bit of the lane at direction with turning in a 12-bit mask of the lanes of an intersection.
     """
-    non_conflicting = []
-    for other_lane in lanes:
-        if is_traffic_light_combination_possible(reference_lane, other_lane):
-            non_conflicting .append(other_lane)
+    return direction * len(Turning) + turning
+
 
-    return non_conflicting
+def conflict_masks():
+    """
+    Returns the array of the conflict mask of every lane bit (see lane_bit): the mask of the lanes that cannot be GREEN
+    together with the lane (see is_traffic_light_combination_possible).
+    """
+    lanes = [Lane(direction, turning, None) for direction in Direction for turning in Turning]
+    return np.array([sum(1 << lane_bit(other_lane.direction, other_lane.turning) for other_lane in lanes
+                         if not is_traffic_light_combination_possible(lane, other_lane)) for lane in lanes],
+                    dtype=np.int64)
+
+
+# The conflict mask of every lane bit
+CONFLICT_MASKS = tuple(conflict_masks().tolist())
+
+
+@functools.lru_cache(maxsize=None)
+def phase_table(lane_mask):
+    """
+    Returns the phases of an intersection with the lanes (with traffic lights) in lane_mask: the masks of the maximal
+    sets of those lanes that can be GREEN together, in increasing order. Enumerated once per lane mask (Bron-Kerbosch on
+    the lanes that do not conflict).
+    """
+    phases = []
+
+    def extend(phase, candidates, excluded):
+        if not candidates and not excluded:
+            phases.append(phase)
+        while candidates:
+            bit = candidates & -candidates
+            compatible = ~CONFLICT_MASKS[bit.bit_length() - 1] & ~bit
+            extend(phase | bit, candidates & compatible, excluded & compatible)
+            candidates &= ~bit
+            excluded |= bit
+
+    extend(0, lane_mask, 0)
+    return tuple(sorted(phases))
+
+
+# The ids of the layouts of the intersections (see layout_id)
+LAYOUT_IDS = {}
+
+
+def layout_id(intersection: Intersection):
+    """
+    Returns the id of the layout of the intersection: its lanes with traffic lights (their bits, in order) with the
+    position of their road among the incoming roads and its number of lanes. The Local and Global Optimum models make
+    the same decision at intersections with the same layout in the same state.
+    """
+    roads = list(intersection.incoming_roads.values())
+    layout = tuple((lane.bit, roads.index(road), len(road.lanes)) for road in roads
+                   for lane in road.get_lanes_with_traffic_lights())
+    return LAYOUT_IDS.setdefault(layout, len(LAYOUT_IDS))
+
+
+def select_phase(intersection: Intersection, lanes):
+    """
+    Returns the mask of the lanes that turn GREEN when the lanes are considered in order: a lane turns GREEN if a phase
+    of the intersection contains it and the lanes that turned GREEN before it. Lanes without a traffic light are in no
+    phase, so they never turn GREEN (they have no light).
+    """
+    phases = intersection.phases
+    green = 0
+    for lane in lanes:
+        containing = [phase for phase in phases if phase & lane.bit]
+        if containing:
+            phases = containing
+            green |= lane.bit
+    return green
+
+
+def set_phase(intersection: Intersection, green):
+    """
+    Set the traffic lights of the lanes in the mask green to GREEN, and the others to RED.
+    """
+    for lane in intersection.get_all_lanes_with_traffic_lights():
+        if lane.bit & green:
+            lane.turn_green()
+        else:
+            lane.turn_red()
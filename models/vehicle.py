@@ -1,11 +1,8 @@
-import random
-
-
 class Vehicle(object):
     """
     A Vehicle drives from intersection to intersection and does so in a number of steps.
     """
-    def __init__(self, roads_to_drive, road, lane):
+    def __init__(self, roads_to_drive, road, lane, destination=None, route=None):
         # The road the vehicle is driving on
         self.road = road
         # The lane the vehicle leaves the road
@@ -15,6 +12,10 @@ class Vehicle(object):
 
         # The number of roads to drive
         self.roads_to_drive = roads_to_drive
+        # The destination (an intersection id) and the next lane table to it (see RouteTable.route), or None if the
+        # vehicle chooses random lanes
+        self.destination = destination
+        self.route = route
 
         # The number of steps driving
         self.steps_driving = 0
@@ -22,6 +23,9 @@ class Vehicle(object):
         self.steps_waiting = 0
         # The number of traffic lights encountered
         self.number_of_encountered_traffic_lights = 1 if lane.has_traffic_light else 0
+        # The step at which the vehicle entered its current lane or road. The steps waiting and driving are added once
+        # the vehicle leaves the lane or road, instead of on every step.
+        self.step_entered = 0
 
         # Used for resetting
         self.start_lane = lane
@@ -36,24 +40,39 @@ class Vehicle(object):
 
     def total_steps(self):
         """
-        Return the total number of steps = steps_driving + steps_waiting.
+        Return the total number of steps = steps_driving + steps_waiting. Only complete for the lanes and roads the
+        vehicle already left, which are all of them once it is finished.
         """
         return self.steps_driving + self.steps_waiting
 
-    def choose_lane(self):
+    def choose_lane(self, step, rng):
         """
-        Choose a random lane and enter it
+        Choose a random lane (drawn from rng), or the lane of the route to the destination, and enter it
         """
-        lane = random.choice(list(self.road.lanes.values()))
+        if self.route is None:
+            lane = rng.choice(self.road.get_all_lanes())
+        else:
+            lane = self.road.get_all_lanes()[self.route[self.road.id]]
         lane.enter(self)
         self.lane = lane
+        self.step_entered = step
+
+    def leave_road(self, step):
+        """
+        Leave the road at step. The vehicle drove one step for every Road.update it stayed on the road.
+        """
+        self.steps_driving += step - self.step_entered - 1
 
-    def cross_intersection(self):
+    def cross_intersection(self, step):
         """
-        Cross the intersection and enter the road
+        Cross the intersection and enter the road. The vehicle waited at every step since it entered the lane, and
+        drives at this step.
         """
+        self.steps_waiting += step - self.step_entered
+        self.steps_driving += 1
         self.lane.goes_to_road.enter(self)
         self.road = self.lane.goes_to_road
+        self.step_entered = step
 
     def reset(self):
         """
@@ -67,3 +86,4 @@ class Vehicle(object):
         self.steps_waiting = 0
         self.steps_driving = 0
         self.number_of_encountered_traffic_lights = 1 if self.lane.has_traffic_light else 0
+        self.step_entered = 0
@@ -0,0 +1,34 @@
+class Worklist(object):
+    """
+    A set of intersections, roads or lanes that need to be updated. The items are visited in the order of their id, which
+    is the order in which the simulation visits the whole grid.
+    """
+    def __init__(self, items=()):
+        # A dictionary{id, item}
+        self.items = {}
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item.id in self.items
+
+    def add(self, item):
+        """
+        Add the item (if it is not in the worklist yet)
+        """
+        self.items[item.id] = item
+
+    def discard(self, item):
+        """
+        Remove the item (if it is in the worklist)
+        """
+        self.items.pop(item.id, None)
+
+    def ordered(self):
+        """
+        Returns a list of the items, ordered by id. The worklist can be changed while looping over the list.
+        """
+        return [self.items[item_id] for item_id in sorted(self.items)]
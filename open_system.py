@@ -0,0 +1,184 @@
+import csv
+import math
+import random
+from collections import deque
+
+import config
+import setup
+import simulation
+from models.worklist import Worklist
+from models.traffic_light_models.traffic_light_models import catch_up_traffic_lights
+
+
+def random_arrival(rng):
+    """
+    Returns a vehicle arriving at a random intersection, as (x, y, roads_to_drive).
+    """
+    x = rng.randint(0, config.GRID_WIDTH - 1)
+    y = rng.randint(0, config.GRID_HEIGHT - 1)
+    roads_to_drive = rng.randint(config.VEHICLE_MIN_ROADS, config.VEHICLE_MAX_ROADS)
+    return x, y, roads_to_drive
+
+
+def poisson_arrivals(rate, seed):
+    """
+    Generate the vehicles that arrive at every step: a Poisson stream of on average rate vehicles per step, at random
+    intersections. The stream has its own random number generator (seeded with seed), so every model sees the same
+    vehicles. Yields a list of (x, y, roads_to_drive) for every step.
+    """
+    rng = random.Random(seed)
+
+    # The (continuous) time of the next arrival
+    arrival = rng.expovariate(rate)
+    step = 0
+    while True:
+        vehicles = []
+        while arrival < step + 1:
+            vehicles.append(random_arrival(rng))
+            arrival += rng.expovariate(rate)
+        yield vehicles
+        step += 1
+
+
+def trace_arrivals(file_path):
+    """
+    Read the vehicles that arrive at every step from a trace: a csv file with the columns step, x, y and
+    roads_to_drive, ordered by step. Yields a list of (x, y, roads_to_drive) for every step until the trace ends.
+    """
+    with open(file_path, newline='') as file:
+        step = 0
+        vehicles = []
+        for row in csv.DictReader(file):
+            while step < int(row['step']):
+                yield vehicles
+                vehicles = []
+                step += 1
+            vehicles.append((int(row['x']), int(row['y']), int(row['roads_to_drive'])))
+        yield vehicles
+
+
+class Statistics(object):
+    """
+    The running sums of the statistics of finished vehicles, which are kept instead of the vehicles themselves.
+    """
+    def __init__(self):
+        self.num_vehicles = 0
+        self.steps = 0
+        self.waiting_steps = 0
+        self.traffic_lights = 0
+        # The number of vehicles that encountered traffic lights, and the sum of their steps waiting per traffic light
+        self.num_scored = 0
+        self.score = 0.
+
+    def add(self, vehicle):
+        """
+        Add the statistics of a finished vehicle.
+        """
+        self.num_vehicles += 1
+        self.steps += vehicle.total_steps()
+        self.waiting_steps += vehicle.steps_waiting
+        self.traffic_lights += vehicle.number_of_encountered_traffic_lights
+        if vehicle.number_of_encountered_traffic_lights != 0:
+            self.num_scored += 1
+            self.score += vehicle.steps_waiting / vehicle.number_of_encountered_traffic_lights
+
+    def merge(self, other):
+        """
+        Add the statistics of other.
+        """
+        self.num_vehicles += other.num_vehicles
+        self.steps += other.steps
+        self.waiting_steps += other.waiting_steps
+        self.traffic_lights += other.traffic_lights
+        self.num_scored += other.num_scored
+        self.score += other.score
+
+    def get_results(self, traffic_light_model):
+        """
+        Return the results (as a dictionary), like simulation.get_results does for a list of vehicles. The means are
+        NaN if no vehicles finished.
+        """
+        def mean(total, count):
+            return total / count if count else math.nan
+
+        return {
+            'model': traffic_light_model,
+            'mean_number_of_steps': mean(self.steps, self.num_vehicles),
+            'mean_number_of_traffic_lights': mean(self.traffic_lights, self.num_vehicles),
+            'mean_number_of_waiting_steps': mean(self.waiting_steps, self.num_vehicles),
+            'simulation_score': mean(self.score, self.num_scored)
+        }
+
+
+class SlidingWindow(object):
+    """
+    The statistics of the vehicles that finished in the last length steps, kept in buckets of stride steps.
+    """
+    def __init__(self, length, stride):
+        self.buckets = deque(maxlen=max(length // stride, 1))
+
+    def add(self, bucket: Statistics):
+        """
+        Add the statistics of the last stride steps, which drops the oldest bucket once the window is full.
+        """
+        self.buckets.append(bucket)
+
+    def statistics(self):
+        """
+        Returns the statistics of the window.
+        """
+        statistics = Statistics()
+        for bucket in self.buckets:
+            statistics.merge(bucket)
+        return statistics
+
+
+def run(grid, traffic_light_model, rng, arrivals, num_steps):
+    """
+    Run the simulation on the grid (without vehicles) with traffic_light_model and the random number generator rng
+    (which the model was set up with) for num_steps steps, while vehicles arrive from arrivals (see poisson_arrivals).
+    Finished vehicles are folded into the statistics and dropped, so the memory does not grow with num_steps. Yields
+    (step, vehicles_driving, statistics) every config.WINDOW_STRIDE steps, with the statistics of the vehicles that
+    finished in the last config.WINDOW_LENGTH steps.
+    """
+    # Keep track of the number of vehicles that are driving.
+    vehicles_driving = 0
+
+    # The worklists and traffic light updates, like in simulation.run.
+    active_roads = Worklist()
+    active_lanes = Worklist()
+    active_intersections = Worklist(grid.all_intersections_with_traffic_lights())
+    last_update = {}
+
+    window = SlidingWindow(config.WINDOW_LENGTH, config.WINDOW_STRIDE)
+    # The statistics of the vehicles that finished since the last bucket was added to the window.
+    bucket = Statistics()
+    finished = []
+
+    for step in range(num_steps):
+        # The arriving vehicles enter a lane.
+        for x, y, roads_to_drive in next(arrivals, ()):
+            intersection = grid.intersections[x][y]
+            if intersection.has_traffic_lights:
+                # The updates the intersection skipped saw no vehicles, so they are caught up on before the vehicle
+                # enters the lane.
+                catch_up_traffic_lights(traffic_light_model, intersection, step, last_update)
+                active_intersections.add(intersection)
+
+            vehicle = setup.setup_vehicle(intersection, roads_to_drive, rng, grid.routes)
+            vehicle.step_entered = step
+            active_lanes.add(vehicle.lane)
+            vehicles_driving += 1
+
+        vehicles_driving -= simulation.update(step, traffic_light_model, rng, active_intersections, active_roads,
+                                              active_lanes, last_update, finished)
+
+        # Fold the finished vehicles into the statistics.
+        for vehicle in finished:
+            bucket.add(vehicle)
+        finished.clear()
+
+        if (step + 1) % config.WINDOW_STRIDE == 0:
+            window.add(bucket)
+            bucket = Statistics()
+            yield step + 1, vehicles_driving, window.statistics()
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import uuid
+
+import config
+
+# The settings of config that change the results of a simulation. The other settings (the traffic loads, the number of
+# replicas, the engine, the number of workers and the paths) only choose which simulations are run, and how.
+CONFIG_NAMES = ('GRID_WIDTH', 'GRID_HEIGHT', 'GRID_GENERATOR', 'ROAD_PROBABILITY', 'ROAD_LENGTH_BASE',
+                'ROAD_LENGTH_DIFF', 'LANE_PROBABILITY', 'TRAFFIC_LIGHT_LENGTH', 'FLOW_THROUGH_BASE',
+                'FLOW_THROUGH_DIFF', 'VEHICLE_MIN_ROADS', 'VEHICLE_MAX_ROADS', 'ROUTING', 'SHARED_NETWORK',
+                'RANDOM_NUMBERS', 'PREDICTIVE_HORIZON', 'PREDICTIVE_SAMPLES')
+# The version of the simulation (the grids, roads, lanes, vehicles and engines), which is part of the key of the cached
+# results. The cache cannot see changes to the code: increase it when a change to the simulation changes its results,
+# and the VERSION of a model when a change to the model does.
+SIMULATION_VERSION = 1
+
+
+def config_hash():
+    """
+    Returns a hash of the settings in CONFIG_NAMES.
+    """
+    settings = {name: getattr(config, name) for name in CONFIG_NAMES}
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def cell_key(traffic_light_model, num_vehicles, seed):
+    """
+    Returns the key of the simulation of traffic_light_model on the grid with num_vehicles generated from seed: the hash
+    of the config, the version of the simulation, the class and version of the model, the traffic load and the seed.
+    Any change to the behaviour of the simulation or of the model must increase SIMULATION_VERSION or the VERSION of
+    the model, otherwise the cache returns stale results.
+    """
+    return {
+        'config': config_hash(),
+        'simulation': SIMULATION_VERSION,
+        'model': traffic_light_model.__class__.__name__,
+        'version': traffic_light_model.VERSION,
+        'num_vehicles': int(num_vehicles),
+        'seed': seed
+    }
+
+
+def cell_path(cache_path, key):
+    """
+    Returns the file of the cell with key, which is named after the hash of the key.
+    """
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    return os.path.join(cache_path, digest[:2], digest + '.json')
+
+
+def read_results(cache_path, key):
+    """
+    Returns the cached results (as a dictionary) of the cell with key, or None if they are not in the cache.
+    """
+    file_path = cell_path(cache_path, key)
+    if not os.path.isfile(file_path):
+        return None
+
+    with open(file_path) as file:
+        cell = json.load(file)
+    return cell['results'] if cell['key'] == key else None
+
+
+def write_results(cache_path, key, results):
+    """
+    Write the results of the cell with key to the cache. The file is replaced at once, so an interrupted sweep leaves
+    complete cells only. Every writer writes its own temporary file, since two workers can simulate the same cell
+    (after its lease expired).
+    """
+    file_path = cell_path(cache_path, key)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    temporary_path = "{}.{}.{}.tmp".format(file_path, os.getpid(), uuid.uuid4().hex)
+    with open(temporary_path, 'w') as file:
+        json.dump({'key': key, 'results': results}, file)
+    os.replace(temporary_path, file_path)
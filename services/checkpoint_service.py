@@ -0,0 +1,154 @@
+import hashlib
+import os
+import uuid
+
+import numpy as np
+
+from engines.block_random import BlockRandom
+from models.light import Light
+from models.worklist import Worklist
+
+
+def fingerprint(grid, traffic_light_model):
+    """
+    Returns a fingerprint of the simulation of grid with traffic_light_model: the network, the starting positions of
+    the vehicles and the model. A checkpoint is only resumed by the same simulation.
+    """
+    topology = grid.topology
+    vehicles = grid.vehicles
+    digest = hashlib.sha1(traffic_light_model.__class__.__name__.encode())
+    for array in (topology.road_length, topology.lane_goes_to_road, topology.lane_has_traffic_light,
+                  np.array([vehicle.start_lane.id for vehicle in vehicles], dtype=np.int64),
+                  np.array([vehicle.start_roads_to_drive for vehicle in vehicles], dtype=np.int64),
+                  np.array([-1 if vehicle.destination is None else vehicle.destination for vehicle in vehicles],
+                           dtype=np.int64)):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def write_checkpoint(file_path, grid, traffic_light_model, rng, step, vehicles_driving, worklists, last_update):
+    """
+    Write the state of the simulation of grid with traffic_light_model at the end of step - 1 to file_path: the roads,
+    lanes, traffic lights and vehicles, the state of the model and of the random number generator rng, and the state
+    of simulation.run (vehicles_driving, the worklists of roads, lanes and intersections, and last_update). Vehicles,
+    roads, lanes and intersections are stored by their index, in compressed numpy arrays. The file is replaced at
+    once, so a crash while writing leaves the previous checkpoint. Every writer writes its own temporary file, since
+    all processes share config.CHECKPOINT_PATH.
+    """
+    topology = grid.topology
+    vehicle_ids = {vehicle: vehicle_id for vehicle_id, vehicle in enumerate(grid.vehicles)}
+    active_roads, active_lanes, active_intersections = worklists
+
+    # The vehicles in the sections of every road (in order), and in the queue of every lane
+    sections = [section for road in topology.roads for section in road.sections]
+    lane_queues = [lane.queue for lane in topology.lanes]
+
+    # The state of the random number generator (version, internal state, gauss_next)
+    version, internal_state, gauss_next = rng.getstate()
+
+    state = {
+        'fingerprint': np.array(fingerprint(grid, traffic_light_model)),
+        'step': np.array(step),
+        'vehicles_driving': np.array(vehicles_driving),
+        'random_version': np.array(version),
+        'random_state': np.array(internal_state, dtype=np.uint32),
+        'random_gauss_next': np.array(np.nan if gauss_next is None else gauss_next),
+        # Roads
+        'road_head': np.array([road.head for road in topology.roads], dtype=np.int64),
+        'section_sizes': np.array([len(section) for section in sections], dtype=np.int64),
+        'section_vehicles': np.array([vehicle_ids[vehicle] for section in sections for vehicle in section],
+                                     dtype=np.int64),
+        # Lanes
+        'queue_sizes': np.array([len(queue) for queue in lane_queues], dtype=np.int64),
+        'queue_vehicles': np.array([vehicle_ids[vehicle] for queue in lane_queues for vehicle in queue],
+                                   dtype=np.int64),
+        'lane_green': np.array([lane.is_green() for lane in topology.lanes], dtype=bool),
+        # Vehicles
+        'vehicle_road': np.array([vehicle.road.id for vehicle in grid.vehicles], dtype=np.int64),
+        'vehicle_lane': np.array([vehicle.lane.id for vehicle in grid.vehicles], dtype=np.int64),
+        'vehicle_roads_to_drive': np.array([vehicle.roads_to_drive for vehicle in grid.vehicles], dtype=np.int64),
+        'vehicle_steps_driving': np.array([vehicle.steps_driving for vehicle in grid.vehicles], dtype=np.int64),
+        'vehicle_steps_waiting': np.array([vehicle.steps_waiting for vehicle in grid.vehicles], dtype=np.int64),
+        'vehicle_traffic_lights': np.array([vehicle.number_of_encountered_traffic_lights
+                                            for vehicle in grid.vehicles], dtype=np.int64),
+        'vehicle_step_entered': np.array([vehicle.step_entered for vehicle in grid.vehicles], dtype=np.int64),
+        # simulation.run
+        'active_roads': np.array(sorted(active_roads.items), dtype=np.int64),
+        'active_lanes': np.array(sorted(active_lanes.items), dtype=np.int64),
+        'active_intersections': np.array(sorted(active_intersections.items), dtype=np.int64),
+        'last_update': np.array([last_update.get(intersection, -1) for intersection in topology.intersections],
+                                dtype=np.int64),
+    }
+    for name, array in traffic_light_model.get_state(topology).items():
+        state['model_' + name] = array
+    if isinstance(rng, BlockRandom):
+        for name, array in rng.get_block_state().items():
+            state['random_block_' + name] = array
+
+    temporary_path = "{}.{}.{}.tmp".format(file_path, os.getpid(), uuid.uuid4().hex)
+    with open(temporary_path, 'wb') as file:
+        np.savez_compressed(file, **state)
+    os.replace(temporary_path, file_path)
+
+
+def read_checkpoint(file_path, grid, traffic_light_model, rng):
+    """
+    Restore the state written by write_checkpoint into grid, traffic_light_model and the random number generator rng.
+    Returns (step, vehicles_driving, worklists, last_update) to continue simulation.run with, or None if the file does
+    not exist or belongs to another simulation.
+    """
+    if not os.path.isfile(file_path):
+        return None
+
+    topology = grid.topology
+    with np.load(file_path) as file:
+        state = dict(file)
+    if str(state['fingerprint']) != fingerprint(grid, traffic_light_model):
+        return None
+
+    rng.setstate((int(state['random_version']), tuple(int(value) for value in state['random_state']),
+                  None if np.isnan(state['random_gauss_next']) else float(state['random_gauss_next'])))
+    if isinstance(rng, BlockRandom):
+        rng.set_block_state({name[len('random_block_'):]: array for name, array in state.items()
+                             if name.startswith('random_block_')})
+
+    # Vehicles
+    for vehicle_id, vehicle in enumerate(grid.vehicles):
+        vehicle.road = topology.roads[state['vehicle_road'][vehicle_id]]
+        vehicle.lane = topology.lanes[state['vehicle_lane'][vehicle_id]]
+        vehicle.roads_to_drive = int(state['vehicle_roads_to_drive'][vehicle_id])
+        vehicle.steps_driving = int(state['vehicle_steps_driving'][vehicle_id])
+        vehicle.steps_waiting = int(state['vehicle_steps_waiting'][vehicle_id])
+        vehicle.number_of_encountered_traffic_lights = int(state['vehicle_traffic_lights'][vehicle_id])
+        vehicle.step_entered = int(state['vehicle_step_entered'][vehicle_id])
+
+    # Roads
+    vehicles = iter([grid.vehicles[vehicle_id] for vehicle_id in state['section_vehicles']])
+    sizes = iter(state['section_sizes'])
+    for road, head in zip(topology.roads, state['road_head']):
+        road.head = int(head)
+        for section in road.sections:
+            section.clear()
+            section.extend(next(vehicles) for _ in range(next(sizes)))
+
+    # Lanes
+    vehicles = iter([grid.vehicles[vehicle_id] for vehicle_id in state['queue_vehicles']])
+    for lane, size, green in zip(topology.lanes, state['queue_sizes'], state['lane_green']):
+        lane.queue.clear()
+        lane.queue.extend(next(vehicles) for _ in range(size))
+        lane.traffic_light = Light.GREEN if green else Light.RED
+    # The queues and sections were filled without Lane.enter and Road.enter
+    for intersection in topology.intersections:
+        intersection.recount()
+
+    traffic_light_model.set_state(topology, {name[len('model_'):]: array for name, array in state.items()
+                                             if name.startswith('model_')})
+
+    worklists = (Worklist(topology.roads[road_id] for road_id in state['active_roads']),
+                 Worklist(topology.lanes[lane_id] for lane_id in state['active_lanes']),
+                 Worklist(topology.intersections[intersection_id]
+                          for intersection_id in state['active_intersections']))
+    last_update = {intersection: int(step) for intersection, step in zip(topology.intersections, state['last_update'])
+                   if step >= 0}
+
+    return int(state['step']), int(state['vehicles_driving']), worklists, last_update
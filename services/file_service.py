@@ -27,3 +27,13 @@ def write_results_to_file(file_path, results: dict):
             writer.writerow(results.keys())
 
         writer.writerow(results.values())
+
+
+def write_replicas_to_file(file_path, traffic_loads, num_replicas):
+    """
+    Write the number of replicas simulated at every traffic load to file_path
+    """
+    with open(file_path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['traffic_load', 'replicas'])
+        writer.writerows(zip(traffic_loads, num_replicas))
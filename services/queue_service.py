@@ -0,0 +1,145 @@
+import json
+import os
+import shutil
+import time
+import uuid
+
+# The folders of the queue: the tasks that are waiting, the tasks that are leased by a worker and the results
+TASKS = 'tasks'
+LEASES = 'leases'
+RESULTS = 'results'
+# The file that tells the workers to stop
+STOP = 'stop'
+
+
+def write_json(file_path, value):
+    """
+    Write value to file_path as json. The file is replaced at once, so readers never see a partial file. Every writer
+    writes its own temporary file, since two workers can push back the same task (after its lease expired).
+    """
+    temporary_path = "{}.{}.{}.tmp".format(file_path, os.getpid(), uuid.uuid4().hex)
+    with open(temporary_path, 'w') as file:
+        json.dump(value, file)
+    os.replace(temporary_path, file_path)
+
+
+def read_json(file_path):
+    """
+    Returns the value in the json file_path.
+    """
+    with open(file_path) as file:
+        return json.load(file)
+
+
+def create_queue(queue_path):
+    """
+    Create an empty queue in the folder queue_path, removing the tasks and results of a previous sweep.
+    """
+    for folder in (TASKS, LEASES, RESULTS):
+        shutil.rmtree(os.path.join(queue_path, folder), ignore_errors=True)
+        os.makedirs(os.path.join(queue_path, folder))
+    if os.path.exists(os.path.join(queue_path, STOP)):
+        os.remove(os.path.join(queue_path, STOP))
+
+
+def publish(queue_path, task_id, task):
+    """
+    Add task to the queue. Workers lease the tasks in the order of their task_id.
+    """
+    write_json(os.path.join(queue_path, TASKS, task_id + '.json'), task)
+
+
+def lease(queue_path):
+    """
+    Lease the first waiting task. A task is leased by moving it to the leases, which only one worker can do. Returns
+    (task_id, task), or None if no task is waiting.
+    """
+    if not os.path.isdir(os.path.join(queue_path, TASKS)):
+        # The queue was not created yet.
+        return None
+
+    for file_name in sorted(os.listdir(os.path.join(queue_path, TASKS))):
+        if not file_name.endswith('.json'):
+            continue
+        task_path = os.path.join(queue_path, TASKS, file_name)
+        leased_path = os.path.join(queue_path, LEASES, file_name)
+        try:
+            # The task keeps the time it was published, so it is touched first: a lease that starts out older than the
+            # lease time would expire right away (see expire_leases).
+            os.utime(task_path)
+            os.rename(task_path, leased_path)
+            return file_name[:-len('.json')], read_json(leased_path)
+        except FileNotFoundError:
+            # Another worker leased the task first, or the lease expired in the meantime (the task is in the queue
+            # again).
+            continue
+    return None
+
+
+def renew(queue_path, task_id):
+    """
+    Renew the lease of a task, which a worker does while it is working on it.
+    """
+    try:
+        os.utime(os.path.join(queue_path, LEASES, task_id + '.json'))
+    except FileNotFoundError:
+        # The lease expired and the task went back to the queue (or it is done).
+        pass
+
+
+def complete(queue_path, task_id, results):
+    """
+    Push back the results of a leased task and end the lease.
+    """
+    write_json(os.path.join(queue_path, RESULTS, task_id + '.json'), results)
+    try:
+        os.remove(os.path.join(queue_path, LEASES, task_id + '.json'))
+    except FileNotFoundError:
+        # The lease expired, another worker might be working on the task as well (and will get the same results).
+        pass
+
+
+def expire_leases(queue_path, lease_time):
+    """
+    Put the tasks that were not renewed in the last lease_time seconds (of workers that died) back in the queue.
+    Returns the number of expired leases.
+    """
+    expired = 0
+    now = time.time()
+    for file_name in os.listdir(os.path.join(queue_path, LEASES)):
+        leased_path = os.path.join(queue_path, LEASES, file_name)
+        try:
+            if not file_name.endswith('.json') or now - os.path.getmtime(leased_path) < lease_time:
+                continue
+            if os.path.exists(os.path.join(queue_path, RESULTS, file_name)):
+                # The worker pushed back its results, but did not end the lease yet.
+                continue
+            os.rename(leased_path, os.path.join(queue_path, TASKS, file_name))
+            expired += 1
+        except FileNotFoundError:
+            # The lease ended in the meantime.
+            continue
+    return expired
+
+
+def collect(queue_path, task_ids):
+    """
+    Returns the results of the tasks in task_ids that are done, as a dictionary{task_id, results}.
+    """
+    done = set(os.listdir(os.path.join(queue_path, RESULTS)))
+    return {task_id: read_json(os.path.join(queue_path, RESULTS, task_id + '.json')) for task_id in task_ids
+            if task_id + '.json' in done}
+
+
+def stop(queue_path):
+    """
+    Tell the workers to stop once the queue is empty.
+    """
+    write_json(os.path.join(queue_path, STOP), True)
+
+
+def is_stopped(queue_path):
+    """
+    True if the workers should stop, False otherwise.
+    """
+    return os.path.exists(os.path.join(queue_path, STOP))
@@ -0,0 +1,85 @@
+import json
+import os
+import uuid
+
+import numpy as np
+
+from models.grid import Grid
+
+# The first bytes of a scenario file, and the version of the format
+MAGIC = b'GRIDSCN\n'
+VERSION = 2
+# The alignment (in bytes) of the header and of every array in the file
+ALIGNMENT = 8
+
+
+def aligned(size):
+    """
+    Returns size rounded up to a multiple of ALIGNMENT.
+    """
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def compact(array):
+    """
+    Returns the array with the smallest (little-endian) dtype that holds its values.
+    """
+    if array.dtype == bool or array.size == 0:
+        return array
+    dtype = np.result_type(np.min_scalar_type(array.min()), np.min_scalar_type(array.max()))
+    return array.astype(dtype.newbyteorder('<'))
+
+
+def write_scenario(file_path, grid):
+    """
+    Write the scenario of grid (see Grid.export_scenario) to file_path: the magic bytes, the length of the header, a
+    json header with the layout of the arrays, and the arrays (in compact dtypes) at aligned offsets. The file is
+    replaced at once, so a crash while writing leaves the previous scenario. Every writer writes its own temporary file,
+    since two workers (or sweeps) can write the scenario of the same grid.
+    """
+    arrays = {name: compact(array) for name, array in grid.export_scenario().items()}
+
+    layout = []
+    size = 0
+    for name, array in arrays.items():
+        layout.append((name, array.dtype.str, array.shape, size))
+        size += aligned(array.nbytes)
+    header = json.dumps({'version': VERSION, 'layout': layout}).encode()
+    header += b' ' * (aligned(len(MAGIC) + 8 + len(header)) - len(MAGIC) - 8 - len(header))
+
+    temporary_path = "{}.{}.{}.tmp".format(file_path, os.getpid(), uuid.uuid4().hex)
+    with open(temporary_path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(np.array(len(header), dtype='<u8').tobytes())
+        file.write(header)
+        for name, array in arrays.items():
+            file.write(array.tobytes())
+            file.write(b'\0' * (aligned(array.nbytes) - array.nbytes))
+    os.replace(temporary_path, file_path)
+
+
+def map_scenario(file_path):
+    """
+    Map the arrays of the scenario in file_path into memory, without reading them. Returns the (read-only) arrays as a
+    dictionary{str, numpy array}.
+    """
+    buffer = np.memmap(file_path, dtype=np.uint8, mode='r')
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError("{} is not a scenario file".format(file_path))
+    header_size = int(buffer[len(MAGIC):len(MAGIC) + 8].view('<u8')[0])
+    header_end = len(MAGIC) + 8 + header_size
+    header = json.loads(bytes(buffer[len(MAGIC) + 8:header_end]))
+    if header['version'] != VERSION:
+        raise ValueError("{} has version {} instead of {}".format(file_path, header['version'], VERSION))
+
+    return {name: np.ndarray(tuple(shape), dtype, buffer, header_end + offset)
+            for name, dtype, shape, offset in header['layout']}
+
+
+def read_scenario(file_path):
+    """
+    Returns the Grid of the scenario in file_path.
+    """
+    scenario = map_scenario(file_path)
+    vehicles = (scenario['vehicle_lane'], scenario['vehicle_roads_to_drive'], scenario['vehicle_destination'])
+    return Grid(len(vehicles[0]), None, scenario, vehicles)
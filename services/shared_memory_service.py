@@ -0,0 +1,38 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# The alignment (in bytes) of the arrays in the block of shared memory
+ALIGNMENT = 8
+
+
+def publish_arrays(arrays):
+    """
+    Copy the arrays (a dictionary{str, numpy array}) into one block of shared memory. Returns the block, which the
+    publisher keeps open while it is used (and unlinks afterwards), and its layout, which is passed to attach_arrays.
+    """
+    layout = []
+    size = 0
+    for name, array in arrays.items():
+        layout.append((name, array.dtype.str, array.shape, size))
+        size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    memory = shared_memory.SharedMemory(create=True, size=max(size, ALIGNMENT))
+    for name, dtype, shape, offset in layout:
+        np.ndarray(shape, dtype, memory.buf, offset)[...] = arrays[name]
+    return memory, (memory.name, layout)
+
+
+def attach_arrays(spec):
+    """
+    Attach to the arrays published by publish_arrays with the layout spec, without copying them. Returns the block,
+    which has to stay open while the arrays are used, and the (read-only) arrays as a dictionary{str, numpy array}.
+    """
+    name, layout = spec
+    memory = shared_memory.SharedMemory(name=name)
+    arrays = {}
+    for array_name, dtype, shape, offset in layout:
+        array = np.ndarray(shape, dtype, memory.buf, offset)
+        array.flags.writeable = False
+        arrays[array_name] = array
+    return memory, arrays
@@ -1,17 +1,21 @@
-import random
 import operator
 
+import numpy as np
+
 import config
 from models.direction import Direction
 from models.intersection import Intersection
+from models.road import Road
+from models.topology import Topology
 from models.turning import Turning
 from models.vehicle import Vehicle
-from models.traffic_light_models.traffic_light_models import is_traffic_light_combination_possible
+from models.traffic_light_models.traffic_light_models import conflict_masks, is_traffic_light_combination_possible
 
 
-def setup_intersections():
+def setup_intersections(rng):
     """
-    Set up the intersections by adding outgoing and incoming lanes, and traffic lights.
+    Set up the intersections by adding outgoing and incoming lanes, and traffic lights, drawing from the random number
+    generator rng.
     :return: the intersections
     """
 
@@ -53,7 +57,7 @@ def setup_intersections():
             """
             True if the random number is less than or equal to the neighbour probability, False otherwise
             """
-            return random.random() <= config.ROAD_PROBABILITY
+            return rng.random() <= config.ROAD_PROBABILITY
 
         def get_neighbour_options(position):
             """
@@ -74,7 +78,7 @@ def setup_intersections():
             for intersection in [intersection for row in intersections for intersection in row]:
                 for D in Direction:
                     if (neighbour := get_neighbour(intersection.position(), D)) and gets_outgoing_road():
-                        intersection.add_road(neighbour, D)
+                        intersection.add_road(neighbour, D, rng)
 
         def minimum_roads():
             """
@@ -85,17 +89,17 @@ def setup_intersections():
                 if len(intersection.outgoing_roads) == 0:
                     options = get_neighbour_options(intersection.position())
                     # Choose an outgoing road
-                    direction, destination = random.choice(list(options.items()))
+                    direction, destination = rng.choice(list(options.items()))
                     # Add it to the intersection
-                    intersection.add_road(destination, direction)
+                    intersection.add_road(destination, direction, rng)
 
                 # Check if this intersection has at least one incoming road
                 if len(intersection.incoming_roads) == 0:
                     options = get_neighbour_options(intersection.position())
                     # Choose an incoming road
-                    direction, destination = random.choice(list(options.items()))
+                    direction, destination = rng.choice(list(options.items()))
                     # Add it to the intersection (as an outgoing road of the destination intersection)
-                    destination.add_road(intersection, direction.opposite())
+                    destination.add_road(intersection, direction.opposite(), rng)
 
         def fix_single_roads():
             """
@@ -121,9 +125,9 @@ def setup_intersections():
                         # Remove the side that the incoming road is on
                         options_outgoing.pop(D_inc)
                         # Choose an intersection
-                        direction, destination = random.choice(list(options_outgoing.items()))
+                        direction, destination = rng.choice(list(options_outgoing.items()))
                         # Add the outgoing road to the intersection
-                        intersection.add_road(destination, direction)
+                        intersection.add_road(destination, direction, rng)
 
                         intersection_updated = True
 
@@ -142,10 +146,10 @@ def setup_intersections():
                         # Remove the side that the outgoing road is on
                         options_incoming.pop(D_out)
                         # Choose an intersection
-                        direction, destination = random.choice(list(options_incoming.items()))
+                        direction, destination = rng.choice(list(options_incoming.items()))
                         # Add the incoming road to the intersection (as an outgoing road of the destination
                         # intersection)
-                        destination.add_road(intersection, direction.opposite())
+                        destination.add_road(intersection, direction.opposite(), rng)
 
                         intersection_updated = True
 
@@ -170,7 +174,7 @@ def setup_intersections():
             """
             True if the random number is less than or equal to the neighbour probability, False otherwise
             """
-            return random.random() <= config.LANE_PROBABILITY
+            return rng.random() <= config.LANE_PROBABILITY
 
         def initial_lanes():
             """
@@ -198,7 +202,7 @@ def setup_intersections():
                                 options.append(T)
 
                         # Choose a random lane
-                        T_choice = random.choice(options)
+                        T_choice = rng.choice(options)
                         # Add it to the road
                         road_inc.add_lane(T_choice, intersection.outgoing_roads[D.turn(T_choice)])
 
@@ -229,7 +233,7 @@ def setup_intersections():
                     # If there is no lane going to road_out, choose random incoming road to add a lane to.
                     if not has_at_least_one_lane_going_to_road_out:
                         # Random incoming road
-                        D_inc, road_inc = random.choice(list(incoming_roads_on_different_sides.items()))
+                        D_inc, road_inc = rng.choice(list(incoming_roads_on_different_sides.items()))
                         # Get the lane that would go to road_out
                         T = D_inc.lane(D_out)
                         # Add the lane to the road
@@ -274,10 +278,190 @@ def setup_intersections():
     return intersections
 
 
-def setup_vehicles(grid, num_vehicles):
+def generate_network(rng):
+    """
+    Generate a network with array operations (on all intersections at once) instead of one intersection at a time like
+    setup_intersections, so that large grids can be generated. The roads, lanes and traffic lights are drawn with the
+    same probabilities and meet the same requirements, but from a numpy generator seeded from rng, so the networks
+    differ from those of setup_intersections. Intersection i is at (x, y) = divmod(i, GRID_HEIGHT).
+    :return: the network arrays (see Topology.network_arrays)
+    """
+    generator = np.random.default_rng(rng.getrandbits(64))
+    width, height = config.GRID_WIDTH, config.GRID_HEIGHT
+    num_intersections = width * height
+    directions = np.arange(len(Direction))
+    opposite = (directions + 2) % len(Direction)
+    # The direction of the road that a lane at direction with turning goes to (see Direction.turn)
+    goes_to = (directions[:, None] + 1 + np.arange(len(Turning))) % len(Direction)
+
+    # The neighbour of every intersection at every direction, and whether it lies on the grid
+    x, y = np.divmod(np.arange(num_intersections), height)
+    neighbour_x = x[:, None] + np.array([0, 1, 0, -1])
+    neighbour_y = y[:, None] + np.array([1, 0, -1, 0])
+    inside = (0 <= neighbour_x) & (neighbour_x < width) & (0 <= neighbour_y) & (neighbour_y < height)
+    neighbour = np.where(inside, neighbour_x * height + neighbour_y, 0)
+
+    def get_incoming(outgoing):
+        """
+        Returns incoming[i, D]: True if there is a road from the neighbour at direction D to intersection i.
+        """
+        return inside & outgoing[neighbour, opposite]
+
+    def choose(options):
+        """
+        Returns a random column of every row of options among the True ones (every row must have one).
+        """
+        return (generator.random(options.shape) + options).argmax(axis=1)
+
+    def add_incoming(intersections, options):
+        """
+        Add a road to each of the intersections from a random neighbour at one of the directions in options.
+        """
+        sides = choose(options)
+        outgoing[neighbour[intersections, sides], opposite[sides]] = True
+
+    # The initial roads, which are determined by the ROAD_PROBABILITY for every intersection pair (outgoing[i, D]: True
+    # if there is a road from intersection i at direction D)
+    outgoing = inside & (generator.random((num_intersections, len(Direction))) <= config.ROAD_PROBABILITY)
+
+    # Make sure that every intersection has at least one outgoing and one incoming road.
+    rows = np.flatnonzero(~outgoing.any(axis=1))
+    outgoing[rows, choose(inside[rows])] = True
+    rows = np.flatnonzero(~get_incoming(outgoing).any(axis=1))
+    add_incoming(rows, inside[rows])
+
+    # Make sure that for every incoming road there is an outgoing road on another side, and the other way around
+    # (U-turns are not allowed). Adding roads can break this at the neighbours, so repeat until nothing changes.
+    while True:
+        incoming = get_incoming(outgoing)
+        both = (outgoing & incoming).any(axis=1)
+        # The only outgoing road is on the side of an incoming road
+        needs_outgoing = np.flatnonzero((outgoing.sum(axis=1) == 1) & both)
+        # The only incoming road is on the side of an outgoing road
+        needs_incoming = np.flatnonzero((incoming.sum(axis=1) == 1) & both)
+        if len(needs_outgoing) == 0 and len(needs_incoming) == 0:
+            break
+        outgoing[needs_outgoing, choose(inside[needs_outgoing] & ~outgoing[needs_outgoing])] = True
+        add_incoming(needs_incoming, inside[needs_incoming] & ~incoming[needs_incoming])
+
+    # The initial lanes, which are determined by the LANE_PROBABILITY for every incoming road and turning with an
+    # outgoing road (lanes[i, D, T]: True if the road entering intersection i at D has a lane turning T)
+    possible = incoming[:, :, None] & outgoing[:, goes_to]
+    lanes = possible & (generator.random(possible.shape) <= config.LANE_PROBABILITY)
+
+    # Make sure that every incoming road has at least one lane.
+    rows, sides = np.nonzero(incoming & ~lanes.any(axis=2))
+    lanes[rows, sides, choose(possible[rows, sides])] = True
+
+    # Make sure that every outgoing road can be reached by at least one lane (from another side).
+    reachable = np.zeros_like(outgoing)
+    for direction in directions:
+        for turning in range(len(Turning)):
+            reachable[:, goes_to[direction, turning]] |= lanes[:, direction, turning]
+    rows, sides = np.nonzero(outgoing & ~reachable)
+    incoming_sides = choose(incoming[rows] & (directions != sides[:, None]))
+    lanes[rows, incoming_sides, (sides - incoming_sides - 1) % len(Direction)] = True
+
+    # Every lane that conflicts with another lane of its intersection gets a traffic light.
+    lane_bits = lanes.reshape(num_intersections, -1)
+    masks = lane_bits @ (1 << np.arange(lane_bits.shape[1]))
+    traffic_lights = lane_bits & ((masks[:, None] & conflict_masks()) != 0)
+    has_traffic_lights = traffic_lights.any(axis=1)
+
+    # Roads are numbered by their origin and direction, and lanes by their intersection, direction and turning, which
+    # is the order of the incoming roads and their lanes.
+    road_keys = np.flatnonzero(outgoing)
+    road_origin, road_direction = np.divmod(road_keys, len(Direction))
+    road_index = np.full(outgoing.size, -1, dtype=np.int64)
+    road_index[road_keys] = np.arange(len(road_keys))
+
+    incoming_rows, incoming_sides = np.nonzero(incoming)
+    lane_rows, lane_sides, lane_turnings = np.nonzero(lanes)
+    lane_road = road_index[neighbour[lane_rows, lane_sides] * len(Direction) + opposite[lane_sides]]
+
+    return {
+        'grid_size': np.array([width, height], dtype=np.int64),
+        'intersection_has_traffic_lights': has_traffic_lights,
+        'intersection_traffic_light_length': np.where(has_traffic_lights, config.TRAFFIC_LIGHT_LENGTH, 0),
+        'incoming_offsets': np.concatenate([[0], np.cumsum(incoming.sum(axis=1))]),
+        'incoming_roads': road_index[neighbour[incoming_rows, incoming_sides] * len(Direction) +
+                                     opposite[incoming_sides]],
+        'road_origin': road_origin,
+        'road_destination': neighbour[road_origin, road_direction],
+        'road_length': config.ROAD_LENGTH_BASE + generator.choice(config.ROAD_LENGTH_DIFF, len(road_keys)),
+        'road_direction': road_direction,
+        # The lanes of a road are numbered consecutively
+        'road_lane_offsets': np.concatenate([[0], np.cumsum(np.bincount(lane_road, minlength=len(road_keys)))]),
+        'road_lanes': np.argsort(lane_road, kind='stable'),
+        'lane_turning': lane_turnings,
+        'lane_goes_to_road': road_index[lane_rows * len(Direction) + goes_to[lane_sides, lane_turnings]],
+        'lane_has_traffic_light': traffic_lights[lane_rows, lane_sides * len(Turning) + lane_turnings],
+    }
+
+
+def setup_network(network):
+    """
+    Set up the intersections, roads, lanes and traffic lights of a network exported by Topology.network_arrays, in the
+    order in which they were added (so the Topology gives them the same ids).
+    :return: the intersections
+    """
+    # Python lists and enums are faster to index than numpy arrays
+    network = {name: array.tolist() for name, array in network.items()}
+    directions = list(Direction)
+    turnings = list(Turning)
+
+    width, height = network['grid_size']
+    intersections = [[Intersection(x, y) for y in range(height)] for x in range(width)]
+    all_intersections = [intersection for row in intersections for intersection in row]
+
+    # The roads, in the order of the outgoing roads of every intersection
+    roads = []
+    for origin, destination, direction, length in zip(network['road_origin'], network['road_destination'],
+                                                      network['road_direction'], network['road_length']):
+        direction = directions[direction]
+        road = Road(all_intersections[origin], all_intersections[destination], direction.opposite(), length)
+        all_intersections[origin].outgoing_roads[direction] = road
+        roads.append(road)
+
+    offsets = network['incoming_offsets']
+    incoming_roads = network['incoming_roads']
+    for intersection_id, intersection in enumerate(all_intersections):
+        for road_id in incoming_roads[offsets[intersection_id]:offsets[intersection_id + 1]]:
+            intersection.incoming_roads[roads[road_id].end_direction] = roads[road_id]
+
+    # The lanes at the end of every road
+    offsets = network['road_lane_offsets']
+    road_lanes = network['road_lanes']
+    for road_id, road in enumerate(roads):
+        for lane_id in road_lanes[offsets[road_id]:offsets[road_id + 1]]:
+            turning = turnings[network['lane_turning'][lane_id]]
+            road.add_lane(turning, roads[network['lane_goes_to_road'][lane_id]])
+            road.lanes[turning].has_traffic_light = network['lane_has_traffic_light'][lane_id]
+
+    # The traffic lights
+    for intersection, has_traffic_lights, traffic_light_length in zip(
+            all_intersections, network['intersection_has_traffic_lights'],
+            network['intersection_traffic_light_length']):
+        if has_traffic_lights:
+            intersection.has_traffic_lights = True
+            intersection.traffic_light_length = traffic_light_length
+
+    return intersections
+
+
+def setup_topology(intersections):
+    """
+    Freeze the network of the intersections into an index, which is used instead of walking the intersections.
+    :return: the Topology
+    """
+    return Topology(intersections)
+
+
+def setup_vehicles(grid, num_vehicles, rng):
     """
     Set up the vehicles on the grid. The number of vehicles N \\in [min_vehicles,max_ vehicles] and each vehicles drives
-    a distance D \\in [min_roads_to_drive, max_roads_to_drive]
+    a distance D \\in [min_roads_to_drive, max_roads_to_drive], drawn from the random number generator rng. With
+    shortest path routing, each vehicle drives to a random destination instead (see setup_vehicle).
     :return: the array of vehicles
     """
     # The list of vehicles.
@@ -286,18 +470,48 @@ def setup_vehicles(grid, num_vehicles):
     # Make a random number of vehicles.
     for _ in range(num_vehicles):
         # Get a random intersection.
-        x = random.randint(0, config.GRID_WIDTH - 1)
-        y = random.randint(0, config.GRID_HEIGHT - 1)
+        x = rng.randint(0, config.GRID_WIDTH - 1)
+        y = rng.randint(0, config.GRID_HEIGHT - 1)
         intersection = grid.intersections[x][y]
 
-        # Determine the number of roads the vehicle has to drive.
-        roads_to_drive = random.randint(config.VEHICLE_MIN_ROADS, config.VEHICLE_MAX_ROADS)
-
-        # Choose a lane
-        lane = intersection.get_random_lane()
+        # Determine the number of roads the vehicle has to drive (given by the destination with routing).
+        roads_to_drive = rng.randint(config.VEHICLE_MIN_ROADS, config.VEHICLE_MAX_ROADS) if grid.routes is None else 0
 
         # Initialize the vehicle and it to the list.
-        vehicle = Vehicle(roads_to_drive, intersection.incoming_roads[lane.direction], lane)
-        vehicles.append(vehicle)
+        vehicles.append(setup_vehicle(intersection, roads_to_drive, rng, grid.routes))
 
     return vehicles
+
+
+def place_vehicles(grid, lanes, roads_to_drive, destinations):
+    """
+    Set up the vehicles on the grid in the starting lanes (their ids), which drive the numbers of roads in
+    roads_to_drive (to the destinations, or -1 for vehicles that choose random lanes).
+    :return: the array of vehicles
+    """
+    topology = grid.topology
+    return [Vehicle(roads, topology.roads[topology.lane_road[lane_id]], topology.lanes[lane_id],
+                    *((None, None) if destination < 0 else (destination, grid.routes.route(destination))))
+            for lane_id, roads, destination in zip(lanes.tolist(), roads_to_drive.tolist(), destinations.tolist())]
+
+
+def setup_vehicle(intersection, roads_to_drive, rng, routes=None):
+    """
+    Set up a vehicle in a random lane of the intersection (drawn from rng), which drives roads_to_drive roads. With the
+    RouteTable routes, the vehicle drives to a random destination (drawn from rng, until it can be reached from the
+    lane) along the shortest path instead, and roads_to_drive is the length of that path.
+    :return: the vehicle
+    """
+    # Choose a lane
+    lane = intersection.get_random_lane(rng)
+    road = intersection.incoming_roads[lane.direction]
+    if routes is None:
+        return Vehicle(roads_to_drive, road, lane)
+
+    # Choose a destination other than the intersection
+    roads_to_drive = 0
+    while not roads_to_drive:
+        destination = rng.randrange(len(routes.topology.intersections))
+        if destination != intersection.id:
+            roads_to_drive = routes.roads_to_drive(lane.goes_to_road, destination)
+    return Vehicle(roads_to_drive, road, lane, destination, routes.route(destination))
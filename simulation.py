@@ -1,11 +1,19 @@
+import os
+
 import numpy as np
 
-from services import file_service
+from models.worklist import Worklist
+from models.traffic_light_models.traffic_light_models import update_traffic_lights
+from services import checkpoint_service, file_service
 
 
-def run(grid, traffic_light_model):
+def run(grid, traffic_light_model, rng, checkpoint_path=None, checkpoint_interval=None):
     """
-    Run the simulation on the grid with traffic_light_model.
+    Run the simulation on the grid with traffic_light_model, drawing from the random number generator rng (which the
+    model was set up with). Only the roads and lanes with vehicles, and the intersections with vehicles waiting or
+    driving towards them, are updated. If checkpoint_path is given, the state of the simulation is written to it every
+    checkpoint_interval steps, and the simulation resumes from it if it holds a checkpoint of the same simulation. The
+    checkpoint is removed once all vehicles finished.
     """
     # Keep track of the number of vehicles that are driving.
     vehicles_driving = len(grid.vehicles)
@@ -13,37 +21,89 @@ def run(grid, traffic_light_model):
     # The current step in the simulation
     step = 0
 
+    # The worklists of roads and lanes with vehicles, and of intersections (with traffic lights) that might have
+    # vehicles. All intersections are updated at the first step.
+    active_roads = Worklist()
+    active_lanes = Worklist(vehicle.lane for vehicle in grid.vehicles)
+    active_intersections = Worklist(grid.all_intersections_with_traffic_lights())
+
+    # The step at which the traffic lights of an intersection were updated last.
+    last_update = {}
+
+    # Resume from the checkpoint (if there is one of this simulation).
+    if checkpoint_path is not None:
+        checkpoint = checkpoint_service.read_checkpoint(checkpoint_path, grid, traffic_light_model, rng)
+        if checkpoint is not None:
+            step, vehicles_driving, (active_roads, active_lanes, active_intersections), last_update = checkpoint
+
     # Loop until all vehicles are finished.
     while vehicles_driving:
-        # The number of vehicles that finished at this step.
-        num_finished = 0
-
-        # Update the states of the traffic lights at all intersections with traffic lights using the traffic
-        # light model.
-        for intersection in grid.all_intersections_with_traffic_lights():
-            # Update the traffic lights once every intersection.traffic_light_length
-            if step % intersection.traffic_light_length == 0:
-                traffic_light_model.update(intersection)
-
-        # Update all the roads.
-        for intersection in [intersection for row in grid.intersections for intersection in row]:
-            for road in [road for road in intersection.outgoing_roads.values()]:
-                num_finished += road.update()
-
-        # Update all the lanes.
-        for intersection in [intersection for row in grid.intersections for intersection in row]:
-            for lane in [lane for road in intersection.incoming_roads.values() for lane in road.lanes.values()]:
-                if not lane.has_traffic_light or lane.is_green():
-                    lane.update_on_green()
-                else:
-                    lane.update_on_red()
-
         # Subtract the number of finished vehicles.
-        vehicles_driving -= num_finished
+        vehicles_driving -= update(step, traffic_light_model, rng, active_intersections, active_roads, active_lanes,
+                                   last_update)
 
         # Increment the step
         step += 1
 
+        if checkpoint_path is not None and step % checkpoint_interval == 0:
+            checkpoint_service.write_checkpoint(checkpoint_path, grid, traffic_light_model, rng, step,
+                                                vehicles_driving, (active_roads, active_lanes, active_intersections),
+                                                last_update)
+
+    if checkpoint_path is not None and os.path.isfile(checkpoint_path):
+        os.remove(checkpoint_path)
+
+
+def update(step, traffic_light_model, rng, active_intersections, active_roads, active_lanes, last_update,
+           finished=None):
+    """
+    Update the intersections, roads and lanes in the worklists at step (drawing from rng), and the worklists
+    themselves. Returns the number of vehicles that finished, which are added to finished (if given).
+    """
+    # The number of vehicles that finished at this step.
+    num_finished = 0
+
+    # Update the states of the traffic lights at the intersections with vehicles using the traffic light model.
+    # Intersections without vehicles are dropped, the updates they skip are caught up on when vehicles arrive.
+    for intersection in active_intersections.ordered():
+        if not intersection.has_vehicles():
+            active_intersections.discard(intersection)
+            if intersection in last_update:
+                continue
+
+        # Update the traffic lights once every intersection.traffic_light_length
+        update_traffic_lights(traffic_light_model, intersection, step, last_update)
+
+    # Update the roads with vehicles.
+    for road in active_roads.ordered():
+        num_finished += road.update(step, rng, finished)
+        if not road.has_vehicles():
+            active_roads.discard(road)
+
+        # The vehicles that did not finish entered the lanes of the road.
+        for lane in road.get_all_lanes():
+            if lane.has_vehicles():
+                active_lanes.add(lane)
+
+    # Update the lanes with vehicles. Vehicles waiting at a RED light are not touched, their steps waiting are added
+    # when they cross the intersection.
+    for lane in active_lanes.ordered():
+        if not lane.has_traffic_light or lane.is_green():
+            if lane.update_on_green(step, rng):
+                active_roads.add(road := lane.goes_to_road)
+                if road.destination.has_traffic_lights:
+                    active_intersections.add(road.destination)
+
+        if not lane.has_vehicles():
+            active_lanes.discard(lane)
+
+    return num_finished
+
+
+# The names of the results (see get_results)
+RESULTS = ('model', 'mean_number_of_steps', 'mean_number_of_traffic_lights', 'mean_number_of_waiting_steps',
+           'simulation_score')
+
 
 def simulation_score(vehicles):
     """
@@ -74,11 +134,11 @@ def mean_number_of_steps(vehicles):
     return np.mean([v.total_steps() for v in vehicles])
 
 
-def save_results(vehicles, results_path, traffic_light_model):
+def get_results(vehicles, traffic_light_model):
     """
-    Save the results and write them to a file
+    Return the results (as a dictionary)
     """
-    results = {
+    return {
         'model': traffic_light_model,
         'mean_number_of_steps': mean_number_of_steps(vehicles),
         'mean_number_of_traffic_lights': mean_number_of_traffic_lights_encountered(vehicles),
@@ -86,4 +146,16 @@ def save_results(vehicles, results_path, traffic_light_model):
         'simulation_score': simulation_score(vehicles)
     }
 
+
+def write_results(results, results_path):
+    """
+    Write the results to a file
+    """
     file_service.write_results_to_file(results_path + '/results.csv', results)
+
+
+def save_results(vehicles, results_path, traffic_light_model):
+    """
+    Save the results and write them to a file
+    """
+    write_results(get_results(vehicles, traffic_light_model), results_path)
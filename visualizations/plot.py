@@ -6,7 +6,7 @@ def plot_grid(grid):
     Create a plot of the grid (returns the figure)
     """
     fig = plt.figure()
-    for intersection in [intersection for row in grid.intersections for intersection in row]:
+    for intersection in grid.topology.intersections:
         # Plot lanes
         for road in intersection.outgoing_roads.values():
             neighbour = road.destination
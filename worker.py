@@ -0,0 +1,55 @@
+import os
+import socket
+import sys
+import threading
+import time
+
+import config
+import main
+from services import cache_service, queue_service
+
+
+def renew_lease(queue_path, task_id, done):
+    """
+    Renew the lease of the task every quarter of config.LEASE_TIME until done is set.
+    """
+    while not done.wait(config.LEASE_TIME / 4):
+        queue_service.renew(queue_path, task_id)
+
+
+def work(queue_path):
+    """
+    Lease the (traffic load, replica) cells published by main.py to the work queue in queue_path, simulate them (see
+    main.simulate_cell) and push back the results, until main.py tells the workers to stop. The lease of a cell is
+    renewed while it is simulated, so it is only leased again if this worker dies. Start the workers after main.py
+    (a worker stops right away if the previous sweep in queue_path stopped). Returns the number of cells simulated.
+    """
+    worker = "{}-{}".format(socket.gethostname(), os.getpid())
+    num_cells = 0
+    while True:
+        leased = queue_service.lease(queue_path)
+        if leased is None:
+            if queue_service.is_stopped(queue_path):
+                return num_cells
+            time.sleep(config.POLL_INTERVAL)
+            continue
+
+        task_id, task = leased
+        if task['config'] != cache_service.config_hash():
+            raise ValueError("The config of worker {} differs from the config of main.py".format(worker))
+
+        done = threading.Event()
+        heartbeat = threading.Thread(target=renew_lease, args=(queue_path, task_id, done), daemon=True)
+        heartbeat.start()
+        try:
+            grid_results = main.simulate_cell(tuple(task['cell']))
+        finally:
+            done.set()
+            heartbeat.join()
+
+        queue_service.complete(queue_path, task_id, grid_results)
+        num_cells += 1
+
+
+if __name__ == "__main__":
+    work(sys.argv[1] if len(sys.argv) > 1 else config.QUEUE_PATH)